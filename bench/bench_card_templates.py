@@ -0,0 +1,92 @@
+"""
+卡片模板基准：对比每次调用都构建 Card 对象再序列化，和使用预先序列化的 CardTemplate
+
+运行: python bench/bench_card_templates.py
+"""
+
+import os
+import sys
+import json
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from khl.card import Card, CardMessage, Module, Element, Types
+from func.card_templates import CardTemplate
+
+
+def build_help_card():
+    #与 /猜数字 帮助卡片相同的结构
+    return Card(
+        Module.Header("🤖 猜数字游戏帮助"),
+        Module.Section(
+            Element.Text(
+                "**🎯 游戏规则:**\n"
+                "猜出1-100之间的随机数字，尽量用最少的次数！\n\n"
+                "**🕹️ 可用命令:**\n"
+                "• `/新游戏` - 开始新游戏\n"
+                "• `/猜 数字` - 猜测数字 (例如: `/猜 50`)\n"
+                "• `/提示` - 获取提示\n"
+                "• `/结束` - 结束当前游戏\n"
+                "• `/排行榜` - 查看排行榜\n"
+                "• `/猜数字` - 显示帮助",
+                type=Types.Text.KMD
+            )
+        ),
+        theme=Types.Theme.INFO
+    )
+
+
+def build_guess_card(status_emoji, message, attempts, history):
+    #与 send_guess_result 相同的结构
+    return Card(
+        Module.Section(
+            Element.Text(
+                f"{status_emoji} **猜测结果**\n"
+                f"{message}\n"
+                f"📊 尝试次数: {attempts}\n"
+                f"📝 历史猜测: {history}",
+                type=Types.Text.KMD
+            )
+        ),
+        Module.Context(
+            Element.Text("💡 使用 `/提示` 获取提示", type=Types.Text.KMD)
+        ),
+        theme=Types.Theme.INFO
+    )
+
+
+HELP_TEMPLATE = CardTemplate(build_help_card())
+GUESS_TEMPLATE = CardTemplate(
+    build_guess_card("@@status_emoji@@", "@@message@@", "@@attempts@@", "@@history@@")
+)
+
+
+def main():
+    number = 20000
+    args = dict(status_emoji="🔄", message="📈 猜小了，再试试！", attempts=7, history="50, 25, 37, 43, 40")
+
+    #两种方式输出的 JSON 必须一致
+    assert json.loads(GUESS_TEMPLATE.render(**args)) == json.loads(json.dumps(CardMessage(build_guess_card(**args))))
+
+    cases = {
+        '静态帮助卡片': (
+            lambda: json.dumps(CardMessage(build_help_card())),
+            lambda: HELP_TEMPLATE.render(),
+        ),
+        '猜测结果卡片': (
+            lambda: json.dumps(CardMessage(build_guess_card(**args))),
+            lambda: GUESS_TEMPLATE.render(**args),
+        ),
+    }
+
+    print(f"{'卡片':<10} | {'每次构建(µs)':>12} | {'模板(µs)':>9} | {'加速':>6}")
+    print('-' * 48)
+    for name, (build, render) in cases.items():
+        t_build = timeit.timeit(build, number=number) / number * 1e6
+        t_render = timeit.timeit(render, number=number) / number * 1e6
+        print(f"{name:<10} | {t_build:>12.2f} | {t_render:>9.2f} | {t_build / t_render:>5.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+哈希子系统基准：各算法、输入大小、编码（utf-8 / hex / base64）、是否 HMAC 下 calculate_hash 的吞吐量，
+以及 parse_command 和 process_command 的每秒次数；可输出 JSON 并与之前的结果对比，用于发现性能退化
+
+运行: python bench/bench_hash.py [--quick] [--json 输出文件] [--compare 之前的JSON]
+"""
+
+import os
+import sys
+import json
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from func.hash_bench import run_suite
+
+#性能下降超过该比例时提示
+REGRESSION = 0.10
+
+
+def result_key(result: dict) -> tuple:
+    return (result['kind'], result.get('algorithm'), result.get('size'), result.get('encoding'),
+            result.get('hmac'), result.get('command'))
+
+
+def print_results(suite: dict):
+    host = suite['host']
+    print(f"{host['platform']} | Python {host['python']} | CPU {host['cpu_count']} | {host['time']}")
+
+    print(f"\n{'算法':<14}{'大小':>9}{'编码':>8}{'HMAC':>6}{'MB/s':>10}{'次/秒':>12}")
+    for result in suite['results']:
+        if result['kind'] == 'calculate_hash':
+            print(f"{result['algorithm']:<14}{result['size']:>9}{result['encoding']:>8}{'是' if result['hmac'] else '否':>6}"
+                  f"{result['mb_per_sec']:>10.1f}{result['ops_per_sec']:>12.0f}")
+
+    print(f"\n{'类型':<18}{'次/秒':>10}  命令")
+    for result in suite['results']:
+        if result['kind'] != 'calculate_hash':
+            print(f"{result['kind']:<18}{result['ops_per_sec']:>10.0f}  {result['command']}")
+
+
+def compare(suite: dict, path: str):
+    #与之前保存的结果对比
+    with open(path, encoding='utf-8') as f:
+        old = {result_key(result): result for result in json.load(f)['results']}
+
+    regressions = []
+    for result in suite['results']:
+        previous = old.get(result_key(result))
+        if previous and result['ops_per_sec'] < previous['ops_per_sec'] * (1 - REGRESSION):
+            regressions.append((result, result['ops_per_sec'] / previous['ops_per_sec']))
+
+    print(f"\n与 {path} 对比: {len(regressions)} 项变慢超过 {REGRESSION:.0%}")
+    for result, ratio in regressions:
+        name = result.get('algorithm') or result.get('command')
+        print(f"  {result['kind']:<16}{name:<30}{result.get('size', ''):>9} {result.get('encoding', ''):>7} {ratio:.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='哈希子系统基准')
+    parser.add_argument('--quick', action='store_true', help='只测试部分大小和编码，用时更短')
+    parser.add_argument('--budget', type=float, default=0.2, help='每项测试的用时（秒）')
+    parser.add_argument('--json', help='把结果写入 JSON 文件')
+    parser.add_argument('--compare', help='与之前保存的 JSON 结果对比')
+    args = parser.parse_args()
+
+    if args.quick:
+        suite = run_suite(sizes=[1024, 1024 * 1024], encodings=['utf-8'], budget=min(args.budget, 0.05))
+    else:
+        suite = run_suite(budget=args.budget)
+
+    print_results(suite)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(suite, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已写入 {args.json}")
+
+    if args.compare:
+        compare(suite, args.compare)
+
+
+if __name__ == '__main__':
+    main()
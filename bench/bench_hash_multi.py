@@ -0,0 +1,56 @@
+"""
+多算法哈希基准：一次解码、一次遍历计算全部算法，与逐个算法分别调用 /hash 的对比
+
+运行: python bench/bench_hash_multi.py [重复次数]
+"""
+
+import os
+import sys
+import time
+import base64
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from func.hash_calculator import ALGORITHMS, HashRequest, compute_digests
+
+#输入大小（解码后的字节数）
+SIZES = [64, 4 * 1024, 64 * 1024, 1024 * 1024]
+
+#算法组合
+GROUPS = {
+    'md5,sha1,sha256': ('md5', 'sha1', 'sha256'),
+    'ALL': tuple(ALGORITHMS),
+}
+
+
+def timeit(func, repeat: int) -> float:
+    "平均耗时（毫秒）"
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+    print(f"{'算法':<18}{'编码':<8}{'大小':>10}{'逐个(ms)':>12}{'单次(ms)':>12}{'加速':>8}")
+    for group, algorithms in GROUPS.items():
+        for encoding in ('utf-8', 'base64'):
+            for size in SIZES:
+                raw = os.urandom(size)
+                value = base64.b64encode(raw).decode('ascii') if encoding == 'base64' else raw.hex()[:size]
+
+                combined = HashRequest(values=(value,), algorithms=algorithms, encoding=encoding)
+                singles = [HashRequest(values=(value,), algorithms=(algorithm,), encoding=encoding) for algorithm in algorithms]
+
+                #旧方式：每个算法一条命令，每次都重新解码和遍历
+                separate = timeit(lambda: [compute_digests(request, value) for request in singles], repeat)
+                single_pass = timeit(lambda: compute_digests(combined, value), repeat)
+
+                print(f"{group:<18}{encoding:<8}{size:>10}{separate:>12.3f}{single_pass:>12.3f}{separate / single_pass:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
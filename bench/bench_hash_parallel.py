@@ -0,0 +1,72 @@
+"""
+批量哈希并行基准：一批行交给单个工作线程计算，与按 parallel_lines 拆给多个工作线程的对比，找出拆分开始划算的行数
+（结果用于设置 hash_bulk_parallel_lines；只有多核主机上的结果有意义，单核时拆分不会更快）
+
+运行: python bench/bench_hash_parallel.py [工作线程数]
+"""
+
+import os
+import sys
+import time
+import asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from func.hash_pool import HashJobRunner
+from func.hash_stream import format_rows
+from func.hash_calculator import HashRequest
+
+#(行数, 每行长度)：短值（用户名、密码列表）和较长的值
+CASES = [(250, 32), (1000, 32), (4000, 32), (16000, 32), (100, 1024), (400, 1024), (1600, 1024), (50, 16 * 1024)]
+ALGORITHMS = ('md5', 'sha256')
+REPEAT = 10
+
+#拆分至少快这么多才算划算（排除测量波动）
+MIN_SPEEDUP = 1.2
+
+
+async def timeit(func) -> float:
+    "平均耗时（毫秒）"
+
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        await func()
+    return (time.perf_counter() - start) / REPEAT * 1000
+
+
+async def main():
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    runner = HashJobRunner(max_workers=workers, parallel_lines=1)
+    loop = asyncio.get_running_loop()
+    request = HashRequest(values=(), algorithms=ALGORITHMS, bulk='csv')
+
+    print(f"CPU 核心: {os.cpu_count()}，工作线程: {workers}，算法: {', '.join(ALGORITHMS)}")
+    print(f"{'行数':>6}{'行长度':>8}{'单线程(ms)':>12}{'拆分(ms)':>11}{'单线程/拆分':>12}")
+
+    crossover = None
+    for count, length in CASES:
+        lines = [os.urandom(length // 2).hex() for _ in range(count)]
+
+        async def single():
+            await loop.run_in_executor(runner.executor, format_rows, request, lines)
+
+        async def split():
+            await runner.map_held(format_rows, [(request, part) for part in runner.split_lines(lines)])
+
+        single_ms = await timeit(single)
+        split_ms = await timeit(split)
+        if single_ms / split_ms >= MIN_SPEEDUP and (crossover is None or count < crossover):
+            crossover = count
+
+        print(f"{count:>6}{length:>8}{single_ms:>12.3f}{split_ms:>11.3f}{single_ms / split_ms:>11.2f}x")
+
+    if crossover is None:
+        print(f"拆分在所有测试规模下都没有快 {MIN_SPEEDUP}x 以上（核心数不足时属于正常情况），hash_bulk_parallel_lines 保持 0")
+    else:
+        print(f"拆分从约 {crossover} 行开始更快，可将 hash_bulk_parallel_lines 设为该值附近")
+
+    runner.executor.shutdown()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
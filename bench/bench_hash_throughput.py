@@ -0,0 +1,56 @@
+"""
+哈希算法吞吐量：按 1MB 分块（与文件哈希相同的方式）计算，并测试短输入的每秒次数
+
+运行: python bench/bench_hash_throughput.py [总大小MB]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from func.hash_calculator import ALGORITHMS, HashRequest, compute_digests, new_hasher
+
+CHUNK = 1024 * 1024
+SHORT_REPEAT = 20000
+
+
+def throughput(algorithm: str, chunk: bytes, total_mb: int) -> float:
+    "分块 update 的吞吐量（MB/s）"
+
+    h = new_hasher(HashRequest(values=()), algorithm)
+    start = time.perf_counter()
+    for _ in range(total_mb):
+        h.update(chunk)
+    h.digest()
+    return total_mb / (time.perf_counter() - start)
+
+
+def short_rate(algorithm: str) -> float:
+    "/hash 短输入（64 字节，含解码和格式化）每秒次数"
+
+    request = HashRequest(values=(), algorithms=(algorithm,))
+    value = 'x' * 64
+    start = time.perf_counter()
+    for _ in range(SHORT_REPEAT):
+        compute_digests(request, value)
+    return SHORT_REPEAT / (time.perf_counter() - start)
+
+
+def main():
+    total_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    chunk = os.urandom(CHUNK)
+
+    rows = [(algorithm, throughput(algorithm, chunk, total_mb), short_rate(algorithm)) for algorithm in ALGORITHMS]
+    rows.sort(key=lambda row: row[1], reverse=True)
+    baseline = dict((row[0], row[1]) for row in rows)['sha256']
+
+    print(f"数据: {total_mb} MB，分块 {CHUNK // 1024} KB")
+    print(f"{'算法':<14}{'吞吐(MB/s)':>14}{'相对sha256':>12}{'短输入(次/秒)':>16}")
+    for algorithm, mbps, rate in rows:
+        print(f"{algorithm:<14}{mbps:>14.1f}{mbps / baseline:>11.2f}x{rate:>16.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+HMAC 密钥状态缓存基准：同一密钥计算多个值时，每个值重新 hmac.new 与复用密钥状态 copy() 的对比
+
+运行: python bench/bench_hmac_state.py [重复次数]
+"""
+
+import os
+import sys
+import time
+import hmac
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from func.hash_cache import result_cache, hmac_cache
+from func.hash_calculator import ALGORITHMS, HashRequest, hash_request
+
+VALUE_COUNTS = [1, 16, 256]
+ALGORITHM_NAMES = ['md5', 'sha256', 'sha512', 'sha3_256', 'blake2b']
+KEYS = {'短密钥': 'k' * 16, '长密钥': 'k' * 1024}
+
+
+def timeit(func, repeat: int) -> float:
+    "平均耗时（微秒）"
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1_000_000
+
+
+def bench_primitive(repeat: int):
+    #单个值：派生密钥状态与复制已有状态
+    print(f"{'算法':<10}{'密钥':<8}{'hmac.new(us)':>14}{'copy(us)':>10}{'加速':>8}")
+    for algorithm in ALGORITHM_NAMES:
+        for label, key in KEYS.items():
+            key_bytes = key.encode('utf-8')
+            hash_func = ALGORITHMS[algorithm]
+            prototype = hmac.new(key_bytes, digestmod=hash_func)
+
+            new = timeit(lambda: hmac.new(key_bytes, digestmod=hash_func), repeat)
+            copy = timeit(prototype.copy, repeat)
+            print(f"{algorithm:<10}{label:<8}{new:>14.2f}{copy:>10.2f}{new / copy:>7.2f}x")
+
+
+def bench_command(repeat: int):
+    #多值命令：/hash v1 v2 ... HMAC key（关闭结果缓存，只比较 HMAC 计算）
+    result_cache.max_entry_bytes = 0
+
+    print(f"{'算法':<10}{'密钥':<8}{'值数量':>8}{'无缓存(us)':>12}{'状态缓存(us)':>14}{'加速':>8}")
+    for algorithm in ALGORITHM_NAMES:
+        for label, key in KEYS.items():
+            for count in VALUE_COUNTS:
+                values = tuple(f'value{i}' for i in range(count))
+
+                def command():
+                    return hash_request(HashRequest(values=values, algorithms=(algorithm,), hmac_key=key))
+
+                hmac_cache.max_entries = 0
+                uncached = timeit(command, repeat)
+                hmac_cache.max_entries = 256
+                cached = timeit(command, repeat)
+
+                print(f"{algorithm:<10}{label:<8}{count:>8}{uncached:>12.1f}{cached:>14.1f}{uncached / cached:>7.2f}x")
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+    bench_primitive(repeat * 50)
+    print()
+    bench_command(repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+排行榜基准：100万虚拟玩家下，增量维护的 Leaderboard 与每次全量排序的对比
+
+运行: python bench/bench_leaderboard.py [玩家数量]
+"""
+
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from func.guess_num import GuessManger
+from func.leaderboard import Leaderboard
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    random.seed(0)
+
+    manager = GuessManger()
+    manager.player_stats = {
+        f'player{i}': {
+            'name': f'player{i}',
+            'wins': random.randint(1, 50),
+            'total_attempts': 0,
+            'total_games': 0,
+            'best_score': random.randint(1, 30),
+            'best_time': random.uniform(1, 300),
+        }
+        for i in range(count)
+    }
+
+    #模拟从存储加载时的批量构建
+    start = time.perf_counter()
+    manager.leaderboard = Leaderboard.build((pid, manager.rank_key(s)) for pid, s in manager.player_stats.items())
+    build_time = time.perf_counter() - start
+
+    #旧实现：每次 /排行榜 全量排序
+    start = time.perf_counter()
+    sorted(
+        manager.player_stats.values(),
+        key=lambda x: (-x['wins'], x['best_score'], x['best_time'])
+    )[:10]
+    sort_time = time.perf_counter() - start
+
+    rounds = 10000
+    player_ids = [f'player{random.randrange(count)}' for _ in range(rounds)]
+
+    start = time.perf_counter()
+    for pid in player_ids:
+        manager.record_win(pid, pid, random.randint(1, 30), random.uniform(1, 300))
+    win_time = (time.perf_counter() - start) / rounds
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        manager.get_leaderboard()
+    top_time = (time.perf_counter() - start) / rounds
+
+    start = time.perf_counter()
+    for pid in player_ids:
+        manager.get_rank(pid)
+    rank_time = (time.perf_counter() - start) / rounds
+
+    print(f"玩家数量: {count}")
+    print(f"批量构建排行榜:           {build_time * 1000:>10.1f} ms（启动时一次）")
+    print(f"旧实现 每次全量排序:      {sort_time * 1000:>10.1f} ms")
+    print(f"record_win（含排行更新）: {win_time * 1e6:>10.2f} µs")
+    print(f"get_leaderboard 前10名:   {top_time * 1e6:>10.2f} µs")
+    print(f"get_rank 查询名次:        {rank_time * 1e6:>10.2f} µs")
+
+
+if __name__ == '__main__':
+    main()
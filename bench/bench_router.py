@@ -0,0 +1,64 @@
+"""
+消息路由微基准：每条消息的分类耗时随注册命令数量的变化
+对比 MessageRouter（字典查找）和逐个命令匹配（khl 默认的 shlex 拆分 + 触发词检查）
+
+运行: python bench/bench_router.py
+"""
+
+import os
+import sys
+import shlex
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from func.router import MessageRouter
+
+
+async def handler(msg, *args):
+    pass
+
+
+def build_router(count: int) -> MessageRouter:
+    router = MessageRouter()
+    for i in range(count):
+        router.command(name=f'cmd{i}', prefixes=['/'])(handler)
+    router.keyword('出牌', startswith=True)(handler)
+    router.keyword('状态', 'status')(handler)
+    return router
+
+
+def linear_match(names, content: str):
+    #逐个命令匹配，每个命令都要 shlex 拆分一次
+    for name in names:
+        if not content.startswith('/'):
+            continue
+        tokens = shlex.split(content[1:])
+        if tokens and tokens[0] == name:
+            return name
+    return None
+
+
+def main():
+    messages = {
+        'hit': '/cmd{last} 50',
+        'miss': '今天天气不错',
+        'keyword': '出牌 A 3',
+    }
+    number = 20000
+
+    print(f"{'命令数':>8} | {'消息':>8} | {'router(µs)':>11} | {'逐个匹配(µs)':>12}")
+    print('-' * 50)
+    for count in (10, 100, 1000, 10000):
+        router = build_router(count)
+        names = [f'cmd{i}' for i in range(count)]
+        for kind, template in messages.items():
+            content = template.format(last=count - 1)
+            t_router = timeit.timeit(lambda: router.classify(content), number=number) / number * 1e6
+            linear_number = max(10, number // count)
+            t_linear = timeit.timeit(lambda: linear_match(names, content), number=linear_number) / linear_number * 1e6
+            print(f"{count:>8} | {kind:>8} | {t_router:>11.3f} | {t_linear:>12.3f}")
+
+
+if __name__ == '__main__':
+    main()
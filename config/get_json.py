@@ -4,4 +4,39 @@ with open('config\setting.json', 'r', encoding='utf-8') as setting:
     data = json.load(setting)
 
 log_create = data['loguru_create']
-use_admin_user = data['use_admin_user_ids']
\ No newline at end of file
+use_admin_user = data['use_admin_user_ids']
+dm_concurrency = data['dm_concurrency']
+cache_ttl = data['cache_ttl']
+cache_size = data['cache_size']
+stats_db = data['stats_db']
+stats_flush_interval = data['stats_flush_interval']
+channel_idle_timeout = data['channel_idle_timeout']
+hash_inline_limit = data['hash_inline_limit']
+hash_workers = data['hash_workers']
+hash_max_jobs = data['hash_max_jobs']
+hash_user_jobs = data['hash_user_jobs']
+hash_timeout = data['hash_timeout']
+hash_cache_bytes = data['hash_cache_bytes']
+hash_file_max_bytes = data['hash_file_max_bytes']
+hash_file_chunk = data['hash_file_chunk']
+hash_file_timeout = data['hash_file_timeout']
+hash_bulk_max_lines = data['hash_bulk_max_lines']
+hash_bulk_parallel_lines = data['hash_bulk_parallel_lines']
+hmac_cache_size = data['hmac_cache_size']
+hmac_cache_ttl = data['hmac_cache_ttl']
+kdf_workers = data['kdf_workers']
+kdf_max_jobs = data['kdf_max_jobs']
+kdf_user_jobs = data['kdf_user_jobs']
+kdf_timeout = data['kdf_timeout']
+kdf_max_iterations = data['kdf_max_iterations']
+kdf_max_scrypt_n = data['kdf_max_scrypt_n']
+ping_targets = data['ping_targets']
+ping_timeout = data['ping_timeout']
+ping_sample_interval = data['ping_sample_interval']
+ping_refresh_interval = data['ping_refresh_interval']
+send_channel_rate = data['send_channel_rate']
+send_channel_burst = data['send_channel_burst']
+send_global_rate = data['send_global_rate']
+send_global_burst = data['send_global_burst']
+send_max_queue = data['send_max_queue']
+send_max_retries = data['send_max_retries']
\ No newline at end of file
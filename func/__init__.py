@@ -1,4 +1,19 @@
 from .guess_num import guess_manager, GameSession
 from .group_man import group_manager
 from .Ch_Tavern import Ch_Tavern
-from .hash_calculator import calculator
\ No newline at end of file
+from .hash_calculator import calculator, HashRequest, HashCommandError, format_result
+from .dm_fanout import DMFanout
+from .object_cache import ObjectCache
+from .router import MessageRouter
+from .card_templates import CardTemplate, combine
+from .stats_store import StatsStore
+from .channel_executor import ChannelExecutor
+from .hash_pool import HashJobRunner, HashBusyError, KdfJobRunner, KdfLimitError
+from .hash_cache import result_cache, hmac_cache
+from .hash_stream import HashStreamer, FileTooLargeError, find_attachment
+from .hash_bench import quick_throughput
+from .latency_probe import LatencyProbe
+from .latency_monitor import LatencyMonitor
+from .gateway_metrics import GatewayMetrics
+from .command_metrics import CommandMetrics
+from .send_queue import SendQueue
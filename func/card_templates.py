@@ -0,0 +1,40 @@
+import re
+import json
+from khl.card import Card, CardMessage
+
+#占位符格式：@@名称@@
+SLOT_PATTERN = re.compile(r'@@(\w+)@@')
+
+
+class CardTemplate:
+    "预先构建并序列化的卡片消息，带参数的卡片通过占位符替换生成"
+
+    def __init__(self, *cards: Card):
+        #只在创建时构建和序列化一次
+        serialized = json.dumps(CardMessage(*cards))
+        self.parts = SLOT_PATTERN.split(serialized)     # [文本, 占位符, 文本, 占位符, ...]
+        self.slots = tuple(self.parts[1::2])
+        self.static = serialized if not self.slots else None
+
+    def render(self, **values) -> str:
+        "生成卡片消息 JSON，values 中的值会转义后填入对应占位符"
+
+        if self.static is not None:
+            return self.static
+
+        parts = self.parts[:]
+        for i in range(1, len(parts), 2):
+            parts[i] = json.dumps(str(values[parts[i]]))[1:-1]
+        return ''.join(parts)
+
+
+def combine(*messages) -> str:
+    "把多个卡片消息（CardMessage 或 render() 生成的 JSON）合并为一条卡片消息 JSON，一次发送"
+
+    parts = []
+    for message in messages:
+        serialized = message if isinstance(message, str) else json.dumps(message)
+        inner = serialized.strip()[1:-1].strip()
+        if inner:
+            parts.append(inner)
+    return '[' + ','.join(parts) + ']'
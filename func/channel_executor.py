@@ -0,0 +1,81 @@
+import time
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+
+class ChannelExecutor:
+    "按频道串行执行：同一频道的事件按顺序处理，不同频道之间并行"
+
+    def __init__(self, idle_timeout: float = 60):
+        self.idle_timeout = idle_timeout
+        self._queues: Dict[str, asyncio.Queue] = {}       # 频道 -> 待处理队列
+        self._workers: Dict[str, asyncio.Task] = {}       # 频道 -> 工作协程
+        self.processed = 0
+        self.max_depth = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    async def run(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        "把 func() 放入 key 的队列中，等待执行完成并返回结果"
+
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = asyncio.Queue()
+
+        future = asyncio.get_running_loop().create_future()
+        queue.put_nowait((func, future, time.perf_counter()))
+        self.max_depth = max(self.max_depth, queue.qsize())
+
+        if key not in self._workers:
+            self._workers[key] = asyncio.create_task(self._worker(key, queue))
+
+        return await future
+
+    async def _worker(self, key: str, queue: asyncio.Queue):
+        try:
+            while True:
+                try:
+                    func, future, queued_at = await asyncio.wait_for(queue.get(), self.idle_timeout)
+                except asyncio.TimeoutError:
+                    #空闲超时，回收该频道的工作协程
+                    if queue.empty():
+                        return
+                    continue
+
+                wait = time.perf_counter() - queued_at
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+
+                if future.cancelled():
+                    continue
+                try:
+                    result = await func()
+                except asyncio.CancelledError:
+                    future.cancel()
+                    raise
+                except Exception as e:
+                    if not future.cancelled():
+                        future.set_exception(e)
+                else:
+                    if not future.cancelled():
+                        future.set_result(result)
+                finally:
+                    self.processed += 1
+        finally:
+            self._workers.pop(key, None)
+            self._queues.pop(key, None)
+            #异常退出时取消剩余的任务
+            while not queue.empty():
+                _, future, _ = queue.get_nowait()
+                future.cancel()
+
+    def stats(self) -> dict:
+        #队列深度与等待时间
+        return {
+            'workers': len(self._workers),
+            'queued': sum(q.qsize() for q in self._queues.values()),
+            'max_depth': self.max_depth,
+            'processed': self.processed,
+            'avg_wait_ms': self.total_wait / self.processed * 1000 if self.processed else 0.0,
+            'max_wait_ms': self.max_wait * 1000
+        }
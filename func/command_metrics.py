@@ -0,0 +1,83 @@
+import time
+from typing import Callable, Dict
+
+from .gateway_metrics import Histogram, api_time
+
+
+class CommandStats:
+    "单个命令的调用次数、异常次数，以及总耗时和等待 KOOK API 耗时的直方图"
+
+    __slots__ = ('calls', 'errors', 'latency', 'api')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.latency = Histogram()
+        self.api = Histogram()
+
+
+class CommandMetrics:
+    "按命令统计处理耗时，只在事件循环中更新，不需要加锁"
+
+    def __init__(self):
+        self.commands: Dict[str, CommandStats] = {}
+        self.messages = 0
+        self.started = time.monotonic()
+
+    async def track(self, name: str, func: Callable, *args):
+        "执行 func(*args) 并记录到 name 的统计中（异常照常抛出）"
+
+        stats = self.commands.get(name)
+        if stats is None:
+            stats = self.commands[name] = CommandStats()
+
+        #处理函数中（包括它创建的任务）的 API 请求把耗时累加到这里
+        spent = [0.0]
+        token = api_time.set(spent)
+        start = time.perf_counter()
+        try:
+            return await func(*args)
+        except Exception:
+            stats.errors += 1
+            raise
+        finally:
+            stats.calls += 1
+            stats.latency.record((time.perf_counter() - start) * 1000)
+            stats.api.record(spent[0] * 1000)
+            api_time.reset(token)
+
+    def rows(self) -> list:
+        "每个命令一行：调用次数、异常次数、总耗时和 API 耗时的中位数 / P95 / 最大值"
+
+        rows = []
+        for name, stats in self.commands.items():
+            latency = stats.latency.summary()
+            rows.append({
+                'name': name,
+                'calls': stats.calls,
+                'errors': stats.errors,
+                'p50': latency['p50'],
+                'p95': latency['p95'],
+                'max': latency['max'],
+                'api_p50': stats.api.percentile(0.5),
+                'api_p95': stats.api.percentile(0.95),
+            })
+        return rows
+
+    def busiest(self, limit: int = 5) -> list:
+        return sorted(self.rows(), key=lambda row: row['calls'], reverse=True)[:limit]
+
+    def slowest(self, limit: int = 5) -> list:
+        return sorted(self.rows(), key=lambda row: row['p95'] or 0, reverse=True)[:limit]
+
+    def totals(self) -> dict:
+        #全部命令合计与吞吐量
+        uptime = time.monotonic() - self.started
+        calls = sum(stats.calls for stats in self.commands.values())
+        return {
+            'uptime': uptime,
+            'messages': self.messages,
+            'calls': calls,
+            'errors': sum(stats.errors for stats in self.commands.values()),
+            'per_minute': calls / uptime * 60 if uptime else 0.0
+        }
@@ -0,0 +1,40 @@
+import time
+import asyncio
+from loguru import logger
+from typing import Awaitable, Callable, List, Tuple, Any
+
+
+class DMFanout:
+    "私信并发发送，限制同时进行的请求数"
+
+    def __init__(self, limit: int = 5, send_queue=None):
+        self.limit = max(1, limit)
+        self.send_queue = send_queue        # 经发送队列限速（SendQueue），私信按游戏消息处理
+
+    async def send_all(self, fetch_user: Callable[[str], Awaitable[Any]], messages: List[tuple]) -> Tuple[List[str], float]:
+        "并发发送私信 messages: [(用户ID, 玩家名, 内容)]，返回(发送失败的玩家名, 总耗时ms)"
+
+        semaphore = asyncio.Semaphore(self.limit)
+
+        async def send_one(user_id, name, content):
+            async with semaphore:
+                try:
+                    user = await fetch_user(user_id)
+                    if self.send_queue is not None:
+                        await self.send_queue.send(f'user:{user_id}', lambda: user.send(content), self.send_queue.CRITICAL)
+                    else:
+                        await user.send(content)
+                    return None
+                except Exception as e:
+                    logger.warning(f"向 {name} 发送私信失败: {e}")
+                    return name
+
+        start_time = time.perf_counter()
+        results = await asyncio.gather(*(send_one(*m) for m in messages))
+        elapsed = (time.perf_counter() - start_time) * 1000
+
+        #保持玩家顺序
+        failed = [name for name in results if name is not None]
+
+        logger.info(f"[TIME] 私信发送 {len(messages)} 条，失败 {len(failed)} 条，耗时 {elapsed:.2f}ms")
+        return failed, elapsed
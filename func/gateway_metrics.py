@@ -0,0 +1,255 @@
+import time
+import aiohttp
+import loguru
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from khl.requester import HTTPRequester
+from khl.receiver import WebsocketReceiver
+
+#直方图分桶上限（毫秒），最后一个桶收集所有更慢的请求
+BUCKETS = (5, 10, 25, 50, 75, 100, 150, 250, 500, 1000, 2500, 5000, 10000)
+
+#挂接前没有实例属性（使用类中的方法），卸载时删除实例属性
+_MISSING = object()
+
+#当前命令等待 KOOK API 的累计时间（秒，包含限速等待），由 CommandMetrics 设置
+api_time: ContextVar[Optional[List[float]]] = ContextVar('api_time', default=None)
+
+
+class Histogram:
+    "固定分桶的延迟直方图，占用内存与样本数量无关"
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def record(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, p: float) -> Optional[float]:
+        "按分桶估算百分位数（桶内线性插值，限制在最小值和最大值之间）"
+
+        if not self.count:
+            return None
+        rank = p * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[index - 1] if index else 0
+                upper = self.buckets[index] if index < len(self.buckets) else self.max
+                value = lower + (upper - lower) * max(rank - seen, 0) / count
+                return min(max(value, self.min), self.max)
+            seen += count
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            'count': self.count,
+            'avg': self.total / self.count if self.count else None,
+            'min': self.min,
+            'p50': self.percentile(0.5),
+            'p95': self.percentile(0.95),
+            'max': self.max,
+        }
+
+
+class HeartbeatConnection:
+    "包装网关连接，记录心跳（s=2）的发送时间"
+
+    def __init__(self, ws_conn, on_ping):
+        self._ws_conn = ws_conn
+        self._on_ping = on_ping
+
+    async def send_json(self, data, *args, **kwargs):
+        if isinstance(data, dict) and data.get('s') == 2:
+            self._on_ping()
+        return await self._ws_conn.send_json(data, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._ws_conn, name)
+
+
+class GatewayMetrics:
+    "KOOK 网关心跳往返时间，以及 HTTP API 各接口的延迟直方图、失败和 429 次数"
+
+    API_PREFIX = '/api/v3/'
+
+    def __init__(self):
+        self.heartbeat = Histogram()
+        self.last_heartbeat: Optional[float] = None
+        self.missed_pongs = 0
+        self._ping_sent: Optional[float] = None
+        self.routes: Dict[str, Histogram] = defaultdict(Histogram)
+        self.errors = Counter()
+        self.rate_limited = Counter()
+        self.reset_at: Dict[str, float] = {}        # 接口 -> 限速解除时间（来自 429 响应的 X-Rate-Limit-Reset）
+        self._patches: List[tuple] = []             # 挂接时替换的属性：(对象, 属性名, 原来的实例属性)
+
+    @property
+    def installed(self) -> bool:
+        return bool(self._patches)
+
+    #网关心跳
+    def on_ping(self):
+        #上一次心跳没有收到 pong
+        if self._ping_sent is not None:
+            self.missed_pongs += 1
+        self._ping_sent = time.perf_counter()
+
+    def on_pong(self):
+        if self._ping_sent is None:
+            return
+        self.last_heartbeat = (time.perf_counter() - self._ping_sent) * 1000
+        self.heartbeat.record(self.last_heartbeat)
+        self._ping_sent = None
+
+    #HTTP API
+    @staticmethod
+    def route_key(route: str) -> str:
+        return route.split('?')[0].strip('/').lower()
+
+    def retry_after(self, route: str) -> Optional[float]:
+        "route 最近一次 429 响应要求等待的剩余秒数，没有记录时返回 None"
+
+        reset_at = self.reset_at.get(self.route_key(route))
+        if reset_at is None:
+            return None
+        return max(0.0, reset_at - time.monotonic())
+
+    def route_name(self, url) -> str:
+        path = url.path
+        if path.startswith(self.API_PREFIX):
+            path = path[len(self.API_PREFIX):]
+        return self.route_key(path)
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        "记录每个 API 请求的 HTTP 往返时间和状态码（不包含限速等待）"
+
+        async def on_request_start(session, context, params):
+            context.start = time.perf_counter()
+
+        async def on_request_end(session, context, params):
+            #卸载后会话仍带着本 trace config，不再记录
+            if not self.installed:
+                return
+            route = self.route_name(params.url)
+            self.routes[route].record((time.perf_counter() - context.start) * 1000)
+            if params.response.status == 429:
+                self.rate_limited[route] += 1
+                reset = params.response.headers.get('X-Rate-Limit-Reset')
+                if reset is not None:
+                    self.reset_at[route] = time.monotonic() + float(reset)
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_request_end.append(on_request_end)
+        return trace_config
+
+    def _patch(self, obj, name: str, value):
+        self._patches.append((obj, name, obj.__dict__.get(name, _MISSING)))
+        setattr(obj, name, value)
+
+    def install(self, bot):
+        "挂接到机器人的 HTTP 请求和网关连接上（已经挂接过的机器人不再重复挂接）"
+
+        requester: HTTPRequester = bot.client.gate.requester
+        if getattr(requester.request, 'gateway_metrics', None) is not None:
+            loguru.logger.warning("该机器人已经挂接了网关统计，不再重复挂接")
+            return
+        original_request = requester.request
+
+        async def request(method: str, route: str, **params):
+            if requester._cs is None:
+                requester._cs = aiohttp.ClientSession(trace_configs=[self.trace_config()])
+            start = time.perf_counter()
+            try:
+                return await original_request(method, route, **params)
+            except Exception:
+                self.errors[self.route_key(route)] += 1
+                raise
+            finally:
+                spent = api_time.get()
+                if spent is not None:
+                    spent[0] += time.perf_counter() - start
+
+        request.gateway_metrics = self
+        self._patch(requester, 'request', request)
+
+        receiver = bot.client.gate.receiver
+        if not isinstance(receiver, WebsocketReceiver):
+            loguru.logger.info("当前不是 websocket 连接，不记录网关心跳")
+            return
+
+        original_heartbeat = receiver.heartbeat
+        original_decode = receiver._cert.decode_raw
+
+        async def heartbeat(ws_conn):
+            return await original_heartbeat(HeartbeatConnection(ws_conn, self.on_ping))
+
+        def decode_raw(raw: bytes) -> dict:
+            pkg = original_decode(raw)
+            if isinstance(pkg, dict) and pkg.get('s') == 3:
+                self.on_pong()
+            return pkg
+
+        self._patch(receiver, 'heartbeat', heartbeat)
+        self._patch(receiver._cert, 'decode_raw', decode_raw)
+
+    def uninstall(self):
+        "恢复挂接前的方法（已有的统计保留）"
+
+        while self._patches:
+            obj, name, original = self._patches.pop()
+            if original is _MISSING:
+                delattr(obj, name)
+            else:
+                setattr(obj, name, original)
+
+    #统计
+    def heartbeat_stats(self) -> dict:
+        stats = self.heartbeat.summary()
+        stats['last'] = self.last_heartbeat
+        stats['missed'] = self.missed_pongs
+        return stats
+
+    def api_totals(self) -> dict:
+        "所有接口合计"
+
+        total = Histogram()
+        for histogram in self.routes.values():
+            for index, count in enumerate(histogram.counts):
+                total.counts[index] += count
+            total.count += histogram.count
+            total.total += histogram.total
+            for value in (histogram.min, histogram.max):
+                if value is not None:
+                    total.min = value if total.min is None else min(total.min, value)
+                    total.max = value if total.max is None else max(total.max, value)
+
+        stats = total.summary()
+        stats['errors'] = sum(self.errors.values())
+        stats['rate_limited'] = sum(self.rate_limited.values())
+        return stats
+
+    def route_stats(self, limit: int = 10) -> list:
+        "按请求次数排序的各接口统计"
+
+        routes = set(self.routes) | set(self.errors)
+        rows = []
+        for route in routes:
+            stats = self.routes[route].summary() if route in self.routes else Histogram().summary()
+            stats.update({'route': route, 'errors': self.errors[route], 'rate_limited': self.rate_limited[route]})
+            rows.append(stats)
+        rows.sort(key=lambda row: row['count'], reverse=True)
+        return rows[:limit]
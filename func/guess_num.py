@@ -1,12 +1,92 @@
 import time
 import random
+import asyncio
+import loguru
 from typing import  Dict, List, Set, Optional
 
+from .leaderboard import Leaderboard
+
 #游戏状态管理
 class GuessManger:
     def __init__(self):
         self.active_games: Dict[str, 'GameSession'] = {}       # 频道ID -> 游戏会话
         self.player_stats: Dict[str, dict] = {}               # 玩家ID -> 统计数据
+        self.leaderboard = Leaderboard()                      # 按排名维护的玩家ID
+        self.store = None                                     # 持久化存储（StatsStore）
+        self._dirty: Set[str] = set()                         # 未写入存储的玩家ID
+        self._loaded = False
+        self._load_task: Optional[asyncio.Future] = None      # 正在进行的加载（所有调用方共用）
+
+    def attach_store(self, store):
+        #设置持久化存储，战绩由 load() 在后台加载
+        self.store = store
+        self._loaded = False
+
+    async def load(self) -> bool:
+        "在工作线程中读取存储的战绩并合并到内存（只成功加载一次），失败时返回 False，继续使用内存中的战绩"
+
+        if self._loaded or self.store is None:
+            return True
+
+        #上一次加载失败时重新加载
+        task = self._load_task
+        if task is None or (task.done() and (task.cancelled() or task.exception() is not None)):
+            self._load_task = asyncio.ensure_future(asyncio.to_thread(self.store.load_all))
+
+        try:
+            stats = await asyncio.shield(self._load_task)
+        except Exception as e:
+            loguru.logger.warning(f"加载猜数字战绩时出错: {e}")
+            return False
+
+        if not self._loaded:
+            self.merge_loaded(stats)
+        return True
+
+    def merge_loaded(self, stats: Dict[str, dict]):
+        #加载完成前记录的胜利累加到存储的战绩上（在事件循环中调用）
+        for pid, recent in self.player_stats.items():
+            stored = stats.get(pid)
+            if stored is None:
+                stats[pid] = recent
+                continue
+            stored['name'] = recent['name']
+            stored['wins'] += recent['wins']
+            stored['total_attempts'] += recent['total_attempts']
+            stored['total_games'] += recent['total_games']
+            stored['best_score'] = min(stored['best_score'], recent['best_score'])
+            stored['best_time'] = min(stored['best_time'], recent['best_time'])
+
+        self.player_stats = stats
+        self.leaderboard = Leaderboard.build((pid, self.rank_key(s)) for pid, s in stats.items())
+        self._loaded = True
+
+    @staticmethod
+    def rank_key(stats: dict) -> tuple:
+        #排名依据: 胜利次数 → 最少尝试 → 最快时间
+        return (-stats['wins'], stats['best_score'], stats['best_time'])
+
+    @property
+    def loaded(self) -> bool:
+        #存储中的战绩是否已经合并到内存
+        return self._loaded or self.store is None
+
+    @property
+    def dirty_count(self) -> int:
+        return len(self._dirty)
+
+    def take_dirty(self, before_load: bool = False) -> Dict[str, dict]:
+        #取出待写入的战绩快照；加载完成前不写入，避免覆盖存储中的历史战绩
+        #before_load 时照常取出，此时的战绩只是本次运行的增量，只能用 StatsStore.add 累加写入
+        if not self.loaded and not before_load:
+            return {}
+        dirty = {pid: dict(self.player_stats[pid]) for pid in self._dirty}
+        self._dirty.clear()
+        return dirty
+
+    def mark_dirty(self, player_ids):
+        #写入失败时重新标记，等待下次写入
+        self._dirty.update(player_ids)
 
     def start_game(self, channel_id: str, player_id: str, player_name: str):
         #开始游戏
@@ -35,7 +115,7 @@ class GuessManger:
         return self.active_games.get(channel_id)
 
     def record_win(self, player_id: str, player_name: str, attempts: int, time_taken: float):
-        #记录玩家胜利
+        #记录玩家胜利（只修改内存，由定时任务批量写入存储）
         if player_id not in self.player_stats:
             self.player_stats[player_id] = {
                 'name': player_name,
@@ -56,12 +136,16 @@ class GuessManger:
         if time_taken < stats['best_time']:
             stats['best_time'] = time_taken
 
-    def get_leaderboard(self) -> List[dict]:
-        #获取排行榜
-        return sorted(
-            self.player_stats.values(),
-            key=lambda x: (-x['wins'], x['best_score'], x['best_time'])
-        )[:10]
+        self.leaderboard.update(player_id, self.rank_key(stats))
+        self._dirty.add(player_id)
+
+    def get_leaderboard(self, limit: int = 10) -> List[dict]:
+        #获取排行榜（加载完成前只包含内存中的战绩）
+        return [self.player_stats[pid] for pid in self.leaderboard.top(limit)]
+
+    def get_rank(self, player_id: str) -> Optional[int]:
+        #获取玩家名次，没有记录返回 None
+        return self.leaderboard.rank(player_id)
 
 class GameSession:
     def __init__(self, target_number: int, player_id: str, player_name: str, start_time: float):
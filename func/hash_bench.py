@@ -0,0 +1,132 @@
+import os
+import sys
+import time
+import base64
+import platform
+from typing import Callable, Iterable, List
+
+from .hash_calculator import ALGORITHMS, CHECKSUMS, KEYWORDS, HashRequest, calculator
+
+#输入大小（解码后的字节数）
+SIZES = [64, 1024, 64 * 1024, 1024 * 1024]
+
+#输入编码
+ENCODINGS = ['utf-8', 'hex', 'base64']
+
+#解析基准使用的命令
+PARSE_COMMANDS = [
+    '/hash hello',
+    '/hash hello world ALG sha256 OUT base64',
+    '/hash a b c d e f g h ALG md5,sha1,sha256 OUT lower HMAC key SEP | COD utf-8',
+]
+
+BENCH_KEY = 'benchmark-key'
+
+
+def make_value(size: int, encoding: str) -> str:
+    "生成按 encoding 解码后为 size 字节的输入"
+
+    data = b'a' * size
+    if encoding == 'hex':
+        return data.hex()
+    elif encoding == 'base64':
+        return base64.b64encode(data).decode('ascii')
+    return data.decode('ascii')
+
+
+def measure(func: Callable, budget: float) -> tuple:
+    "重复执行 func 直到用时达到 budget 秒（至少一次），返回 (次数, 用时)"
+
+    count = 0
+    start = time.perf_counter()
+    while True:
+        func()
+        count += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= budget:
+            return count, elapsed
+
+
+def bench_calculate(algorithm: str, size: int, encoding: str, use_hmac: bool, budget: float) -> dict:
+    "calculate_hash 的单值性能"
+
+    request = HashRequest(values=(), algorithms=(algorithm,), encoding=encoding,
+                          hmac_key=BENCH_KEY if use_hmac else None)
+    value = make_value(size, encoding)
+    count, elapsed = measure(lambda: calculator.calculate_hash(request, value), budget)
+
+    return {
+        'kind': 'calculate_hash',
+        'algorithm': algorithm,
+        'size': size,
+        'encoding': encoding,
+        'hmac': use_hmac,
+        'ops_per_sec': count / elapsed,
+        'mb_per_sec': count * size / elapsed / (1024 * 1024),
+    }
+
+
+def bench_parse(budget: float) -> List[dict]:
+    "parse_command 的性能"
+
+    results = []
+    for command in PARSE_COMMANDS:
+        count, elapsed = measure(lambda: calculator.parse_command(command), budget)
+        results.append({'kind': 'parse_command', 'command': command, 'ops_per_sec': count / elapsed})
+    return results
+
+
+def vary_values(command: str, n: int) -> str:
+    "给命令中的每个值加上编号 n（参数不变），每次都是新的值"
+
+    parts = command.split()
+    for i in range(1, len(parts)):
+        if parts[i].upper() in KEYWORDS:
+            break
+        parts[i] = f'{parts[i]}{n}'
+    return ' '.join(parts)
+
+
+def bench_process(budget: float) -> List[dict]:
+    "process_command 的完整性能（每次所有值都不同，不命中结果缓存）"
+
+    results = []
+    for command in PARSE_COMMANDS:
+        counter = iter(range(sys.maxsize))
+        count, elapsed = measure(lambda: calculator.process_command(vary_values(command, next(counter))), budget)
+        results.append({'kind': 'process_command', 'command': command, 'ops_per_sec': count / elapsed})
+    return results
+
+
+def host_info() -> dict:
+    return {
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'cpu_count': os.cpu_count(),
+        'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+
+def run_suite(algorithms: Iterable[str] = None, sizes: Iterable[int] = SIZES, encodings: Iterable[str] = ENCODINGS,
+              hmac_modes: Iterable[bool] = (False, True), budget: float = 0.2) -> dict:
+    "完整基准：各算法 × 大小 × 编码 × 是否 HMAC，以及命令解析和完整处理"
+
+    results = []
+    for algorithm in algorithms or ALGORITHMS:
+        for size in sizes:
+            for encoding in encodings:
+                for use_hmac in hmac_modes:
+                    if use_hmac and algorithm in CHECKSUMS:
+                        continue
+                    results.append(bench_calculate(algorithm, size, encoding, use_hmac, budget))
+
+    results += bench_parse(budget)
+    results += bench_process(budget)
+    return {'host': host_info(), 'results': results}
+
+
+def quick_throughput(size: int = 1024 * 1024, budget: float = 0.05) -> List[tuple]:
+    "简短基准：各算法计算 size 字节的吞吐量（MB/s），按速度从快到慢排列，总用时约为 算法数 × budget"
+
+    rows = [(algorithm, bench_calculate(algorithm, size, 'utf-8', False, budget)['mb_per_sec']) for algorithm in ALGORITHMS]
+    return sorted(rows, key=lambda row: row[1], reverse=True)
@@ -0,0 +1,145 @@
+import os
+import hmac
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+#每个条目的固定开销估算（元组、字符串对象等）
+ENTRY_OVERHEAD = 200
+
+
+class HashResultCache:
+    "/hash 结果的 LRU 缓存，按字节数限制大小，HMAC 密钥只以指纹形式出现在键中"
+
+    def __init__(self, max_bytes: int = 4 * 1024 * 1024, max_entry_bytes: int = 64 * 1024):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._items: 'OrderedDict[tuple, str]' = OrderedDict()
+        self._lock = threading.Lock()               # 工作线程中也会访问
+        self._salt = os.urandom(16)                 # 每个进程不同，指纹无法离线比对
+
+    def fingerprint(self, key: Optional[str]) -> Optional[str]:
+        "HMAC 密钥指纹"
+        if key is None:
+            return None
+        return hmac.new(self._salt, key.encode('utf-8'), hashlib.sha256).hexdigest()
+
+    def get_or_compute(self, request, value: str, compute: Callable, fingerprint: Optional[str]) -> Tuple[str, ...]:
+        "返回 value 在 request.algorithms 下的结果，未命中的算法一起调用 compute(request, value, algorithms) 计算并写入缓存"
+
+        keys = {
+            algorithm: (algorithm, request.output_format, request.output_case, request.encoding, fingerprint, value)
+            for algorithm in request.algorithms
+        }
+        results = {}
+
+        with self._lock:
+            for algorithm, key in keys.items():
+                result = self._items.get(key)
+                if result is not None:
+                    self._items.move_to_end(key)
+                    results[algorithm] = result
+            self.hits += len(results)
+            self.misses += len(keys) - len(results)
+
+        missing = [algorithm for algorithm in request.algorithms if algorithm not in results]
+        if missing:
+            computed = compute(request, value, missing)
+            results.update(computed)
+            self._store(keys, value, computed)
+
+        return tuple(results[algorithm] for algorithm in request.algorithms)
+
+    def _store(self, keys: dict, value: str, computed: dict):
+        #写入新结果，超出容量时淘汰最久未使用的条目
+        with self._lock:
+            for algorithm, result in computed.items():
+                entry_size = len(value) + len(result) + ENTRY_OVERHEAD
+                if entry_size > self.max_entry_bytes or keys[algorithm] in self._items:
+                    continue
+                self._items[keys[algorithm]] = result
+                self.size += entry_size
+
+            while self.size > self.max_bytes and self._items:
+                old_key, old_result = self._items.popitem(last=False)
+                self.size -= len(old_key[-1]) + len(old_result) + ENTRY_OVERHEAD
+
+    def stats(self) -> dict:
+        #命中统计
+        total = self.hits + self.misses
+        return {
+            'entries': len(self._items),
+            'bytes': self.size,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0
+        }
+
+
+class HmacStateCache:
+    "HMAC 密钥状态缓存：同一密钥和算法只计算一次内外填充，之后 copy() 使用；按数量和时间限制，密钥不会一直留在内存中"
+
+    def __init__(self, max_entries: int = 256, ttl: float = 300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._items: 'OrderedDict[tuple, tuple]' = OrderedDict()     # key -> (prototype, 过期时间)
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple, factory: Callable):
+        "返回 key 对应的 HMAC 状态副本，没有或已过期时调用 factory() 创建"
+
+        if self.max_entries <= 0:
+            return factory()
+
+        now = time.monotonic()
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and item[1] > now:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return item[0].copy()
+            self.misses += 1
+
+        prototype = factory()
+
+        with self._lock:
+            #过期时间从创建时算起，使用中也不会延长
+            self._items[key] = (prototype, now + self.ttl)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+        return prototype.copy()
+
+    def purge(self) -> int:
+        "清除过期的密钥状态，返回清除数量"
+
+        now = time.monotonic()
+        with self._lock:
+            expired = [key for key, (_, expires) in self._items.items() if expires <= now]
+            for key in expired:
+                del self._items[key]
+        return len(expired)
+
+    def stats(self) -> dict:
+        #命中统计
+        total = self.hits + self.misses
+        return {
+            'entries': len(self._items),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0
+        }
+
+
+result_cache = HashResultCache()
+hmac_cache = HmacStateCache()
@@ -1,56 +1,352 @@
+import re
+import zlib
 import hmac
 import base64
 import loguru
 import hashlib
 import binascii
+import functools
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Tuple
+
+from .hash_cache import result_cache, hmac_cache
+
+class ZlibChecksum:
+    "zlib 校验和（crc32 / adler32），提供与 hashlib 相同的 update / digest / copy 接口"
+
+    digest_size = 4
+
+    def __init__(self, name: str, func, value: int):
+        self.name = name
+        self._func = func
+        self._value = value
+
+    def update(self, data: bytes):
+        self._value = self._func(data, self._value)
+
+    def digest(self) -> bytes:
+        return self._value.to_bytes(4, 'big')
+
+    def hexdigest(self) -> str:
+        return self.digest().hex()
+
+    def copy(self) -> 'ZlibChecksum':
+        return ZlibChecksum(self.name, self._func, self._value)
+
+
+def crc32() -> ZlibChecksum:
+    return ZlibChecksum('crc32', zlib.crc32, 0)
+
+
+def adler32() -> ZlibChecksum:
+    return ZlibChecksum('adler32', zlib.adler32, 1)
+
+
+#算法
+ALGORITHMS = {
+    'md5' : hashlib.md5,
+    'sha1' : hashlib.sha1,
+    'sha224' : hashlib.sha224,
+    'sha256' : hashlib.sha256,
+    'sha384' : hashlib.sha384,
+    'sha512' : hashlib.sha512,
+    'sha3_224' : hashlib.sha3_224,
+    'sha3_256' : hashlib.sha3_256,
+    'sha3_384' : hashlib.sha3_384,
+    'sha3_512' : hashlib.sha3_512,
+    'blake2b' : hashlib.blake2b,
+    'blake2s' : hashlib.blake2s,
+    'blake2b_256' : functools.partial(hashlib.blake2b, digest_size=32),
+    'blake2s_128' : functools.partial(hashlib.blake2s, digest_size=16),
+    'crc32' : crc32,
+    'adler32' : adler32,
+}
+
+#非加密校验和，不能与 HMAC 一起使用
+CHECKSUMS = {'crc32', 'adler32'}
+
+#blake2 可指定输出长度（位），例如 blake2b_160、blake2s_96
+BLAKE2_PATTERN = re.compile(r'^(blake2b|blake2s)_(\d+)$')
+
+#密钥派生函数（KDF）及默认参数
+KDFS = {
+    'pbkdf2' : {'iterations': 100000},
+    'scrypt' : {'iterations': 16384},      # scrypt 的 ITER 为 N（2 的幂）
+}
+
+#PBKDF2 可用的算法（hashlib.pbkdf2_hmac 只接受这些名称）
+PBKDF2_ALGORITHMS = [name for name in ALGORITHMS if name not in CHECKSUMS and not BLAKE2_PATTERN.match(name)]
+
+#scrypt 的块大小和并行度参数
+SCRYPT_R = 8
+SCRYPT_P = 1
+
+#派生长度上限（字节）
+KDF_MAX_LENGTH = 1024
+
+#命令参数关键字
+KEYWORDS = ['ALG', 'OUT', 'HMAC', 'SEP', 'COD', 'KDF', 'SALT', 'ITER', 'LEN', 'BULK']
+
+#批量模式的输出格式及分隔符
+BULK_FORMATS = {'csv': ',', 'tsv': '\t'}
+
+
+class HashCommandError(ValueError):
+    "/hash 命令格式错误"
+
+
+@dataclass(frozen=True)
+class HashRequest:
+    "解析后的 /hash 请求，不可变，可以安全地交给其他线程计算"
+
+    values: Tuple[str, ...]
+    algorithms: Tuple[str, ...] = ('md5',)
+    output_format: str = 'HEX'
+    output_case: str = 'upper'
+    hmac_key: Optional[str] = None
+    separator: str = ''
+    encoding: str = 'utf-8'
+    kdf: Optional[str] = None
+    salt: Optional[str] = None
+    iterations: Optional[int] = None
+    length: Optional[int] = None
+    bulk: Optional[str] = None
+
+    @property
+    def use_hmac(self) -> bool:
+        return self.hmac_key is not None
+
+    @property
+    def labels(self) -> Tuple[str, ...]:
+        "每组结果的名称（与结果顺序一致）"
+        if self.kdf == 'scrypt':
+            return ('SCRYPT',)
+        if self.kdf:
+            return tuple(f'{self.kdf.upper()}-{algorithm.upper()}' for algorithm in self.algorithms)
+        return tuple(algorithm.upper() for algorithm in self.algorithms)
+
+    @functools.cached_property
+    def key_fingerprint(self) -> Optional[str]:
+        "HMAC 密钥指纹（每个请求只计算一次）"
+        return result_cache.fingerprint(self.hmac_key)
+
+
+def get_algorithm(name: str):
+    "按名称获取哈希构造函数，不支持时返回 None"
+
+    if name in ALGORITHMS:
+        return ALGORITHMS[name]
+
+    match = BLAKE2_PATTERN.match(name)
+    if match:
+        hash_func = getattr(hashlib, match.group(1))
+        bits = int(match.group(2))
+        if bits % 8 == 0 and 0 < bits // 8 <= hash_func.MAX_DIGEST_SIZE:
+            return functools.partial(hash_func, digest_size=bits // 8)
+    return None
+
+
+def decode_value(data: str, encoding: str) -> bytes:
+    "根据编码把输入转换为字节"
+
+    if encoding == 'hex':
+        return bytes.fromhex(data)
+    elif encoding == 'base64':
+        return base64.b64decode(data)
+    return data.encode(encoding)
+
+
+def format_digest(digest: bytes, output_format: str, output_case: str) -> str:
+    "按输出格式和大小写转换哈希结果"
+
+    if output_format == 'BASE64':
+        return base64.b64encode(digest).decode('ascii')
+
+    #HEX
+    result = binascii.hexlify(digest).decode('ascii')
+    if output_format == 'HEX':
+        result = result.lower() if output_case == 'lower' else result.upper()
+    return result
+
+
+def new_hasher(request: HashRequest, algorithm: str, prototypes: Dict[str, object] = None):
+    "按请求创建指定算法的哈希对象（普通或 HMAC），可以多次 update；prototypes 为调用方本地的 HMAC 状态表（算法 -> 状态）"
+
+    hash_func = get_algorithm(algorithm)
+
+    if request.hmac_key:
+        #使用 HMAC
+        factory = lambda: hmac.new(request.hmac_key.encode(request.encoding), digestmod=hash_func)
+        if hmac_cache.max_entries <= 0:
+            return factory()
+
+        #同一密钥的内外填充状态只计算一次，每个值复制一份
+        key = (request.key_fingerprint, algorithm, request.encoding)
+        if prototypes is None:
+            return hmac_cache.get(key, factory)
+        prototype = prototypes.get(algorithm)
+        if prototype is None:
+            prototype = prototypes[algorithm] = hmac_cache.get(key, factory)
+        return prototype.copy()
+
+    #普通
+    return hash_func()
+
+
+def new_hashers(request: HashRequest, algorithms: Iterable[str] = None, prototypes: Dict[str, object] = None) -> Dict[str, object]:
+    "为每个算法创建哈希对象，同一份数据依次 update 给所有对象即可一次得到全部结果"
+
+    return {algorithm: new_hasher(request, algorithm, prototypes) for algorithm in (algorithms or request.algorithms)}
+
+
+def update_all(hashers: Dict[str, object], data: bytes):
+    "把同一块数据交给所有哈希对象"
+
+    for h in hashers.values():
+        h.update(data)
+
+
+def compute_digests(request: HashRequest, data: str, algorithms: Iterable[str] = None,
+                    prototypes: Dict[str, object] = None) -> Dict[str, str]:
+    "计算单个值在多个算法下的哈希（只解码一次，无副作用），返回 {算法: 结果}"
+
+    algorithms = tuple(algorithms or request.algorithms)
+    try:
+        data_bytes = decode_value(data, request.encoding)
+        hashers = new_hashers(request, algorithms, prototypes)
+        update_all(hashers, data_bytes)
+
+        return {
+            algorithm: format_digest(h.digest(), request.output_format, request.output_case)
+            for algorithm, h in hashers.items()
+        }
+
+    except Exception as e:
+        loguru.logger.warning(f"处理 /hash 命令时出错: {e}")
+        error = f'计算错误: {str(e)}'
+        return {algorithm: error for algorithm in algorithms}
+
+
+def compute_hash(request: HashRequest, data: str) -> str:
+    "计算单个值的哈希（使用请求中的第一个算法）"
+
+    algorithm = request.algorithms[0]
+    return compute_digests(request, data, (algorithm,))[algorithm]
+
+
+def format_result(request: HashRequest, results) -> str:
+    "生成 /hash 的文本输出，results 为每个值在各算法下的结果（与 request.algorithms 顺序一致）"
+
+    labels = request.labels
+
+    output = []
+    output.append(f"算法: {', '.join(labels)}")
+    if request.kdf:
+        output.append(f"盐: {request.salt}")
+        output.append(f"迭代次数: {request.iterations}")
+        if request.length:
+            output.append(f"长度: {request.length} 字节")
+    if request.use_hmac:
+        output.append(f"HMAC密钥: {request.hmac_key}")
+    output.append(f"输出格式: {request.output_format}")
+    if request.output_format == 'HEX':
+        output.append(f"大小写: {request.output_case}")
+    output.append(f"编码: {request.encoding}")
+    if request.separator:
+        output.append(f"分隔符: {repr(request.separator)}")
+
+    if len(labels) == 1:
+        output.append(f"\n结果: {request.separator.join(digests[0] for digests in results)}")
+    else:
+        #多个算法：每个算法一行
+        output.append("\n结果:")
+        for index, label in enumerate(labels):
+            output.append(f"{label}: {request.separator.join(digests[index] for digests in results)}")
+
+    return '\n'.join(output)
+
+
+def derive_digests(request: HashRequest, data: str) -> Tuple[str, ...]:
+    "用 KDF 从单个值派生密钥（CPU 密集，应在进程池中执行）"
+
+    try:
+        password = decode_value(data, request.encoding)
+        salt = decode_value(request.salt, request.encoding)
+
+        if request.kdf == 'scrypt':
+            n = request.iterations
+            key = hashlib.scrypt(
+                password, salt=salt, n=n, r=SCRYPT_R, p=SCRYPT_P,
+                maxmem=128 * SCRYPT_R * (n + SCRYPT_P + 2) + 1024 * 1024, dklen=request.length or 64
+            )
+            return (format_digest(key, request.output_format, request.output_case),)
+
+        return tuple(
+            format_digest(
+                hashlib.pbkdf2_hmac(algorithm, password, salt, request.iterations, request.length),
+                request.output_format, request.output_case
+            )
+            for algorithm in request.algorithms
+        )
+
+    except Exception as e:
+        loguru.logger.warning(f"处理 /hash KDF 时出错: {e}")
+        return (f'计算错误: {str(e)}',) * len(request.labels)
+
+
+def derive_request(request: HashRequest) -> str:
+    "计算 KDF 请求并生成文本输出（结果不缓存）"
+
+    return format_result(request, [derive_digests(request, value) for value in request.values])
+
+
+def hash_request(request: HashRequest) -> str:
+    "计算请求中所有值的哈希并生成文本输出（结果会缓存，可在工作线程中执行）"
+
+    if request.kdf:
+        return derive_request(request)
+
+    return format_result(request, hash_values(request, request.values))
+
+
+def hash_values(request: HashRequest, values) -> list:
+    "计算一组值的哈希（结果会缓存），返回每个值在各算法下的结果"
+
+    #HMAC 密钥状态只在本次调用内共用，不保存在（跨线程共享的）请求对象上
+    prototypes = {}
+    compute = lambda request, value, algorithms: compute_digests(request, value, algorithms, prototypes)
+    return [result_cache.get_or_compute(request, value, compute, request.key_fingerprint) for value in values]
 
 
 class HashCalculator:
-    "哈希值计算，多种算法和输出格式"
-
-    #算法
-    ALGORITHMS = {
-        'md5' : hashlib.md5,
-        'sha1' : hashlib.sha1,
-        'sha224' : hashlib.sha224,
-        'sha256' : hashlib.sha256,
-        'sha384' : hashlib.sha384,
-        'sha512' : hashlib.sha512,
-        'sha3_224' : hashlib.sha3_224,
-        'sha3_256' : hashlib.sha3_256,
-        'sha3_384' : hashlib.sha3_384,
-        'sha3_512' : hashlib.sha3_512,
-    }
-
-    def __init__(self):
-        self.algorithm = 'md5'
-        self.output_format = 'HEX'
-        self.output_case = 'upper'
-        self.hmac_key = None
-        self.separator = ''
-        self.encoding = 'utf-8'
-
-    def parse_command(self, command: str) -> dict:
-        "解析命令（/hash value ALG alg_name OUT output HMAC key SEP sep COD encoding）"
+    "哈希值计算，多种算法和输出格式（无状态，可并发使用）"
+
+    ALGORITHMS = ALGORITHMS
+
+    def parse_command(self, command: str, allow_empty: bool = False) -> HashRequest:
+        "解析命令（/hash value ALG alg1,alg2|ALL OUT output HMAC key SEP sep COD encoding KDF kdf SALT salt ITER n LEN n BULK csv|tsv），格式错误时抛出 HashCommandError"
 
         parts = command.split()
+        if allow_empty and parts == ['/hash']:
+            #计算文件哈希时可以不带任何参数
+            return HashRequest(values=())
         if len(parts) < 2 or parts[0] != '/hash':
-            return {'error': '命令格式错误，必须以 /hash 开头'}
-        
+            raise HashCommandError('命令格式错误，必须以 /hash 开头')
+
         #数据提取（参数前）
         values = []
         i = 1
         while i < len(parts):
-            if parts[i].upper() in ['ALG', 'OUT', 'HMAC', 'SEP', 'COD']:
+            if parts[i].upper() in KEYWORDS:
                 break
             values.append(parts[i])
             i += 1
 
         if not values and i >= len(parts):
-            return {'error': '必须提供至少一个要加密的数据或者参数'}
-        
+            raise HashCommandError('必须提供至少一个要加密的数据或者参数')
+
         #解析
-        params = {'values': values}
+        params = {'values': tuple(values)}
 
         while i < len(parts):
             param = parts[i].upper()
@@ -59,137 +355,142 @@ class HashCalculator:
             if i + 1 >= len(parts):
                 if param == 'HMAC':
                     params['hmac_key'] = 'secret'
+                elif param == 'BULK':
+                    params['bulk'] = 'csv'
                 i += 1
                 continue
 
             value = parts[i + 1]
 
             #检查下一个值是否为另一个值
-            if value.upper() in ['ALG', 'OUT', 'HMAC', 'SEP', 'COD']:
+            if value.upper() in KEYWORDS:
                 # 下一个是参数，当前参数使用默认值
                 if param == 'HMAC':
                     params['hmac_key'] = 'secret'
+                elif param == 'BULK':
+                    params['bulk'] = 'csv'
                 i += 1
                 continue
 
             #处理数据
             if param == 'ALG':
-                if value.lower() in self.ALGORITHMS:
-                    params['algorithm'] = value.lower()
-                else:
-                    return {'error': f'不支持的算法: {value}. 支持的算法: {", ".join(self.ALGORITHMS.keys())}'}
+                params['algorithms'] = self.parse_algorithms(value)
             elif param == 'OUT':
-                params['output_format'] = value.upper()
+                params.update(self.parse_output(value))
             elif param == 'HMAC':
                 params['hmac_key'] = value if value else 'secret'
             elif param == 'SEP':
                 params['separator'] = value if value else ''
             elif param == 'COD':
                 params['encoding'] = value if value else 'utf-8'
+            elif param == 'KDF':
+                if value.lower() not in KDFS:
+                    raise HashCommandError(f'不支持的 KDF: {value}. 支持的 KDF: {", ".join(KDFS)}')
+                params['kdf'] = value.lower()
+            elif param == 'SALT':
+                params['salt'] = value
+            elif param == 'ITER':
+                params['iterations'] = self.parse_positive(param, value)
+            elif param == 'LEN':
+                params['length'] = self.parse_positive(param, value)
+            elif param == 'BULK':
+                if value.lower() not in BULK_FORMATS:
+                    raise HashCommandError(f'不支持的批量输出格式: {value}. 支持: {", ".join(BULK_FORMATS)}')
+                params['bulk'] = value.lower()
 
             i += 2
 
-        return params
-    
-    def calculate_hash(self, data: str, use_hmac: bool = False) -> str:
+        checksums = [algorithm for algorithm in params.get('algorithms', ()) if algorithm in CHECKSUMS]
+        if 'hmac_key' in params and checksums:
+            if params['algorithms'] != tuple(self.ALGORITHMS):
+                raise HashCommandError(f'校验和算法不支持 HMAC: {", ".join(checksums)}')
+            #ALL + HMAC 时跳过校验和算法
+            params['algorithms'] = tuple(algorithm for algorithm in self.ALGORITHMS if algorithm not in CHECKSUMS)
+
+        if 'bulk' in params and 'kdf' in params:
+            raise HashCommandError('批量模式不支持 KDF')
+        if 'kdf' in params:
+            self.check_kdf(params)
+
+        return HashRequest(**params)
+
+    @staticmethod
+    def check_kdf(params: dict):
+        "检查 KDF 参数并补全默认值"
+
+        kdf = params['kdf']
+        if not params['values']:
+            raise HashCommandError('KDF 模式必须提供至少一个密码')
+        if not params.get('salt'):
+            raise HashCommandError('KDF 模式必须提供盐（SALT）')
+        if 'hmac_key' in params:
+            raise HashCommandError('KDF 模式不支持 HMAC')
+
+        iterations = params.setdefault('iterations', KDFS[kdf]['iterations'])
+        if params.get('length', 0) > KDF_MAX_LENGTH:
+            raise HashCommandError(f'派生长度不能超过 {KDF_MAX_LENGTH} 字节')
+
+        if kdf == 'scrypt':
+            if iterations < 2 or iterations & (iterations - 1):
+                raise HashCommandError('scrypt 的 ITER（N）必须是大于 1 的 2 的幂')
+        else:
+            params.setdefault('algorithms', ('sha256',))
+            unsupported = [algorithm for algorithm in params['algorithms'] if algorithm not in PBKDF2_ALGORITHMS]
+            if unsupported:
+                raise HashCommandError(f'PBKDF2 不支持的算法: {", ".join(unsupported)}. 支持的算法: {", ".join(PBKDF2_ALGORITHMS)}')
+
+    @staticmethod
+    def parse_positive(param: str, value: str) -> int:
+        "处理正整数参数（ITER / LEN）"
+
+        if not value.isdigit() or int(value) <= 0:
+            raise HashCommandError(f'{param} 必须是正整数')
+        return int(value)
+
+    def parse_algorithms(self, value: str) -> Tuple[str, ...]:
+        "处理算法列表（md5,sha1,sha256 或 ALL），去除重复并保持顺序"
+
+        if value.upper() == 'ALL':
+            return tuple(self.ALGORITHMS)
+
+        algorithms = []
+        for name in value.lower().split(','):
+            if not name:
+                continue
+            if get_algorithm(name) is None:
+                raise HashCommandError(f'不支持的算法: {name}. 支持的算法: {", ".join(self.ALGORITHMS.keys())}')
+            if name not in algorithms:
+                algorithms.append(name)
+
+        if not algorithms:
+            raise HashCommandError(f'必须提供至少一个算法. 支持的算法: {", ".join(self.ALGORITHMS.keys())}')
+        return tuple(algorithms)
+
+    @staticmethod
+    def parse_output(value: str) -> dict:
+        "处理输出格式（HEX / BASE64 / LOWER / UPPER）"
+
+        output_format = value.upper()
+        if output_format == 'LOWER':
+            return {'output_format': 'HEX', 'output_case': 'lower'}
+        elif output_format == 'UPPER':
+            return {'output_format': 'HEX', 'output_case': 'upper'}
+        return {'output_format': output_format, 'output_case': 'upper'}
+
+    def calculate_hash(self, request: HashRequest, data: str) -> str:
         "计算哈希值"
+        return compute_hash(request, data)
 
-        try:
-            #根据编码处理数据
-            if self.encoding == 'hex':
-                data_bytes = bytes.fromhex(data)
-            elif self.encoding == 'base64':
-                data_bytes = base64.b64decode(data)
-            else:
-                data_bytes = data.encode(self.encoding)
-
-            #创建哈希对象
-            hash_func = self.ALGORITHMS[self.algorithm]
-
-            if use_hmac and self.hmac_key:
-                #使用 HMAC
-                key_bytes = self.hmac_key.encode(self.encoding)
-                h = hmac.new(key_bytes, data_bytes, hash_func)
-            else:
-                #普通
-                h = hash_func(data_bytes)
-
-            #获取哈希结果
-            hash_result = h.digest()
-
-            #处理格式
-            if self.output_format == 'BASE64':
-                result = base64.b64encode(hash_result).decode('ascii')
-            else:
-                #HEX
-                result = binascii.hexlify(hash_result).decode('ascii')
-
-            #处理大小写
-            if self.output_case == 'lower' and self.output_format == 'HEX':
-                result = result.lower()
-            elif self.output_case == 'upper' and self.output_format == 'HEX':
-                result = result.upper()
-
-            return result
-        
-        except Exception as e:
-            loguru.logger.warning("处理 /hash 命令时出错: {e}")
-            return f'计算错误: {str(e)}'
-        
     def process_command(self, command: str) -> str:
         "哈希计算"
 
         #解析
-        params = self.parse_command(command)
-        if 'error' in params:
-            return params['error']
-        
-        #设置参数
-        self.algorithm = params.get('algorithm', 'md5')
-        output_format = params.get('output_format', 'HEX')
-        self.output_format = output_format
-        self.output_case = 'upper'
-        self.hmac_key = params.get('hmac_key', None)
-        self.separator = params.get('separator', '')
-        self.encoding = params.get('encoding', 'utf-8')
-
-        #处理输出
-        if output_format.upper() == 'BASE64':
-            self.output_format = 'BASE64'
-        elif output_format.upper() == 'HEX':
-            self.output_format = 'HEX'
-        elif output_format.upper() == 'LOWER':
-            self.output_format = 'HEX'
-            self.output_case = 'lower'
-        elif output_format.upper() == 'UPPER':
-            self.output_format = 'HEX'
-            self.output_case = 'upper'
-
-        #计算哈希值
-        results = []
-        use_hmac = self.hmac_key is not None
-
-        for Value in params['values']:
-            result = self.calculate_hash(Value, use_hmac)
-            results.append(result)
-
-        #分隔符
-        final_result = self.separator.join(results)
-
-        #返回格式结果
-        output = []
-        output.append(f"算法: {self.algorithm.upper()}")
-        if use_hmac:
-            output.append(f"HMAC密钥: {self.hmac_key}")
-        output.append(f"输出格式: {self.output_format}")
-        if self.output_format == 'HEX':
-            output.append(f"大小写: {self.output_case}")
-        output.append(f"编码: {self.encoding}")
-        if self.separator:
-            output.append(f"分隔符: {repr(self.separator)}")
-        output.append(f"\n结果: {final_result}")
-
-        return '\n'.join(output)
-    
+        try:
+            request = self.parse_command(command)
+        except HashCommandError as e:
+            return str(e)
+
+        #计算哈希值并返回格式结果
+        return hash_request(request)
+
 calculator = HashCalculator()
-            
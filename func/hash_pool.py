@@ -0,0 +1,247 @@
+import os
+import sys
+import types
+import signal
+import asyncio
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict
+
+from .hash_calculator import HashRequest, hash_request, derive_request
+
+def throughput_costs(rows) -> Dict[str, float]:
+    "由实测吞吐量（[(算法, MB/s)]，即 quick_throughput 的结果）得出各算法每字节相对 md5 的开销"
+
+    speeds = {algorithm: mbps for algorithm, mbps in rows if mbps > 0}
+    if not speeds:
+        return {}
+    reference = speeds.get('md5') or max(speeds.values())
+    return {algorithm: reference / mbps for algorithm, mbps in speeds.items()}
+
+
+def report_pid(queue):
+    #进程池工作进程的初始化函数：报告自己的 PID，超时时由主进程终止
+    queue.put(os.getpid())
+
+
+@contextmanager
+def hidden_main():
+    "暂时隐藏 __main__（机器人脚本），此时启动的 spawn 子进程不会重新执行它（创建机器人、日志、线程池等）"
+
+    main = sys.modules.get('__main__')
+    sys.modules['__main__'] = types.ModuleType('__main__')
+    try:
+        yield
+    finally:
+        sys.modules['__main__'] = main
+
+
+class HashBusyError(Exception):
+    "哈希任务过多，拒绝新的请求"
+
+
+class KdfLimitError(Exception):
+    "KDF 计算量超过管理员设置的上限"
+
+
+class HashJobRunner:
+    "哈希任务执行：小任务直接在事件循环中计算，大任务交给线程池（hashlib 计算大数据时会释放 GIL）"
+
+    def __init__(self, inline_limit: int = 64 * 1024, max_workers: int = 2, max_jobs: int = 4,
+                 user_jobs: int = 1, timeout: float = 10, parallel_lines: int = 0):
+        self.inline_limit = inline_limit
+        self.parallel_lines = parallel_lines        # 批量模式一批达到该行数时拆给多个工作线程，0 为不拆分
+        self.max_workers = max_workers
+        self.max_jobs = max_jobs
+        self.user_jobs = user_jobs
+        self.timeout = timeout
+        self.executor = self.new_executor()
+        self.costs: Dict[str, float] = {}           # 各算法每字节的相对开销（calibrate 实测），未测量的算法按 1 计算
+        self._active = 0
+        self._user_active: Dict[str, int] = {}
+
+    def new_executor(self):
+        return ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='hash')
+
+    def calibrate(self, rows):
+        "按实测吞吐量（quick_throughput 的结果）设置各算法的开销"
+        self.costs = throughput_costs(rows)
+
+    def estimate_cost(self, request: HashRequest) -> float:
+        "估算任务开销：数据长度 × 各算法开销之和（未校准时即 数据长度 × 算法数）"
+
+        size = sum(len(value) for value in request.values)
+        return size * sum(self.costs.get(algorithm, 1) for algorithm in request.algorithms)
+
+    async def run(self, request: HashRequest, user_id: str = None) -> str:
+        "执行哈希请求，超时抛出 asyncio.TimeoutError，任务过多抛出 HashBusyError"
+
+        cost = self.estimate_cost(request)
+        if cost <= self.inline_limit:
+            return hash_request(request)
+
+        futures = self.submit(user_id, [(hash_request, request)])
+        return await asyncio.wait_for(asyncio.wrap_future(futures[0]), self.timeout)
+
+    def submit(self, user_id: str, calls: list) -> list:
+        "占用一个任务名额并提交 calls（[(函数, 参数...)]），名额在所有工作线程真正结束后才释放（超时后线程仍会继续计算）"
+
+        self.acquire(user_id)
+        loop = asyncio.get_running_loop()
+        remaining = len(calls)
+
+        def finished():
+            nonlocal remaining
+            remaining -= 1
+            if not remaining:
+                self.release(user_id)
+
+        def done(_):
+            #完成回调在工作线程中执行，回到事件循环释放名额
+            try:
+                loop.call_soon_threadsafe(finished)
+            except RuntimeError:
+                pass                                # 退出时事件循环已关闭
+
+        futures = []
+        try:
+            for func, *args in calls:
+                future = self.executor.submit(func, *args)
+                future.add_done_callback(done)
+                futures.append(future)
+        except Exception:
+            #提交失败（执行器已关闭）：取消已提交的任务，未提交的部分直接计为完成
+            for future in futures:
+                future.cancel()
+            for _ in range(len(calls) - len(futures)):
+                finished()
+            raise
+        return futures
+
+    def split_lines(self, lines: list) -> list:
+        "一批行达到 parallel_lines 时分成最多 max_workers 段连续的行（保持顺序），否则不拆分"
+
+        if not self.parallel_lines or self.max_workers < 2 or len(lines) < self.parallel_lines:
+            return [lines]
+        size = -(-len(lines) // self.max_workers)
+        return [lines[i:i + size] for i in range(0, len(lines), size)]
+
+    async def map_held(self, func, calls: list) -> list:
+        "在已经占用的任务名额内（slot 块中）把 func(*参数) 交给工作线程并行执行，按 calls 的顺序返回结果；出错或被取消时也等所有工作线程结束才返回"
+
+        futures = [self.executor.submit(func, *args) for args in calls]
+        try:
+            return await asyncio.gather(*(asyncio.wrap_future(future) for future in futures))
+        finally:
+            #还没开始的不再计算，正在计算的结束后才能释放名额
+            running = [asyncio.wrap_future(future) for future in futures if not future.cancel() and not future.done()]
+            if running:
+                await asyncio.shield(asyncio.wait(running))
+
+    def acquire(self, user_id: str = None):
+        "占用一个任务名额（总数和每个用户都有上限），没有名额时抛出 HashBusyError"
+
+        if self._active >= self.max_jobs:
+            raise HashBusyError('当前哈希任务过多')
+        if user_id is not None and self._user_active.get(user_id, 0) >= self.user_jobs:
+            raise HashBusyError('你还有哈希任务正在计算')
+
+        self._active += 1
+        if user_id is not None:
+            self._user_active[user_id] = self._user_active.get(user_id, 0) + 1
+
+    def release(self, user_id: str = None):
+        self._active -= 1
+        if user_id is not None:
+            self._user_active[user_id] -= 1
+            if not self._user_active[user_id]:
+                del self._user_active[user_id]
+
+    @contextmanager
+    def slot(self, user_id: str = None):
+        "在 with 块中占用一个任务名额（块内等待的工作必须在退出前完成）"
+
+        self.acquire(user_id)
+        try:
+            yield
+        finally:
+            self.release(user_id)
+
+
+class KdfJobRunner(HashJobRunner):
+    "KDF 任务执行：在进程池中计算，不占用事件循环和 GIL；超时后终止工作进程并重建进程池，被波及的其他任务在新进程池中重新计算"
+
+    #每个请求最多派生的次数（值 × 算法）
+    MAX_DERIVATIONS = 8
+
+    def __init__(self, max_workers: int = 2, max_jobs: int = 2, user_jobs: int = 1, timeout: float = 30,
+                 max_iterations: int = 600000, max_scrypt_n: int = 32768):
+        super().__init__(inline_limit=0, max_workers=max_workers, max_jobs=max_jobs, user_jobs=user_jobs, timeout=timeout)
+        self.max_iterations = max_iterations
+        self.max_scrypt_n = max_scrypt_n
+
+    def new_executor(self):
+        #主进程中已有线程（线程池、日志），fork 可能把持有中的锁复制到子进程，使用 spawn 启动
+        context = multiprocessing.get_context('spawn')
+        self._pid_queue = context.SimpleQueue()     # 该进程池的工作进程报告的 PID
+        return ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context,
+                                   initializer=report_pid, initargs=(self._pid_queue,))
+
+    def submit(self, user_id: str, calls: list) -> list:
+        #spawn 进程池在提交任务时才启动工作进程，启动时隐藏 __main__，工作进程只导入计算需要的模块
+        with hidden_main():
+            return super().submit(user_id, calls)
+
+    def check_limits(self, request: HashRequest):
+        "检查计算量上限，超过时抛出 KdfLimitError"
+
+        if request.kdf == 'scrypt':
+            if request.iterations > self.max_scrypt_n:
+                raise KdfLimitError(f'scrypt N 超过上限 {self.max_scrypt_n}')
+        elif request.iterations > self.max_iterations:
+            raise KdfLimitError(f'迭代次数超过上限 {self.max_iterations}')
+
+        if len(request.values) * len(request.labels) > self.MAX_DERIVATIONS:
+            raise KdfLimitError(f'一次最多派生 {self.MAX_DERIVATIONS} 个密钥')
+
+    async def run(self, request: HashRequest, user_id: str = None) -> str:
+        "执行 KDF 请求，超时抛出 asyncio.TimeoutError，任务过多抛出 HashBusyError"
+
+        self.check_limits(request)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+
+        while True:
+            executor = self.executor
+            futures = self.submit(user_id, [(derive_request, request)])
+            try:
+                return await asyncio.wait_for(asyncio.wrap_future(futures[0]), max(0.0, deadline - loop.time()))
+            except asyncio.TimeoutError:
+                self.reset(executor)
+                raise
+            except BrokenProcessPool:
+                #其他任务超时重建了进程池，在新进程池中重新计算（仍受本任务的超时限制）
+                if self.executor is executor:
+                    raise
+
+    def reset(self, executor=None):
+        "终止 executor（默认为当前进程池）的工作进程并重建进程池，已经重建过时不再处理"
+
+        if executor is not None and executor is not self.executor:
+            return
+
+        old_executor, pid_queue = self.executor, self._pid_queue
+        self.executor = self.new_executor()
+
+        while not pid_queue.empty():
+            try:
+                os.kill(pid_queue.get(), signal.SIGTERM)
+            except OSError:
+                pass                                # 进程已经退出
+        pid_queue.close()
+
+        #不取消排队中的任务：进程池损坏后它们以 BrokenProcessPool 结束，由 run() 在新进程池中重新计算
+        old_executor.shutdown(wait=False)
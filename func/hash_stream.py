@@ -0,0 +1,195 @@
+import io
+import csv
+import time
+import codecs
+import asyncio
+import aiohttp
+from typing import Optional
+from urllib.parse import urlparse
+
+from .hash_calculator import HashRequest, new_hashers, update_all, format_digest, compute_digests, BULK_FORMATS
+
+#大于该大小的数据块交给线程池计算，避免阻塞事件循环
+OFFLOAD_CHUNK = 64 * 1024
+
+#批量模式单行长度上限
+MAX_LINE = 64 * 1024
+
+#只下载 KOOK 资源服务器上的文件（含子域名），避免机器人被当作代理访问任意地址
+ASSET_HOSTS = ('kookapp.cn', 'kaiheila.cn')
+
+
+class FileTooLargeError(Exception):
+    "文件超过大小限制"
+
+
+class HashStreamer:
+    "分块下载文件并增量计算哈希，内存占用与文件大小无关"
+
+    def __init__(self, max_bytes: int = 100 * 1024 * 1024, chunk_size: int = 64 * 1024,
+                 timeout: float = 120, executor=None, max_lines: int = 100000, runner=None):
+        self.max_bytes = max_bytes
+        self.max_lines = max_lines
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.executor = executor
+        self.runner = runner                # HashJobRunner：批量模式按其 parallel_lines 把大批次拆给多个工作线程
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def session(self) -> aiohttp.ClientSession:
+        #复用连接
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self._session
+
+    async def iter_chunks(self, url: str):
+        "分块下载 url，超过大小限制时抛出 FileTooLargeError"
+
+        size = 0
+        async with self.session().get(url) as response:
+            response.raise_for_status()
+            if response.content_length and response.content_length > self.max_bytes:
+                raise FileTooLargeError(f'文件大小超过限制 {self.max_bytes // (1024 * 1024)}MB')
+
+            async for chunk in response.content.iter_chunked(self.chunk_size):
+                size += len(chunk)
+                if size > self.max_bytes:
+                    raise FileTooLargeError(f'文件大小超过限制 {self.max_bytes // (1024 * 1024)}MB')
+                yield chunk
+
+    async def hash_url(self, url: str, request: HashRequest) -> dict:
+        "下载 url 并计算哈希（每个数据块交给所有算法），返回 {'digests', 'size', 'elapsed'}"
+
+        loop = asyncio.get_running_loop()
+        hashers = new_hashers(request)
+        size = 0
+        start_time = time.perf_counter()
+
+        chunks = self.iter_chunks(url)
+        try:
+            async for chunk in chunks:
+                size += len(chunk)
+                if len(chunk) >= OFFLOAD_CHUNK:
+                    await loop.run_in_executor(self.executor, update_all, hashers, chunk)
+                else:
+                    update_all(hashers, chunk)
+        finally:
+            await chunks.aclose()
+
+        return {
+            'digests': tuple(format_digest(h.digest(), request.output_format, request.output_case) for h in hashers.values()),
+            'size': size,
+            'elapsed': time.perf_counter() - start_time
+        }
+
+    async def hash_lines(self, url: str, request: HashRequest, output) -> dict:
+        "下载文本文件，逐行计算哈希并按 request.bulk（csv / tsv）写入 output，返回 {'lines', 'size', 'elapsed'}"
+
+        decoder = codecs.getincrementaldecoder('utf-8-sig')(errors='replace')
+        writer = csv.writer(output, delimiter=BULK_FORMATS[request.bulk])
+        writer.writerow(['value', *request.labels])
+
+        pending = ''
+        lines = size = 0
+        start_time = time.perf_counter()
+
+        chunks = self.iter_chunks(url)
+        try:
+            async for chunk in chunks:
+                size += len(chunk)
+
+                #只保留最后一行未结束的部分，内存占用与块大小相关
+                text = pending + decoder.decode(chunk)
+                batch = text.split('\n')
+                pending = batch.pop()
+                if len(pending) > MAX_LINE:
+                    raise FileTooLargeError(f'单行长度超过限制 {MAX_LINE // 1024}KB')
+
+                rows, count = await self.format_batch(request, batch)
+                output.write(rows)
+                lines += count
+                if lines > self.max_lines:
+                    raise FileTooLargeError(f'行数超过限制 {self.max_lines}')
+        finally:
+            await chunks.aclose()
+
+        pending += decoder.decode(b'', final=True)
+        lines += write_rows(writer, request, [pending])
+        if lines > self.max_lines:
+            raise FileTooLargeError(f'行数超过限制 {self.max_lines}')
+
+        return {
+            'lines': lines,
+            'size': size,
+            'elapsed': time.perf_counter() - start_time
+        }
+
+    async def format_batch(self, request: HashRequest, lines: list) -> tuple:
+        "在工作线程中计算一批行，返回 (格式化后的文本, 行数)；行数达到 runner.parallel_lines 时拆成几段并行计算，按原顺序合并"
+
+        if self.runner is None:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, format_rows, request, lines)
+
+        parts = await self.runner.map_held(format_rows, [(request, part) for part in self.runner.split_lines(lines)])
+        return ''.join(text for text, _ in parts), sum(count for _, count in parts)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+
+def write_rows(writer, request: HashRequest, lines) -> int:
+    "计算每一行的哈希并写入 writer（可在工作线程中执行，结果不缓存），返回写入的行数"
+
+    count = 0
+    prototypes = {}
+    for line in lines:
+        value = line.strip()
+        if not value:
+            continue
+        digests = compute_digests(request, value, prototypes=prototypes)
+        writer.writerow([value, *(digests[algorithm] for algorithm in request.algorithms)])
+        count += 1
+    return count
+
+
+def format_rows(request: HashRequest, lines) -> tuple:
+    "计算每一行的哈希并格式化为 request.bulk 格式的文本（可在工作线程中执行），返回 (文本, 行数)"
+
+    buffer = io.StringIO()
+    count = write_rows(csv.writer(buffer, delimiter=BULK_FORMATS[request.bulk]), request, lines)
+    return buffer.getvalue(), count
+
+
+def is_asset_url(url) -> bool:
+    "url 是否指向 KOOK 资源服务器"
+
+    if not isinstance(url, str):
+        return False
+    try:
+        parsed = urlparse(url)
+        host = (parsed.hostname or '').lower()
+    except ValueError:
+        return False
+    if parsed.scheme not in ('http', 'https'):
+        return False
+    return any(host == name or host.endswith('.' + name) for name in ASSET_HOSTS)
+
+
+def find_attachment(msg) -> Optional[tuple]:
+    "查找消息附带或引用的文件（仅限 KOOK 资源地址），返回 (url, 文件名)"
+
+    extra = msg.extra or {}
+
+    attachments = extra.get('attachments')
+    if isinstance(attachments, dict) and is_asset_url(attachments.get('url')):
+        return attachments['url'], attachments.get('name', '')
+
+    #引用的文件/图片/视频消息，内容即为文件地址
+    quote = extra.get('quote')
+    if isinstance(quote, dict) and quote.get('type') in (2, 3, 4):
+        content = quote.get('content', '')
+        if is_asset_url(content):
+            return content, content.rsplit('/', 1)[-1]
+
+    return None
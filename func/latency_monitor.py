@@ -0,0 +1,108 @@
+import math
+import time
+import loguru
+import asyncio
+from collections import deque
+from typing import Dict, List, Optional
+
+from .latency_probe import LatencyProbe, summarize
+
+#统计窗口（秒）
+WINDOWS = {'1m': 60, '15m': 15 * 60}
+
+
+class LatencyMonitor:
+    "后台延迟监控：按固定间隔采样写入环形缓冲区，/ping 直接读取滚动窗口的统计；按需采样有频率限制并共享同一次测量"
+
+    def __init__(self, probe: LatencyProbe, interval: float = 10, refresh_interval: float = 5):
+        self.probe = probe
+        self.interval = interval
+        self.refresh_interval = refresh_interval
+        capacity = math.ceil(max(WINDOWS.values()) / min(interval, refresh_interval)) + 1
+        self.samples: Dict[str, deque] = {url: deque(maxlen=capacity) for url in probe.targets}   # url -> (时间, 延迟或 None)
+        self._inflight: Optional[asyncio.Future] = None
+        self._last_sample = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._background: Optional[asyncio.Task] = None
+
+    async def sample(self):
+        "每个目标探测一次并写入缓冲区"
+
+        self._last_sample = time.monotonic()
+        results = await asyncio.gather(*(self.probe.probe(url) for url in self.samples))
+        now = time.monotonic()
+        for url, latency in zip(self.samples, results):
+            self.samples[url].append((now, latency))
+
+    async def refresh(self):
+        "按需采样：正在测量时等待同一次测量，距离上次采样太近时直接返回"
+
+        if self._inflight is not None:
+            await asyncio.shield(self._inflight)
+            return
+        if time.monotonic() - self._last_sample < self.refresh_interval:
+            return
+
+        self._inflight = asyncio.ensure_future(self.sample())
+        try:
+            await asyncio.shield(self._inflight)
+        finally:
+            self._inflight = None
+
+    async def refresh_logged(self):
+        "按需采样，出错时只记录日志"
+
+        try:
+            await self.refresh()
+        except Exception as e:
+            #采样失败不影响下一次
+            loguru.logger.warning(f"延迟采样出错: {e}")
+
+    def refresh_soon(self):
+        "在后台按需采样，不等待结果"
+
+        if self._background is None or self._background.done():
+            self._background = asyncio.ensure_future(self.refresh_logged())
+
+    def is_stale(self) -> bool:
+        "最新的样本是否已经过时（后台采样错过了一次才算过时）"
+
+        newest = max((buffer[-1][0] for buffer in self.samples.values() if buffer), default=None)
+        return newest is None or time.monotonic() - newest > self.interval + self.refresh_interval
+
+    async def ensure_samples(self):
+        "还没有样本时等待一次测量；样本过时则在后台补测，直接使用现有样本"
+
+        if not any(self.samples.values()):
+            await self.refresh()
+        elif self.is_stale():
+            self.refresh_soon()
+
+    def snapshot(self) -> List[dict]:
+        "各目标的当前延迟和各窗口统计"
+
+        now = time.monotonic()
+        result = []
+        for url, buffer in self.samples.items():
+            latest = buffer[-1] if buffer else None
+            item = {
+                'target': url,
+                'current': latest[1] if latest else None,
+                'age': now - latest[0] if latest else None,
+            }
+            for name, seconds in WINDOWS.items():
+                item[name] = summarize(url, [latency for t, latency in buffer if now - t <= seconds])
+            item['host'] = item['1m']['host']
+            result.append(item)
+        return result
+
+    async def run(self):
+        "后台采样循环"
+
+        while True:
+            await self.refresh_logged()
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
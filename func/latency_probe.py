@@ -0,0 +1,75 @@
+import time
+import asyncio
+import aiohttp
+import statistics
+from typing import List, Optional
+from urllib.parse import urlparse
+
+
+def percentile(values: List[float], p: float) -> float:
+    "线性插值百分位数，values 需已排序"
+
+    if len(values) == 1:
+        return values[0]
+    index = (len(values) - 1) * p
+    lower = int(index)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (index - lower)
+
+
+def summarize(target: str, samples: List[Optional[float]]) -> dict:
+    "统计一组探测结果（毫秒，None 表示失败）"
+
+    latencies = [s for s in samples if s is not None]
+    result = {
+        'target': target,
+        'host': urlparse(target).netloc or target,
+        'sent': len(samples),
+        'received': len(latencies),
+        'loss': 1 - len(latencies) / len(samples) if samples else 1.0,
+    }
+    if not latencies:
+        return result
+
+    ordered = sorted(latencies)
+    result.update({
+        'min': ordered[0],
+        'p50': percentile(ordered, 0.5),
+        'p95': percentile(ordered, 0.95),
+        'max': ordered[-1],
+        #抖动：按发送顺序相邻两次延迟之差的平均值
+        'jitter': statistics.mean(abs(b - a) for a, b in zip(latencies, latencies[1:])) if len(latencies) > 1 else 0.0,
+    })
+    return result
+
+
+class LatencyProbe:
+    "HTTP 延迟探测：复用连接池，每次探测返回响应用时"
+
+    def __init__(self, targets: List[str], timeout: float = 5):
+        self.targets = targets
+        self.timeout = timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def session(self) -> aiohttp.ClientSession:
+        #复用连接（keep-alive），避免每次探测都重新握手
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self._session
+
+    async def probe(self, url: str) -> Optional[float]:
+        "单次探测，返回收到响应头的用时（毫秒），失败返回 None"
+
+        try:
+            start_time = time.perf_counter()
+            async with self.session().get(url) as response:
+                elapsed = (time.perf_counter() - start_time) * 1000
+                #读完响应体，连接才能复用
+                await response.read()
+            return elapsed if response.status < 500 else None
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return None
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
@@ -0,0 +1,103 @@
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class Leaderboard:
+    "增量维护的排行榜：分块有序列表，更新只移动一个块内的元素"
+
+    #每个块的目标大小
+    LOAD = 512
+
+    def __init__(self):
+        self._lists: List[List[tuple]] = []       # 有序块，元素为 排序键 + (玩家ID,)
+        self._maxes: List[tuple] = []             # 每个块的最大元素
+        self._keys: Dict[str, tuple] = {}         # 玩家ID -> 当前排序键
+
+    @classmethod
+    def build(cls, items: Iterable[Tuple[str, tuple]]) -> 'Leaderboard':
+        "批量构建 items: [(玩家ID, 排序键)]"
+
+        board = cls()
+        entries = []
+        for player_id, key in items:
+            board._keys[player_id] = key
+            entries.append(key + (player_id,))
+        entries.sort()
+
+        board._lists = [entries[i:i + cls.LOAD] for i in range(0, len(entries), cls.LOAD)]
+        board._maxes = [lst[-1] for lst in board._lists]
+        return board
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def update(self, player_id: str, key: tuple):
+        "更新玩家的排序键"
+
+        old = self._keys.get(player_id)
+        if old == key:
+            return
+        if old is not None:
+            self._remove(old + (player_id,))
+
+        self._keys[player_id] = key
+        self._insert(key + (player_id,))
+
+    def top(self, k: int) -> List[str]:
+        "前 k 名的玩家ID"
+
+        result = []
+        for lst in self._lists:
+            for entry in lst:
+                if len(result) >= k:
+                    return result
+                result.append(entry[-1])
+        return result
+
+    def rank(self, player_id: str) -> Optional[int]:
+        "玩家名次（从1开始），没有记录返回 None"
+
+        key = self._keys.get(player_id)
+        if key is None:
+            return None
+
+        entry = key + (player_id,)
+        pos = bisect_left(self._maxes, entry)
+        before = sum(len(lst) for lst in self._lists[:pos])
+        return before + bisect_left(self._lists[pos], entry) + 1
+
+    def _insert(self, entry: tuple):
+        if not self._maxes:
+            self._lists.append([entry])
+            self._maxes.append(entry)
+            return
+
+        pos = bisect_left(self._maxes, entry)
+        if pos == len(self._maxes):
+            #比所有元素都大，放到最后一块
+            pos -= 1
+            self._lists[pos].append(entry)
+            self._maxes[pos] = entry
+        else:
+            insort(self._lists[pos], entry)
+
+        #块过大时一分为二
+        lst = self._lists[pos]
+        if len(lst) > self.LOAD * 2:
+            half = lst[self.LOAD:]
+            del lst[self.LOAD:]
+            self._maxes[pos] = lst[-1]
+            self._lists.insert(pos + 1, half)
+            self._maxes.insert(pos + 1, half[-1])
+
+    def _remove(self, entry: tuple):
+        pos = bisect_left(self._maxes, entry)
+        lst = self._lists[pos]
+        index = bisect_left(lst, entry)
+        del lst[index]
+
+        if not lst:
+            del self._lists[pos]
+            del self._maxes[pos]
+        elif index == len(lst):
+            self._maxes[pos] = lst[-1]
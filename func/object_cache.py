@@ -0,0 +1,76 @@
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict
+
+
+class ObjectCache:
+    "异步对象缓存（TTL过期 + LRU淘汰），同一ID的并发未命中只发起一次请求"
+
+    def __init__(self, name: str, ttl: float = 300, max_size: int = 1024):
+        self.name = name
+        self.ttl = ttl
+        self.max_size = max_size
+        self._items: 'OrderedDict[str, tuple]' = OrderedDict()     # ID -> (过期时间, 对象)
+        self._pending: Dict[str, asyncio.Future] = {}              # ID -> 正在进行的请求
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key: str, loader: Callable[[str], Awaitable[Any]]) -> Any:
+        "获取对象，未命中或已过期时调用 loader(key) 加载"
+
+        item = self._items.get(key)
+        if item is not None:
+            if item[0] > time.monotonic():
+                self._items.move_to_end(key)
+                self.hits += 1
+                return item[1]
+            del self._items[key]
+
+        self.misses += 1
+
+        #已有相同ID的请求在进行，等待其结果
+        pending = self._pending.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            value = await loader(key)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            #避免无人等待时出现未获取异常的警告
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+            self.put(key, value)
+            return value
+        finally:
+            del self._pending[key]
+
+    def put(self, key: str, value: Any):
+        #写入缓存并淘汰最久未使用的对象
+        self._items[key] = (time.monotonic() + self.ttl, value)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def invalidate(self, key: str):
+        #移除缓存
+        self._items.pop(key, None)
+
+    def stats(self) -> dict:
+        #命中统计
+        total = self.hits + self.misses
+        return {
+            'name': self.name,
+            'size': len(self._items),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0
+        }
@@ -0,0 +1,120 @@
+import shlex
+import inspect
+from functools import partial
+from loguru import logger
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+class MessageRouter:
+    "消息路由：每条消息只分类一次（字典查找），并只调用一个处理函数"
+
+    def __init__(self, executor=None, metrics=None):
+        self.executor = executor                                # 串行执行器（ChannelExecutor）
+        self.metrics = metrics                                  # 命令耗时统计（CommandMetrics）
+        self.commands: Dict[str, Dict[str, Callable]] = {}      # 前缀 -> {命令名 -> 处理函数}
+        self.keywords: Dict[str, Callable] = {}                 # 完整消息关键词 -> 处理函数
+        self.prefix_keywords: Dict[str, Callable] = {}          # 消息开头关键词 -> 处理函数
+        self._prefix_lengths: List[int] = []
+        self._signatures: Dict[Callable, inspect.Signature] = {}
+        self._keys: Dict[Callable, Callable] = {}               # 处理函数 -> 串行执行的分组键
+
+    def command(self, name: str, prefixes: List[str] = ('/',), key: Callable = None):
+        "装饰器，注册命令（例如 /猜 50），key(msg) 返回值相同的消息按顺序串行处理"
+
+        def dec(func: Callable):
+            if key is not None:
+                self._keys[func] = key
+            for prefix in prefixes:
+                self.commands.setdefault(prefix, {})[name] = func
+                if len(prefix) not in self._prefix_lengths:
+                    self._prefix_lengths.append(len(prefix))
+            self._signatures[func] = inspect.signature(func)
+            return func
+
+        return dec
+
+    def keyword(self, *words: str, startswith: bool = False, key: Callable = None):
+        "装饰器，注册关键词消息（例如私信中的 状态、出牌 A 3）"
+
+        def dec(func: Callable):
+            if key is not None:
+                self._keys[func] = key
+            table = self.prefix_keywords if startswith else self.keywords
+            for word in words:
+                table[word] = func
+            return func
+
+        return dec
+
+    def classify(self, content: str) -> Tuple[Optional[Callable], Optional[str]]:
+        "分类消息，返回(处理函数, 命令名)，命令名为 None 表示关键词消息"
+
+        #命令：前缀 + 命令名
+        for length in self._prefix_lengths:
+            table = self.commands.get(content[:length])
+            if table is not None:
+                parts = content[length:].split(None, 1)
+                if parts:
+                    func = table.get(parts[0])
+                    if func is not None:
+                        return func, parts[0]
+
+        #关键词
+        func = self.keywords.get(content)
+        if func is not None:
+            return func, None
+
+        for word, func in self.prefix_keywords.items():
+            if content.startswith(word):
+                return func, None
+
+        return None, None
+
+    def parse_args(self, func: Callable, content: str) -> Optional[list]:
+        "按 shlex 拆分命令参数，并检查是否符合处理函数的参数"
+
+        try:
+            args = shlex.split(content)[1:]
+        except ValueError:
+            return None
+
+        try:
+            self._signatures[func].bind(None, *args)
+        except TypeError:
+            return None
+
+        return args
+
+    async def dispatch(self, msg) -> bool:
+        "路由一条消息，处理了返回 True"
+
+        if self.metrics is not None:
+            self.metrics.messages += 1
+
+        content = msg.content
+        if not content or not isinstance(content, str):
+            return False
+
+        content = content.strip()
+        func, name = self.classify(content)
+        if func is None:
+            return False
+
+        if name is None:
+            args = []
+        else:
+            args = self.parse_args(func, content)
+            if args is None:
+                logger.warning(f"命令 {name} 参数格式错误: {content}")
+                return False
+            logger.info(f"📝 用户 {msg.author.username} 执行了 {name} 命令")
+
+        #关键词消息按处理函数名统计
+        handler = func if self.metrics is None else partial(self.metrics.track, name or func.__name__, func)
+
+        key = self._keys.get(func)
+        if key is not None and self.executor is not None:
+            await self.executor.run(key(msg), lambda: handler(msg, *args))
+        else:
+            await handler(msg, *args)
+        return True
@@ -0,0 +1,187 @@
+import time
+import random
+import asyncio
+import itertools
+import contextvars
+from loguru import logger
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from khl.requester import HTTPRequester
+
+
+class TokenBucket:
+    "令牌桶：平均每秒 rate 个，最多积累 burst 个"
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, reserve: float = 0):
+        "取一个令牌；reserve 为需要给更高优先级留下的令牌数"
+
+        while True:
+            self._refill()
+            if self.tokens >= 1 + reserve:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 + reserve - self.tokens) / self.rate)
+
+
+class SendQueue:
+    "消息发送队列：按频道和全局令牌桶限速，遇到 429 按限速头或指数退避重试，游戏消息优先"
+
+    CRITICAL = 0        # 游戏进程相关（发牌、出牌、结果）
+    NORMAL = 1
+    COSMETIC = 2        # 可丢弃（ping、帮助、欢迎等）
+
+    def __init__(self, channel_rate: float = 1, channel_burst: int = 5, global_rate: float = 10, global_burst: int = 20,
+                 max_queue: int = 20, cosmetic_ttl: float = 10, max_retries: int = 3, base_delay: float = 1,
+                 idle_timeout: float = 60, rate_limits=None):
+        self.channel_rate = channel_rate
+        self.channel_burst = channel_burst
+        self.max_queue = max_queue                  # 单个频道超过该长度时丢弃可丢弃的消息
+        self.cosmetic_ttl = cosmetic_ttl            # 可丢弃的消息排队超过该时间后不再发送
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.idle_timeout = idle_timeout
+        self.rate_limits = rate_limits              # 提供 retry_after(route) 的对象（GatewayMetrics）
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.paused_until = 0.0                     # 收到 429 后所有频道暂停到该时间
+
+        self._queues: Dict[str, asyncio.PriorityQueue] = {}
+        self._workers: Dict[str, asyncio.Task] = {}
+        self._order = itertools.count()             # 同一优先级按先后顺序发送
+
+        self.sent = 0
+        self.dropped = 0
+        self.retried = 0
+        self.rate_limited = 0
+        self.failed = 0
+        self.max_depth = 0
+        self.total_wait = 0.0
+
+    def _reserve(self, priority: int) -> float:
+        #低优先级的消息要给更高优先级留出一部分全局令牌
+        return priority * self.global_bucket.burst / 4
+
+    async def send(self, key: str, func: Callable[[], Awaitable[Any]], priority: int = NORMAL) -> Any:
+        "把 func()（一次发送请求）放入 key 的队列，等待发送完成并返回结果；被丢弃时返回 None"
+
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = asyncio.PriorityQueue()
+
+        if priority >= self.COSMETIC and queue.qsize() >= self.max_queue:
+            self.dropped += 1
+            logger.warning(f"发送队列 {key} 已满，丢弃一条消息")
+            return None
+
+        #记下调用方的上下文，工作协程在其中发送（API 用时等计入发出消息的命令，而不是最先创建工作协程的命令）
+        context = contextvars.copy_context()
+        future = asyncio.get_running_loop().create_future()
+        queue.put_nowait((priority, next(self._order), time.monotonic(), func, context, future))
+        self.max_depth = max(self.max_depth, queue.qsize())
+
+        if key not in self._workers:
+            self._workers[key] = asyncio.create_task(self._worker(key, queue))
+
+        return await future
+
+    async def _worker(self, key: str, queue: asyncio.PriorityQueue):
+        bucket = TokenBucket(self.channel_rate, self.channel_burst)
+        try:
+            while True:
+                try:
+                    priority, _, queued_at, func, context, future = await asyncio.wait_for(queue.get(), self.idle_timeout)
+                except asyncio.TimeoutError:
+                    #空闲超时，回收该频道的工作协程
+                    if queue.empty():
+                        return
+                    continue
+
+                if future.cancelled():
+                    continue
+
+                await bucket.acquire()
+                wait = time.monotonic() - queued_at
+                if priority >= self.COSMETIC and wait > self.cosmetic_ttl:
+                    #已经过时的消息不再发送
+                    self.dropped += 1
+                    future.set_result(None)
+                    continue
+                self.total_wait += wait
+
+                try:
+                    #在调用方的上下文中创建发送任务
+                    result = await context.run(asyncio.create_task, self._send(func, priority))
+                except asyncio.CancelledError:
+                    future.cancel()
+                    raise
+                except Exception as e:
+                    self.failed += 1
+                    if not future.cancelled():
+                        future.set_exception(e)
+                else:
+                    self.sent += 1
+                    if not future.cancelled():
+                        future.set_result(result)
+        finally:
+            self._workers.pop(key, None)
+            if self._queues.get(key) is queue:
+                del self._queues[key]
+            #异常退出时取消剩余的消息
+            while not queue.empty():
+                future = queue.get_nowait()[-1]
+                future.cancel()
+
+    async def _send(self, func: Callable[[], Awaitable[Any]], priority: int) -> Any:
+        #发送一次，遇到 429 时退避重试
+        attempt = 0
+        while True:
+            delay = self.paused_until - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await self.global_bucket.acquire(self._reserve(priority))
+
+            try:
+                return await func()
+            except HTTPRequester.APIRequestFailed as e:
+                if e.err_code != 429 or attempt >= self.max_retries:
+                    raise
+                self.rate_limited += 1
+                delay = self.retry_delay(e.route, attempt)
+                self.paused_until = max(self.paused_until, time.monotonic() + delay)
+                self.retried += 1
+                attempt += 1
+                logger.warning(f"发送消息被限速（{e.route}），{delay:.2f}秒后第 {attempt} 次重试")
+
+    def retry_delay(self, route: str, attempt: int) -> float:
+        "优先使用限速头中的重置时间，否则指数退避；都加上随机抖动，避免同时重试"
+
+        delay: Optional[float] = None
+        if self.rate_limits is not None:
+            delay = self.rate_limits.retry_after(route)
+        if delay is None:
+            delay = self.base_delay * 2 ** attempt
+        return delay + random.uniform(0, self.base_delay / 2)
+
+    def stats(self) -> dict:
+        #队列深度、等待时间和丢弃数量
+        return {
+            'channels': len(self._workers),
+            'queued': sum(q.qsize() for q in self._queues.values()),
+            'max_depth': self.max_depth,
+            'sent': self.sent,
+            'dropped': self.dropped,
+            'retried': self.retried,
+            'rate_limited': self.rate_limited,
+            'failed': self.failed,
+            'avg_wait_ms': self.total_wait / (self.sent + self.failed) * 1000 if self.sent + self.failed else 0.0
+        }
@@ -0,0 +1,93 @@
+import os
+import sqlite3
+import threading
+from typing import Dict, List
+
+
+class StatsStore:
+    "猜数字玩家战绩的持久化存储（SQLite WAL 模式）"
+
+    FIELDS = ('name', 'wins', 'total_attempts', 'total_games', 'best_score', 'best_time')
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()       # 连接可能在不同的工作线程中使用
+
+    def _connect(self) -> sqlite3.Connection:
+        #延迟打开数据库
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS player_stats ('
+                'player_id TEXT PRIMARY KEY, name TEXT, wins INTEGER, total_attempts INTEGER, '
+                'total_games INTEGER, best_score INTEGER, best_time REAL)'
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def load_all(self) -> Dict[str, dict]:
+        "读取全部玩家战绩"
+
+        with self._lock:
+            rows = self._connect().execute(
+                f'SELECT player_id, {", ".join(self.FIELDS)} FROM player_stats'
+            ).fetchall()
+
+        return {row[0]: dict(zip(self.FIELDS, row[1:])) for row in rows}
+
+    def save(self, stats: Dict[str, dict]):
+        "批量写入玩家战绩（一次事务）"
+
+        if not stats:
+            return
+
+        rows: List[tuple] = [
+            (player_id, *(s[field] for field in self.FIELDS)) for player_id, s in stats.items()
+        ]
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.executemany(
+                    f'INSERT OR REPLACE INTO player_stats (player_id, {", ".join(self.FIELDS)}) '
+                    f'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    rows
+                )
+
+    def add(self, stats: Dict[str, dict]):
+        "把战绩增量累加到存储中（一次事务），用于历史战绩没有加载成功时"
+
+        if not stats:
+            return
+
+        rows: List[tuple] = [
+            (player_id, *(s[field] for field in self.FIELDS)) for player_id, s in stats.items()
+        ]
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.executemany(
+                    f'INSERT INTO player_stats (player_id, {", ".join(self.FIELDS)}) '
+                    f'VALUES (?, ?, ?, ?, ?, ?, ?) '
+                    f'ON CONFLICT(player_id) DO UPDATE SET '
+                    f'name = excluded.name, '
+                    f'wins = wins + excluded.wins, '
+                    f'total_attempts = total_attempts + excluded.total_attempts, '
+                    f'total_games = total_games + excluded.total_games, '
+                    f'best_score = MIN(best_score, excluded.best_score), '
+                    f'best_time = MIN(best_time, excluded.best_time)',
+                    rows
+                )
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
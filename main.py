@@ -6,21 +6,20 @@ kook机器人
 """
 
 import io
-import re
 import os
 import sys
 import time
 import random
 import aiohttp
+import tempfile
 import asyncio
 import datetime
 import traceback
-import statistics
 from loguru import logger
 from threading import Thread
 from dotenv import load_dotenv
-from typing import  Dict, List, Set
-from khl import Bot, Message, EventTypes, Event
+from typing import  Dict, List, Set, Tuple
+from khl import Bot, Message, EventTypes, Event, MessageTypes, PublicChannel
 from khl.card import Card, CardMessage, Module, Element, Types
 
 from config1 import get_json
@@ -34,7 +33,71 @@ BOT_TOKEN = os.getenv('BOT_TOKEN')
 bot = Bot(token=BOT_TOKEN)
 ADMIN_USER_IDS = os.getenv('ADMIN_USER_IDS')
 
-from func import guess_manager, GameSession, group_manager, Ch_Tavern, calculator
+from func import (
+    guess_manager, GameSession, group_manager, Ch_Tavern, calculator, HashCommandError,
+    DMFanout, ObjectCache, MessageRouter, CardTemplate, combine, StatsStore, ChannelExecutor,
+    HashJobRunner, HashBusyError, KdfJobRunner, KdfLimitError, result_cache, hmac_cache, HashStreamer, FileTooLargeError, find_attachment, format_result,
+    quick_throughput, LatencyProbe, LatencyMonitor, GatewayMetrics, CommandMetrics, SendQueue
+)
+
+#消息路由（所有命令和私信关键词），修改游戏状态的命令按频道串行执行
+channel_executor = ChannelExecutor(get_json.channel_idle_timeout)
+command_metrics = CommandMetrics()
+router = MessageRouter(channel_executor, command_metrics)
+
+def channel_key(msg: Message):
+    #同一频道的命令按顺序处理
+    return msg.ctx.channel.id
+
+def group_key(msg: Message):
+    #分组统计是全局状态，所有频道共用一个队列
+    return 'group'
+
+#KOOK 网关心跳和 API 请求延迟
+gateway_metrics = GatewayMetrics()
+gateway_metrics.install(bot)
+
+#消息发送队列：按频道和全局限速，被限速时退避重试，游戏消息优先
+send_queue = SendQueue(
+    channel_rate=get_json.send_channel_rate,
+    channel_burst=get_json.send_channel_burst,
+    global_rate=get_json.send_global_rate,
+    global_burst=get_json.send_global_burst,
+    max_queue=get_json.send_max_queue,
+    max_retries=get_json.send_max_retries,
+    rate_limits=gateway_metrics
+)
+
+def send_key(channel) -> str:
+    #私信和公共频道分开限速
+    return channel.id if isinstance(channel, PublicChannel) else f'user:{channel.id}'
+
+async def reply(msg: Message, *args, priority: int = SendQueue.NORMAL, **kwargs):
+    #经发送队列回复消息
+    return await send_queue.send(send_key(msg.ctx.channel), lambda: msg.reply(*args, **kwargs), priority)
+
+async def send_to(channel, *args, priority: int = SendQueue.NORMAL, **kwargs):
+    #经发送队列向频道发送消息
+    return await send_queue.send(send_key(channel), lambda: channel.send(*args, **kwargs), priority)
+
+#私信并发发送
+dm_fanout = DMFanout(get_json.dm_concurrency, send_queue)
+
+"""
+用户和频道对象缓存
+"""
+WELCOME_CHANNEL_ID = '7125355179539829'
+
+user_cache = ObjectCache('user', get_json.cache_ttl, get_json.cache_size)
+channel_cache = ObjectCache('channel', get_json.cache_ttl, get_json.cache_size)
+
+async def fetch_user_cached(user_id: str):
+    #获取用户（带缓存）
+    return await user_cache.get(user_id, bot.client.fetch_user)
+
+async def fetch_channel_cached(channel_id: str):
+    #获取公共频道（带缓存）
+    return await channel_cache.get(channel_id, bot.client.fetch_public_channel)
 
 
 """
@@ -43,10 +106,96 @@ from func import guess_manager, GameSession, group_manager, Ch_Tavern, calculato
 if get_json.log_create == 1:
     logger.add("log\kook_bot.log")
 
+"""
+通用卡片模板
+"""
+ERROR_CARD = CardTemplate(
+    Card(
+        Module.Section(
+            Element.Text(
+                f"⚠️ **系统错误**\n"
+                f"@@error_text@@，请稍后重试。",
+                type=Types.Text.KMD
+            )
+        ),
+        theme=Types.Theme.WARNING
+    )
+)
+
+PERMISSION_DENIED_CARD = CardTemplate(
+    Card(
+        Module.Section(
+            Element.Text(
+                f"⚠ 权限不足，请联系管理员",
+                type=Types.Text.KMD
+            )
+        ),
+        theme=Types.Theme.WARNING
+    )
+)
+
 """
 猜数字
 """
-@bot.command(name='猜', prefixes=['/'])
+#猜数字卡片模板
+NO_GAME_HINT_CARD = CardTemplate(
+    Card(
+        Module.Section(
+            Element.Text(
+                "❌ **没有进行中的游戏**\n"
+                "请先使用 `/新游戏` 开始游戏。",
+                type=Types.Text.KMD
+            )
+        ),
+        theme=Types.Theme.DANGER
+    )
+)
+
+NO_GAME_END_CARD = CardTemplate(
+    Card(
+        Module.Section(
+            Element.Text(
+                "❌ **没有进行中的游戏**\n"
+                "当前没有需要结束的游戏。",
+                type=Types.Text.KMD
+            )
+        ),
+        theme=Types.Theme.DANGER
+    )
+)
+
+NOT_OWNER_CARD = CardTemplate(
+    Card(
+        Module.Section(
+            Element.Text(
+                f"🚫 **权限不足**\n"
+                f"只有游戏创建者 @@player_name@@ 可以@@action@@。",
+                type=Types.Text.KMD
+            )
+        ),
+        theme=Types.Theme.WARNING
+    )
+)
+
+GUESS_RESULT_CARD = CardTemplate(
+    Card(
+        Module.Section(
+            Element.Text(
+                f"@@status_emoji@@ **猜测结果**\n"
+                f"@@message@@\n"
+                f"📊 尝试次数: @@attempts@@\n"
+                f"📝 历史猜测: @@history@@",
+                type=Types.Text.KMD
+            )
+        ),
+        Module.Context(
+            Element.Text("💡 使用 `/提示` 获取提示", type=Types.Text.KMD)
+        ),
+        theme=Types.Theme.INFO
+    )
+)
+
+@router.command(name='猜', prefixes=['/'], key=channel_key)
 async def guess_command(msg: Message, number: str, *args):
     #猜数字
     try:
@@ -72,7 +221,7 @@ async def guess_command(msg: Message, number: str, *args):
                 theme=Types.Theme.DANGER
             )
 
-            await msg.reply(CardMessage(card))
+            await reply(msg, CardMessage(card), priority=SendQueue.CRITICAL)
             return
 
         #获取当前游戏
@@ -94,11 +243,11 @@ async def guess_command(msg: Message, number: str, *args):
                 ),
                 theme=Types.Theme.INFO
             )
-            await msg.reply(CardMessage(card))
 
-            #处理第一次猜测
+            #处理第一次猜测，和开始卡片合并为一条消息
             result = game.make_guess(guess_num)
-            await send_guess_result(msg, result, game, is_first_guess = True)
+            content = combine(CardMessage(card), guess_result_content(result, game, is_first_guess = True))
+            await reply(msg, content, type=MessageTypes.CARD, priority=SendQueue.CRITICAL)
             return
 
         #检查是否是游戏创建者
@@ -114,7 +263,7 @@ async def guess_command(msg: Message, number: str, *args):
                 ),
                 theme=Types.Theme.WARNING
             )
-            await msg.reply(CardMessage(card))
+            await reply(msg, CardMessage(card), priority=SendQueue.CRITICAL)
             return
 
         #处理猜测
@@ -135,7 +284,7 @@ async def guess_command(msg: Message, number: str, *args):
         logger.warning(f"处理 /猜 命令时出错: {e}")
         await send_error_message(msg, "处理猜测命令时出现错误")
 
-@bot.command(name='新游戏', prefixes=['/'])
+@router.command(name='新游戏', prefixes=['/'], key=channel_key)
 async def newgame_command(msg: Message, *args):
     #开始新游戏新命令
     try:
@@ -167,13 +316,13 @@ async def newgame_command(msg: Message, *args):
             theme=Types.Theme.SUCCESS
         )
 
-        await msg.reply(CardMessage(card))
+        await reply(msg, CardMessage(card), priority=SendQueue.CRITICAL)
 
     except Exception as e:
         logger.warning(f"处理 /新游戏 命令时出错: {e}")
         await send_error_message(msg, "开始新游戏时出现错误")
 
-@bot.command(name='提示', prefixes=['/'])
+@router.command(name='提示', prefixes=['/'], key=channel_key)
 async def hint_command(msg: Message, *args):
     #提示
     try:
@@ -183,31 +332,11 @@ async def hint_command(msg: Message, *args):
         game = guess_manager.get_game(channel_id)
 
         if not game:
-            card = Card(
-                Module.Section(
-                    Element.Text(
-                        "❌ **没有进行中的游戏**\n"
-                        "请先使用 `/新游戏` 开始游戏。",
-                        type=Types.Text.KMD
-                    )
-                ),
-                theme=Types.Theme.DANGER
-            )
-            await msg.reply(CardMessage(card))
+            await reply(msg, NO_GAME_HINT_CARD.render(), type=MessageTypes.CARD, priority=SendQueue.CRITICAL)
             return
 
         if game.player_id != user_id:
-            card = Card(
-                Module.Section(
-                    Element.Text(
-                        f"🚫 **权限不足**\n"
-                        f"只有游戏创建者 {game.player_name} 可以获取提示。",
-                        type=Types.Text.KMD
-                    )
-                ),
-                theme=Types.Theme.WARNING
-            )
-            await msg.reply(CardMessage(card))
+            await reply(msg, NOT_OWNER_CARD.render(player_name=game.player_name, action="获取提示"), type=MessageTypes.CARD, priority=SendQueue.CRITICAL)
             return
 
         hint = game.get_hint()
@@ -225,13 +354,13 @@ async def hint_command(msg: Message, *args):
             theme=Types.Theme.INFO
         )
 
-        await msg.reply(CardMessage(card))
+        await reply(msg, CardMessage(card), priority=SendQueue.CRITICAL)
 
     except Exception as e:
         logger.warning(f"处理 /提示 命令时出错: {e}")
         await send_error_message(msg, "获取提示时出现错误")
 
-@bot.command(name='结束', prefixes=['/'])
+@router.command(name='结束', prefixes=['/'], key=channel_key)
 async def endgame_command(msg: Message, *args):
     #结束游戏
     try:
@@ -241,31 +370,11 @@ async def endgame_command(msg: Message, *args):
         game = guess_manager.get_game(channel_id)
 
         if not game:
-            card = Card(
-                Module.Section(
-                    Element.Text(
-                        "❌ **没有进行中的游戏**\n"
-                        "当前没有需要结束的游戏。",
-                        type=Types.Text.KMD
-                    )
-                ),
-                theme=Types.Theme.DANGER
-            )
-            await msg.reply(CardMessage(card))
+            await reply(msg, NO_GAME_END_CARD.render(), type=MessageTypes.CARD, priority=SendQueue.CRITICAL)
             return
 
         if game.player_id != user_id:
-            card = Card(
-                Module.Section(
-                    Element.Text(
-                        f"🚫 **权限不足**\n"
-                        f"只有游戏创建者 {game.player_name} 可以结束游戏。",
-                        type=Types.Text.KMD
-                    )
-                ),
-                theme=Types.Theme.WARNING
-            )
-            await msg.reply(CardMessage(card))
+            await reply(msg, NOT_OWNER_CARD.render(player_name=game.player_name, action="结束游戏"), type=MessageTypes.CARD, priority=SendQueue.CRITICAL)
             return
 
         #结束游戏并显示答案
@@ -285,16 +394,18 @@ async def endgame_command(msg: Message, *args):
             theme=Types.Theme.SECONDARY
         )
 
-        await msg.reply(CardMessage(card))
+        await reply(msg, CardMessage(card), priority=SendQueue.CRITICAL)
 
     except Exception as e:
         logger.warning(f"处理 /结束 命令时出错: {e}")
         await send_error_message(msg, "结束游戏时出现错误")
 
-@bot.command(name='排行榜', prefixes=['/'])
+@router.command(name='排行榜', prefixes=['/'])
 async def leaderboard_command(msg: Message, *args):
     #排行榜显示
     try:
+        #等待后台加载完成；加载失败时显示内存中的战绩
+        await guess_manager.load()
         leaderboard = guess_manager.get_leaderboard()
 
         if not leaderboard:
@@ -309,7 +420,7 @@ async def leaderboard_command(msg: Message, *args):
                 ),
                 theme=Types.Theme.INFO
             )
-            await msg.reply(CardMessage(card))
+            await reply(msg, CardMessage(card))
             return
 
         leaderboard_text = ""
@@ -321,6 +432,11 @@ async def leaderboard_command(msg: Message, *args):
                 f"⏱️ 最快: {player['best_time']:.1f}秒\n"
             )
 
+        #当前用户的名次
+        rank = guess_manager.get_rank(msg.author.id)
+        if rank is not None:
+            leaderboard_text += f"\n👤 你的排名: 第 {rank} 名"
+
         card = Card(
             Module.Header("🏆 猜数字排行榜"),
             Module.Section(
@@ -336,33 +452,27 @@ async def leaderboard_command(msg: Message, *args):
             theme=Types.Theme.SUCCESS
         )
 
-        await msg.reply(CardMessage(card))
+        await reply(msg, CardMessage(card))
 
     except Exception as e:
         logger.warning(f"处理 /排行榜 命令时出错: {e}")
         await send_error_message(msg, "显示排行榜时出现错误")
 
-async def send_guess_result(msg: Message, result: dict, game: GameSession, is_first_guess: bool, *args):
-    #发送猜测结果
+def guess_result_content(result: dict, game: GameSession, is_first_guess: bool) -> str:
+    #猜测结果卡片
     status_emoji = "🎯" if is_first_guess else "🔄"
 
-    card = Card(
-        Module.Section(
-            Element.Text(
-                f"{status_emoji} **猜测结果**\n"
-                f"{result['message']}\n"
-                f"📊 尝试次数: {game.attempts}\n"
-                f"📝 历史猜测: {', '.join(map(str, game.guess_history[-5:]))}",
-                type=Types.Text.KMD
-            )
-        ),
-        Module.Context(
-            Element.Text("💡 使用 `/提示` 获取提示", type=Types.Text.KMD)
-        ),
-        theme=Types.Theme.INFO
+    return GUESS_RESULT_CARD.render(
+        status_emoji=status_emoji,
+        message=result['message'],
+        attempts=game.attempts,
+        history=', '.join(map(str, game.guess_history[-5:]))
     )
 
-    await msg.reply(CardMessage(card))
+async def send_guess_result(msg: Message, result: dict, game: GameSession, is_first_guess: bool, *args):
+    #发送猜测结果
+    content = guess_result_content(result, game, is_first_guess)
+    await reply(msg, content, type=MessageTypes.CARD, priority=SendQueue.CRITICAL)
 
 async def send_victory_message(msg: Message, game: GameSession, time_taken: float, *args):
     #发送胜利消息
@@ -392,28 +502,50 @@ async def send_victory_message(msg: Message, game: GameSession, time_taken: floa
         theme=Types.Theme.SUCCESS
     )
 
-    await msg.reply(CardMessage(card))
+    await reply(msg, CardMessage(card), priority=SendQueue.CRITICAL)
 
 #处理错误消息
 async def send_error_message(msg: Message, error_text: str, *args):
-    card = Card(
-        Module.Section(
-            Element.Text(
-                f"⚠️ **系统错误**\n"
-                f"{error_text}，请稍后重试。",
-                type=Types.Text.KMD
-            )
-        ),
-        theme=Types.Theme.WARNING
-    )
+    await reply(msg, ERROR_CARD.render(error_text=error_text), type=MessageTypes.CARD)
+
+#战绩持久化：胜利只修改内存，定时批量写入数据库
+guess_manager.attach_store(StatsStore(get_json.stats_db))
+stats_tasks = []
+
+async def flush_guess_stats():
+    #把未写入的战绩批量写入数据库
+    if not guess_manager.loaded and guess_manager.dirty_count:
+        #历史战绩还没加载成功：重新加载，成功后再写入
+        if not await guess_manager.load():
+            logger.warning(f"猜数字历史战绩尚未加载，暂不写入 {guess_manager.dirty_count} 名玩家的战绩")
+            return
 
-    await  msg.reply(CardMessage(card))
+    stats = guess_manager.take_dirty()
+    if not stats:
+        return
+
+    try:
+        await asyncio.to_thread(guess_manager.store.save, stats)
+    except Exception as e:
+        guess_manager.mark_dirty(stats.keys())
+        logger.warning(f"写入猜数字战绩时出错: {e}")
+
+async def guess_stats_flush_loop():
+    while True:
+        await asyncio.sleep(get_json.stats_flush_interval)
+        await flush_guess_stats()
+
+@bot.on_startup
+async def start_guess_stats(bot: Bot):
+    #后台加载历史战绩，不阻塞机器人上线
+    stats_tasks.append(asyncio.create_task(guess_manager.load()))
+    stats_tasks.append(asyncio.create_task(guess_stats_flush_loop()))
 
 
 """
 分组功能
 """
-@bot.command(name="start", prefixes=['/'])
+@router.command(name="start", prefixes=['/'], key=group_key)
 async def start_command(msg:Message, *args):
     try:
         if group_manager.is_collecting:
@@ -426,7 +558,7 @@ async def start_command(msg:Message, *args):
                     )
                 )
             )
-            await msg.reply(CardMessage(card))
+            await reply(msg, CardMessage(card), priority=SendQueue.CRITICAL)
             return
 
         #开始新的统计
@@ -451,13 +583,13 @@ async def start_command(msg:Message, *args):
             theme=Types.Theme.SUCCESS
         )
 
-        await msg.reply(CardMessage(card))
+        await reply(msg, CardMessage(card), priority=SendQueue.CRITICAL)
 
     except Exception as e:
         logger.warning(f"处理 /start 命令时出错：{e}")
         await send_error_message(msg, "处理开始命令时出现错误")
 
-@bot.command(name='j', prefixes=['/'])
+@router.command(name='j', prefixes=['/'], key=group_key)
 async def join_command(msg: Message, *args):
     #报名参加分组命令
     try:
@@ -473,7 +605,7 @@ async def join_command(msg: Message, *args):
                 ),
                 theme=Types.Theme.DANGER
             )
-            await  msg.reply(CardMessage(card))
+            await  reply(msg, CardMessage(card), priority=SendQueue.CRITICAL)
             return
 
         user_id = msg.author.id
@@ -491,7 +623,7 @@ async def join_command(msg: Message, *args):
                 ),
                 theme=Types.Theme.INFO
             )
-            await msg.reply(CardMessage(card))
+            await reply(msg, CardMessage(card), priority=SendQueue.CRITICAL)
             return
 
         #添加参与者
@@ -512,13 +644,13 @@ async def join_command(msg: Message, *args):
             theme=Types.Theme.SUCCESS
         )
 
-        await msg.reply(CardMessage(card))
+        await reply(msg, CardMessage(card), priority=SendQueue.CRITICAL)
 
     except Exception as e:
         logger.warning(f"处理 /j 命令时出错: {e}")
         await send_error_message(msg, "处理报名命令时出现错误")
 
-@bot.command(name='end', prefixes=['/'])
+@router.command(name='end', prefixes=['/'], key=group_key)
 async def end_command(msg: Message, group_count: str, *args):
     #结束统计并分组命令
     try:
@@ -534,7 +666,7 @@ async def end_command(msg: Message, group_count: str, *args):
                 ),
                 theme=Types.Theme.DANGER
             )
-            await msg.reply(CardMessage(card))
+            await reply(msg, CardMessage(card), priority=SendQueue.CRITICAL)
             return
 
         #解析组数参数
@@ -553,7 +685,7 @@ async def end_command(msg: Message, group_count: str, *args):
                 ),
                 theme=Types.Theme.DANGER
             )
-            await msg.reply(CardMessage(card))
+            await reply(msg, CardMessage(card), priority=SendQueue.CRITICAL)
             return
 
         total_participants = group_manager.get_participant_count()
@@ -569,7 +701,7 @@ async def end_command(msg: Message, group_count: str, *args):
                 ),
                 theme=Types.Theme.DANGER
             )
-            await msg.reply(CardMessage(card))
+            await reply(msg, CardMessage(card), priority=SendQueue.CRITICAL)
             return
 
         if n > total_participants:
@@ -584,7 +716,7 @@ async def end_command(msg: Message, group_count: str, *args):
                 ),
                 theme=Types.Theme.DANGER
             )
-            await msg.reply(CardMessage(card))
+            await reply(msg, CardMessage(card), priority=SendQueue.CRITICAL)
             return
 
         #生成分组
@@ -613,13 +745,13 @@ async def end_command(msg: Message, group_count: str, *args):
             ),
             theme=Types.Theme.SUCCESS
         )
-        await  msg.reply(CardMessage(card))
+        await  reply(msg, CardMessage(card), priority=SendQueue.CRITICAL)
 
     except Exception as e:
         logger.warning(f"处理 /end 命令时出错：{e}")
         await send_error_message(msg,"处理结束命令时出现错误")
 
-@bot.command(name="status", prefixes=['/'])
+@router.command(name="status", prefixes=['/'])
 async def status_command(msg: Message, *args):
     #查看当前统计状态
     try:
@@ -655,7 +787,7 @@ async def status_command(msg: Message, *args):
                 theme=Types.Theme.INFO
             )
 
-        await msg.reply(CardMessage(card))
+        await reply(msg, CardMessage(card), priority=SendQueue.CRITICAL)
 
     except Exception as e:
         logger.warning(f"处理 /status 命令时出错: {e}")
@@ -667,10 +799,52 @@ async def status_command(msg: Message, *args):
 #储存游戏状态
 games = {}
 
+#玩家索引：用户ID -> (频道ID, 玩家序号)，私信出牌时直接定位所在游戏
+player_index: Dict[str, tuple] = {}
+
+def find_player_game(user_id):
+    #通过玩家索引查找该用户参与的游戏
+    entry = player_index.get(user_id)
+    if entry is None:
+        return None, None, None
+
+    channel_id, index = entry
+    game = games.get(channel_id)
+    if game is None or index >= len(game['players']) or game['players'][index]['id'] != user_id:
+        #游戏已不存在或玩家已不在该游戏中，清理过期索引
+        del player_index[user_id]
+        return None, None, None
+
+    return game, channel_id, index
+
+def tavern_key(msg: Message):
+    #私信出牌按玩家所在游戏的频道串行处理
+    _, channel_id, _ = find_player_game(msg.author.id)
+    return channel_id or msg.ctx.channel.id
+
+def unindex_player(user_id, channel_id):
+    #移除玩家索引（只移除指向该频道的索引）
+    entry = player_index.get(user_id)
+    if entry is not None and entry[0] == channel_id:
+        del player_index[user_id]
+
+def leave_waiting_game(user_id):
+    #把玩家移出尚未开始的游戏房间（房间可能一直没人开始，不能因此无法加入其他游戏），返回该房间的频道ID
+    game, channel_id, index = find_player_game(user_id)
+    if game is None or game['status'] != 'waiting':
+        return None
+
+    del game['players'][index]
+    del player_index[user_id]
+    #后面的玩家序号前移
+    for i, player in enumerate(game['players'][index:], index):
+        player_index[player['id']] = (channel_id, i)
+    return channel_id
+
 #定义扑克牌
 CARDS = ['A', 'K', 'Q'] * 6 + ['JOKER'] * 2
 
-@bot.command(name='创建游戏', prefixes=['/'])
+@router.command(name='创建游戏', prefixes=['/'], key=channel_key)
 async def start_game_command(msg: Message, *args):
     channel_id = msg.ctx.channel.id
     if channel_id in games:
@@ -684,7 +858,7 @@ async def start_game_command(msg: Message, *args):
             theme=Types.Theme.DANGER
         )
 
-        await msg.reply(CardMessage(card))
+        await reply(msg, CardMessage(card), priority=SendQueue.CRITICAL)
         return
 
     # 初始化新游戏
@@ -709,9 +883,9 @@ async def start_game_command(msg: Message, *args):
         theme=Types.Theme.SUCCESS
     )
 
-    await msg.reply(CardMessage(card))
+    await reply(msg, CardMessage(card), priority=SendQueue.CRITICAL)
 
-@bot.command(name='加入游戏', prefixes=['/'])
+@router.command(name='加入游戏', prefixes=['/'], key=channel_key)
 async def join_game_command(msg: Message, *args):
     channel_id = msg.ctx.channel.id
     user_id = msg.author.id
@@ -729,7 +903,7 @@ async def join_game_command(msg: Message, *args):
             theme=Types.Theme.DANGER
         )
 
-        await msg.ctx.channel.send(CardMessage(card), temp_target_id = msg.author.id)
+        await send_to(msg.ctx.channel, CardMessage(card), temp_target_id = msg.author.id, priority=SendQueue.CRITICAL)
         return
 
     game = games[channel_id]
@@ -744,7 +918,7 @@ async def join_game_command(msg: Message, *args):
             theme=Types.Theme.DANGER
         )
 
-        await msg.ctx.channel.send(CardMessage(card), temp_target_id = msg.author.id)
+        await send_to(msg.ctx.channel, CardMessage(card), temp_target_id = msg.author.id, priority=SendQueue.CRITICAL)
         return
 
     #检查玩家是否已加入
@@ -761,10 +935,29 @@ async def join_game_command(msg: Message, *args):
                 theme=Types.Theme.SECONDARY
             )
 
-            await msg.ctx.channel.send(CardMessage(card), temp_target_id = msg.author.id)
+            await send_to(msg.ctx.channel, CardMessage(card), temp_target_id = msg.author.id, priority=SendQueue.CRITICAL)
             return
 
+    #每个玩家同时只能参加一局游戏，私信出牌才能找到对应的游戏；其他频道的游戏还没开始时直接转到这里
+    left_channel_id = leave_waiting_game(user_id)
+    _, other_channel_id, _ = find_player_game(user_id)
+    if other_channel_id is not None and other_channel_id != channel_id:
+        card = Card(
+            Module.Section(
+                Element.Text(
+                    f'{user_name} 已经在其他频道的游戏中了！\n'
+                    f"请先完成当前游戏再加入新的游戏",
+                    type=Types.Text.KMD
+                )
+            ),
+            theme=Types.Theme.DANGER
+        )
+
+        await send_to(msg.ctx.channel, CardMessage(card), temp_target_id = msg.author.id, priority=SendQueue.CRITICAL)
+        return
+
     #添加玩家
+    player_index[user_id] = (channel_id, len(game['players']))
     game['players'].append({
         'id': user_id,
         'name': user_name,
@@ -778,16 +971,17 @@ async def join_game_command(msg: Message, *args):
         Module.Section(
             Element.Text(
                 f'{user_name} 已加入游戏！当前玩家数量：{len(game["players"])}\n'
-                f"请等待房主开始游戏",
+                + (f"（已退出其他频道尚未开始的游戏）\n" if left_channel_id else "")
+                + f"请等待房主开始游戏",
                 type=Types.Text.KMD
             )
         ),
         theme=Types.Theme.SUCCESS
     )
 
-    await msg.reply(CardMessage(card))
+    await reply(msg, CardMessage(card), priority=SendQueue.CRITICAL)
 
-@bot.command(name='开始游戏', prefixes=['/'])
+@router.command(name='开始游戏', prefixes=['/'], key=channel_key)
 async def begin_game_command(msg: Message, *args):
     channel_id = msg.ctx.channel.id
     if channel_id not in games:
@@ -802,7 +996,7 @@ async def begin_game_command(msg: Message, *args):
             theme=Types.Theme.DANGER
         )
 
-        await msg.reply(CardMessage(card))
+        await reply(msg, CardMessage(card), priority=SendQueue.CRITICAL)
         return
 
     game = games[channel_id]
@@ -818,7 +1012,7 @@ async def begin_game_command(msg: Message, *args):
             theme=Types.Theme.DANGER
         )
 
-        await msg.ctx.channel.send(CardMessage(card), temp_target_id = msg.author.id)
+        await send_to(msg.ctx.channel, CardMessage(card), temp_target_id = msg.author.id, priority=SendQueue.CRITICAL)
         return
 
     # 检查玩家数量
@@ -834,7 +1028,7 @@ async def begin_game_command(msg: Message, *args):
             theme=Types.Theme.WARNING
         )
 
-        await msg.reply(CardMessage(card))
+        await reply(msg, CardMessage(card), priority=SendQueue.CRITICAL)
         return
 
     # 开始游戏
@@ -859,39 +1053,26 @@ async def begin_game_command(msg: Message, *args):
         player['chamber_position'] = Ch_Tavern.spin_chamber()
 
     # 通过私信发送手牌给每个玩家
+    messages = []
     for player in game['players']:
         cards_str = ', '.join(player['cards'])
-        try:
-            user = await bot.client.fetch_user(player['id'])
-
-            card = Card(
-                Module.Section(
-                    Element.Text(
-                        f'你的手牌是: {cards_str}\n'
-                        f'目标牌是: {game["target_card"]}\n'
-                        f'发送 "状态" 可以随时查看游戏状态。\n'
-                        f'出牌格式：出牌 牌名 声明数量（例如：出牌 A 3）',
-                        type=Types.Text.KMD
-                    )
-                ),
-                theme=Types.Theme.INFO
-            )
-
-            await user.send(CardMessage(card))
-
-        except Exception as e:
-            # 如果无法发送私信，就在频道中提示
-            card = Card(
-                Module.Section(
-                    Element.Text(
-                        f'无法向 {player["name"]} 发送私信，请检查隐私设置。',
-                        type=Types.Text.KMD
-                    )
-                ),
-                theme=Types.Theme.WARNING
-            )
+        card = Card(
+            Module.Section(
+                Element.Text(
+                    f'你的手牌是: {cards_str}\n'
+                    f'目标牌是: {game["target_card"]}\n'
+                    f'发送 "状态" 可以随时查看游戏状态。\n'
+                    f'出牌格式：出牌 牌名 声明数量（例如：出牌 A 3）',
+                    type=Types.Text.KMD
+                )
+            ),
+            theme=Types.Theme.INFO
+        )
+        messages.append((player['id'], player['name'], CardMessage(card)))
 
-            await msg.reply(CardMessage(card))
+    failed, _ = await dm_fanout.send_all(fetch_user_cached, messages)
+    # 如果无法发送私信，就在频道中统一提示
+    await send_dm_failed_notice(msg, failed)
 
     # 确定第一个玩家
     game['current_player'] = 0
@@ -912,16 +1093,13 @@ async def begin_game_command(msg: Message, *args):
         theme=Types.Theme.SECONDARY
     )
 
-    await msg.reply(CardMessage(card))
+    await reply(msg, CardMessage(card), priority=SendQueue.CRITICAL)
 
 # 处理私信出牌
-@bot.on_message()
+@router.keyword('出牌', startswith=True, key=tavern_key)
+@router.keyword('状态', 'status', key=tavern_key)
 async def handle_private_play(msg: Message):
-    # 检查是否是出牌指令格式
     content = msg.content.strip()
-    if not (content.startswith('出牌') or content == '状态' or content == 'status'):
-        # 如果不是我们关心的指令，直接返回
-        return
 
     if content.startswith('出牌'):
         # 处理出牌指令
@@ -939,7 +1117,7 @@ async def handle_private_play(msg: Message):
                 theme=Types.Theme.DANGER
             )
 
-            await msg.reply(CardMessage(card))
+            await reply(msg, CardMessage(card), priority=SendQueue.CRITICAL)
             return
 
         card = parts[1]
@@ -956,25 +1134,13 @@ async def handle_private_play(msg: Message):
                 theme=Types.Theme.DANGER
             )
 
-            await msg.reply(CardMessage(card_vl))
+            await reply(msg, CardMessage(card_vl), priority=SendQueue.CRITICAL)
             return
 
         user_id = msg.author.id
 
         # 查找该用户参与的游戏
-        game = None
-        channel_id = None
-        player_index = None
-
-        for gid, g in games.items():
-            for i, p in enumerate(g['players']):
-                if p['id'] == user_id:
-                    game = g
-                    channel_id = gid
-                    player_index = i
-                    break
-            if game:
-                break
+        game, channel_id, _ = find_player_game(user_id)
 
         if not game or not channel_id:
             card = Card(
@@ -987,11 +1153,11 @@ async def handle_private_play(msg: Message):
                 theme=Types.Theme.DANGER
             )
 
-            await msg.reply(CardMessage(card))
+            await reply(msg, CardMessage(card), priority=SendQueue.CRITICAL)
             return
 
         if game['status'] != 'playing':
-            await msg.reply()
+            await reply(msg, priority=SendQueue.CRITICAL)
             return
 
         # 检查是否是当前玩家
@@ -999,7 +1165,7 @@ async def handle_private_play(msg: Message):
         if current_player['id'] != user_id:
             # 非当前玩家尝试出牌，发送警告
             try:
-                channel = await bot.client.fetch_public_channel(channel_id)
+                channel = await fetch_channel_cached(channel_id)
                 card_op = Card(
                     Module.Section(
                         Element.Text(
@@ -1010,10 +1176,10 @@ async def handle_private_play(msg: Message):
                     theme=Types.Theme.DANGER
                 )
 
-                await channel.send(CardMessage(card_op))
+                await send_to(channel, CardMessage(card_op))
 
-            except:
-                pass
+            except Exception as e:
+                logger.warning(f"发送非回合出牌警告失败: {e}")
 
             card_or = Card(
                 Module.Section(
@@ -1025,7 +1191,7 @@ async def handle_private_play(msg: Message):
                 theme=Types.Theme.DANGER
             )
 
-            await msg.reply(CardMessage(card_or))
+            await reply(msg, CardMessage(card_or), priority=SendQueue.CRITICAL)
             return
 
         # 检查玩家是否还有牌
@@ -1040,7 +1206,7 @@ async def handle_private_play(msg: Message):
                 theme=Types.Theme.DANGER
             )
 
-            await msg.reply(CardMessage(card_hc))
+            await reply(msg, CardMessage(card_hc), priority=SendQueue.CRITICAL)
             return
 
         # 检查是否有这张牌
@@ -1055,7 +1221,7 @@ async def handle_private_play(msg: Message):
                 theme=Types.Theme.DANGER
             )
 
-            await msg.reply(CardMessage(card_nc))
+            await reply(msg, CardMessage(card_nc), priority=SendQueue.CRITICAL)
             return
 
         # 从玩家手中移除这张牌
@@ -1075,7 +1241,7 @@ async def handle_private_play(msg: Message):
 
         # 在游戏频道中公布出牌信息（不显示具体牌面）
         try:
-            channel = await bot.client.fetch_public_channel(channel_id)
+            channel = await fetch_channel_cached(channel_id)
             card_np = Card(
                 Module.Section(
                     Element.Text(
@@ -1087,9 +1253,9 @@ async def handle_private_play(msg: Message):
                 theme=Types.Theme.SUCCESS
             )
 
-            await channel.send(CardMessage(card_np))
-        except:
-            pass
+            await send_to(channel, CardMessage(card_np), priority=SendQueue.CRITICAL)
+        except Exception as e:
+            logger.warning(f"公布出牌信息失败: {e}")
 
         # 私信回复确认（不显示具体出牌内容）
         card_pl = Card(
@@ -1103,7 +1269,7 @@ async def handle_private_play(msg: Message):
             theme=Types.Theme.SUCCESS
         )
 
-        await msg.reply(CardMessage(card_pl))
+        await reply(msg, CardMessage(card_pl), priority=SendQueue.CRITICAL)
 
     elif content == '状态' or content == 'status':
         await send_game_status(msg)
@@ -1113,19 +1279,7 @@ async def send_game_status(msg: Message, *args):
     user_id = msg.author.id
 
     # 查找该用户参与的游戏
-    game = None
-    channel_id = None
-    player = None
-
-    for gid, g in games.items():
-        for p in g['players']:
-            if p['id'] == user_id:
-                game = g
-                channel_id = gid
-                player = p
-                break
-        if game:
-            break
+    game, channel_id, index = find_player_game(user_id)
 
     if not game or not channel_id:
         card_npn = Card(
@@ -1138,7 +1292,7 @@ async def send_game_status(msg: Message, *args):
             theme=Types.Theme.DANGER
         )
 
-        await msg.reply(CardMessage(card_npn))
+        await reply(msg, CardMessage(card_npn), priority=SendQueue.CRITICAL)
         return
 
     if game['status'] != 'playing':
@@ -1153,10 +1307,11 @@ async def send_game_status(msg: Message, *args):
             theme=Types.Theme.DANGER
         )
 
-        await msg.reply(CardMessage(card_ns))
+        await reply(msg, CardMessage(card_ns), priority=SendQueue.CRITICAL)
         return
 
     # 构造状态信息
+    player = game['players'][index]
     current_player = game['players'][game['current_player']]
     alive_players = [p for p in game['players'] if p['alive']]
 
@@ -1166,7 +1321,7 @@ async def send_game_status(msg: Message, *args):
     status_info += f"你的手牌：{', '.join(player['cards'])}\n"
     status_info += f"存活玩家：{', '.join([p['name'] for p in alive_players])}\n"
 
-    await msg.reply(status_info)
+    await reply(msg, status_info, priority=SendQueue.CRITICAL)
 
 
 # 处理游戏结束
@@ -1186,7 +1341,7 @@ async def handle_game_end(channel_id, msg, alive_players, *args):
             theme=Types.Theme.SUCCESS
         )
 
-        await msg.reply(CardMessage(card_win))
+        await reply(msg, CardMessage(card_win), priority=SendQueue.CRITICAL)
         # 发送游戏结果通知
         await send_game_result_notifications(channel_id, winner)
     else:
@@ -1200,9 +1355,13 @@ async def handle_game_end(channel_id, msg, alive_players, *args):
             theme=Types.Theme.INFO
         )
 
-        await msg.reply(CardMessage(card_ash))
+        await reply(msg, CardMessage(card_ash), priority=SendQueue.CRITICAL)
         # 发送游戏结果通知
         await send_game_result_notifications(channel_id)
+
+    # 清除该频道所有玩家的索引
+    for player in games[channel_id]['players']:
+        unindex_player(player['id'], channel_id)
     del games[channel_id]
 
     # 清除该频道的俄罗斯轮盘状态
@@ -1232,17 +1391,33 @@ async def send_game_result_notifications(channel_id, winner=None, *args):
     else:
         result_info = f"游戏结束！所有玩家都被淘汰！\n感谢参与游戏。"
 
-    # 向所有参与游戏的玩家发送结果通知
-    for player in game['players']:
-        try:
-            user = await bot.client.fetch_user(player['id'])
-            await user.send(result_info)
-        except Exception as e:
-            # 如果无法发送私信，忽略错误
-            pass
+    # 向所有参与游戏的玩家发送结果通知（无法发送私信则忽略）
+    messages = [(player['id'], player['name'], result_info) for player in game['players']]
+    await dm_fanout.send_all(fetch_user_cached, messages)
+
+
+# 私信发送失败的玩家汇总卡片
+def dm_failed_card(failed: List[str]) -> Card:
+    return Card(
+        Module.Section(
+            Element.Text(
+                f'无法向 {"、".join(failed)} 发送私信，请检查隐私设置。',
+                type=Types.Text.KMD
+            )
+        ),
+        theme=Types.Theme.WARNING
+    )
+
+
+# 汇总私信发送失败的玩家，在频道中提示一次
+async def send_dm_failed_notice(msg: Message, failed: List[str], *args):
+    if not failed:
+        return
 
+    await reply(msg, CardMessage(dm_failed_card(failed)), priority=SendQueue.CRITICAL)
 
-@bot.command(name='质疑', prefixes=['/'])
+
+@router.command(name='质疑', prefixes=['/'], key=channel_key)
 async def challenge(msg: Message, *args):
     channel_id = msg.ctx.channel.id
     user_id = msg.author.id
@@ -1258,7 +1433,7 @@ async def challenge(msg: Message, *args):
             theme=Types.Theme.DANGER
         )
 
-        await msg.reply(CardMessage(card))
+        await reply(msg, CardMessage(card), priority=SendQueue.CRITICAL)
         return
 
     game = games[channel_id]
@@ -1274,7 +1449,7 @@ async def challenge(msg: Message, *args):
             theme=Types.Theme.DANGER
         )
 
-        await msg.reply(CardMessage(card))
+        await reply(msg, CardMessage(card), priority=SendQueue.CRITICAL)
         return
 
     # 检查是否是当前玩家
@@ -1291,7 +1466,7 @@ async def challenge(msg: Message, *args):
             theme=Types.Theme.DANGER
         )
 
-        await msg.reply(CardMessage(card))
+        await reply(msg, CardMessage(card), priority=SendQueue.CRITICAL)
         return
 
     if not game['last_declared_card'] or not game['last_player']:
@@ -1306,7 +1481,7 @@ async def challenge(msg: Message, *args):
             theme=Types.Theme.DANGER
         )
 
-        await msg.reply(CardMessage(card))
+        await reply(msg, CardMessage(card), priority=SendQueue.CRITICAL)
         return
 
     # 检查上一个玩家出的牌是否属实
@@ -1345,6 +1520,7 @@ async def challenge(msg: Message, *args):
     if random.random() < eliminated_probability:
         # 被淘汰
         roulette_player['alive'] = False
+        unindex_player(roulette_player['id'], channel_id)
         result_msg += f'Bang! {roulette_player["name"]}被淘汰了！'
         color = Types.Theme.DANGER
 
@@ -1369,15 +1545,17 @@ async def challenge(msg: Message, *args):
                 theme=color
             )
 
-    await msg.reply(CardMessage(card))
+    # 重新发牌：私信在后台发送，轮盘结果和下一位出牌的玩家合并为一条消息先公布
+    fanout, next_card = deal_cards(game)
+    await reply(msg, CardMessage(card, next_card), priority=SendQueue.CRITICAL)
 
-    # 重新发牌
-    await deal_cards(msg, game)
+    failed, _ = await fanout
+    await send_dm_failed_notice(msg, failed)
 
 
 #重新发牌
-async def deal_cards(msg: Message, game, *args):
-    """重新发牌"""
+def deal_cards(game, *args) -> Tuple[asyncio.Task, Card]:
+    """重新发牌，在后台私信发送新牌，返回(私信发送任务, 需要在频道中公布的卡片)"""
     # 重置牌堆
     game['deck'] = CARDS.copy()
     random.shuffle(game['deck'])
@@ -1397,37 +1575,24 @@ async def deal_cards(msg: Message, game, *args):
         player['chamber_position'] = Ch_Tavern.spin_chamber()
 
     # 通过私信发送新牌给每个玩家
+    messages = []
     for player in alive_players:
         cards_str = ', '.join(player['cards'])
-        try:
-            user = await bot.client.fetch_user(player['id'])
-            card = Card(
-                Module.Section(
-                    Element.Text(
-                        f'重新发牌完成！你的新牌是: {cards_str}\n'
-                        f'目标牌是: {game["target_card"]}\n'
-                        f'发送"状态"可以随时查看游戏状态。\n'
-                        f'出牌格式：出牌 牌名 声明数量（例如：出牌 A 3）',
-                        type=Types.Text.KMD
-                    )
-                ),
-                theme=Types.Theme.SUCCESS
-            )
-
-            await user.send(CardMessage(card))
-
-        except Exception as e:
-            card = Card(
-                Module.Section(
-                    Element.Text(
-                        f'无法向 {player["name"]} 发送私信，请检查隐私设置。',
-                        type=Types.Text.KMD
-                    )
-                ),
-                theme=Types.Theme.WARNING
-            )
+        card = Card(
+            Module.Section(
+                Element.Text(
+                    f'重新发牌完成！你的新牌是: {cards_str}\n'
+                    f'目标牌是: {game["target_card"]}\n'
+                    f'发送"状态"可以随时查看游戏状态。\n'
+                    f'出牌格式：出牌 牌名 声明数量（例如：出牌 A 3）',
+                    type=Types.Text.KMD
+                )
+            ),
+            theme=Types.Theme.SUCCESS
+        )
+        messages.append((player['id'], player['name'], CardMessage(card)))
 
-            await msg.reply(CardMessage(card))
+    fanout = asyncio.create_task(dm_fanout.send_all(fetch_user_cached, messages))
 
     # 确定下一个玩家
     alive_player_ids = [p['id'] for p in alive_players]
@@ -1451,17 +1616,146 @@ async def deal_cards(msg: Message, game, *args):
         theme=Types.Theme.SUCCESS
     )
 
-    await msg.reply(CardMessage(card))
+    return fanout, card
 
 """
 哈希值计算
 """
-@bot.command(name='hash', prefixes=['/'])
+#大任务交给线程池，并限制同时计算的任务数；批量模式的大批次可拆给多个工作线程（hash_bulk_parallel_lines 为 0 时不拆分）
+hash_runner = HashJobRunner(
+    inline_limit=get_json.hash_inline_limit,
+    max_workers=get_json.hash_workers,
+    max_jobs=get_json.hash_max_jobs,
+    user_jobs=get_json.hash_user_jobs,
+    timeout=get_json.hash_timeout,
+    parallel_lines=get_json.hash_bulk_parallel_lines
+)
+
+#KDF（PBKDF2 / scrypt）在进程池中计算，迭代次数上限可由管理员调整
+kdf_runner = KdfJobRunner(
+    max_workers=get_json.kdf_workers,
+    max_jobs=get_json.kdf_max_jobs,
+    user_jobs=get_json.kdf_user_jobs,
+    timeout=get_json.kdf_timeout,
+    max_iterations=get_json.kdf_max_iterations,
+    max_scrypt_n=get_json.kdf_max_scrypt_n
+)
+
+#哈希结果缓存容量
+result_cache.max_bytes = get_json.hash_cache_bytes
+
+#HMAC 密钥状态缓存：数量上限和存活时间
+hmac_cache.max_entries = get_json.hmac_cache_size
+hmac_cache.ttl = get_json.hmac_cache_ttl
+
+hmac_purge_tasks = []
+
+async def hmac_cache_purge_loop():
+    #定期清除过期的密钥状态（没有新请求时也会清除）
+    while True:
+        await asyncio.sleep(hmac_cache.ttl / 2)
+        hmac_cache.purge()
+
+@bot.on_startup
+async def start_hmac_cache_purge(bot: Bot):
+    hmac_purge_tasks.append(asyncio.create_task(hmac_cache_purge_loop()))
+
+hash_calibration_tasks = []
+
+async def calibrate_hash_costs():
+    #启动时实测各算法吞吐量，作为内联 / 线程池的分界依据（未完成前按 数据长度 × 算法数 估算）
+    try:
+        with hash_runner.slot():
+            loop = asyncio.get_running_loop()
+            rows = await loop.run_in_executor(hash_runner.executor, quick_throughput)
+    except Exception as e:
+        logger.warning(f"哈希开销校准失败: {e}")
+        return
+    hash_runner.calibrate(rows)
+
+@bot.on_startup
+async def start_hash_calibration(bot: Bot):
+    hash_calibration_tasks.append(asyncio.create_task(calibrate_hash_costs()))
+
+#文件哈希：分块下载并增量计算
+hash_streamer = HashStreamer(
+    max_bytes=get_json.hash_file_max_bytes,
+    chunk_size=get_json.hash_file_chunk,
+    timeout=get_json.hash_file_timeout,
+    executor=hash_runner.executor,
+    max_lines=get_json.hash_bulk_max_lines,
+    runner=hash_runner
+)
+
+async def hash_file(msg: Message, request, attachment):
+    #计算引用或附带的文件的哈希值
+    url, name = attachment
+
+    with hash_runner.slot(msg.author.id):
+        info = await hash_streamer.hash_url(url, request)
+
+    size_mb = info['size'] / (1024 * 1024)
+    throughput = size_mb / info['elapsed'] if info['elapsed'] > 0 else 0
+
+    return (
+        f"文件: {name}\n"
+        f"大小: {size_mb:.2f} MB\n"
+        f"用时: {info['elapsed']:.2f}秒 | 吞吐: {throughput:.2f} MB/s\n"
+        f"{format_result(request, [info['digests']])}"
+    )
+
+async def hash_bulk(msg: Message, request, attachment):
+    #批量模式：文本文件每行一个值，结果写入 CSV/TSV 文件后作为附件发送
+    if attachment is None:
+        raise HashCommandError('批量模式需要回复或附带一个文本文件（每行一个值）')
+    url, name = attachment
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        stem = os.path.splitext(name)[0] or 'values'
+        path = os.path.join(temp_dir, f"{stem}_hash.{request.bulk}")
+
+        with hash_runner.slot(msg.author.id):
+            with open(path, 'w', encoding='utf-8', newline='') as output:
+                info = await hash_streamer.hash_lines(url, request, output)
+
+        file_url = await bot.client.create_asset(path)
+
+    card = Card(
+        Module.Header("批量哈希计算完成"),
+        Module.Section(
+            Element.Text(
+                f"文件: {name}\n"
+                f"行数: {info['lines']}\n"
+                f"算法: {', '.join(request.labels)}\n"
+                f"用时: {info['elapsed']:.2f}秒",
+                type=Types.Text.KMD
+            )
+        ),
+        theme=Types.Theme.SUCCESS
+    )
+    await reply(msg, CardMessage(card))
+    await reply(msg, file_url, type=MessageTypes.FILE)
+
+@router.command(name='hash', prefixes=['/'])
 async def hash_command(msg: Message, *args):
     "处理 /hash 命令"
     try:
         command = msg.content
-        result = calculator.process_command(command)
+        attachment = find_attachment(msg)
+        try:
+            request = calculator.parse_command(command, allow_empty=attachment is not None)
+            if request.bulk:
+                await hash_bulk(msg, request, attachment)
+                return
+            if request.kdf:
+                result = await kdf_runner.run(request, msg.author.id)
+            elif attachment and not request.values:
+                result = await hash_file(msg, request, attachment)
+            else:
+                result = await hash_runner.run(request, msg.author.id)
+        except HashCommandError as e:
+            result = str(e)
+
         card = Card(
             Module.Header("哈希计算结果"),
             Module.Section(
@@ -1472,70 +1766,227 @@ async def hash_command(msg: Message, *args):
             ),
             theme=Types.Theme.SUCCESS
         )
-        await msg.reply(CardMessage(card))
+        await reply(msg, CardMessage(card))
+    except (HashBusyError, KdfLimitError, FileTooLargeError) as e:
+        await send_error_message(msg, f"{e}")
+    except aiohttp.ClientError as e:
+        logger.warning(f"/hash 下载文件失败: {e}")
+        await send_error_message(msg, "下载文件失败")
+    except asyncio.TimeoutError:
+        logger.warning(f"/hash 计算超时: {msg.author.username}")
+        await send_error_message(msg, "哈希计算超时")
     except Exception as e:
         logger.warning(f"处理 /hash 命令时出错: {e}")
         await send_error_message(msg, "/hash 命令出错")
 
+@router.command(name='hashbench', prefixes=['/'])
+async def hash_bench_command(msg: Message):
+    "简短的哈希性能测试（仅限管理员），在线程池中执行"
+    if msg.author.id not in ADMIN_USER_ID_LIST:
+        await reply(msg, PERMISSION_DENIED_CARD.render(), type=MessageTypes.CARD)
+        return
+
+    try:
+        with hash_runner.slot(msg.author.id):
+            loop = asyncio.get_running_loop()
+            rows = await loop.run_in_executor(hash_runner.executor, quick_throughput)
+    except HashBusyError as e:
+        await send_error_message(msg, f"{e}")
+        return
+    #同时更新任务开销估算
+    hash_runner.calibrate(rows)
+
+    card = Card(
+        Module.Header("哈希性能测试（1MB 输入）"),
+        Module.Section(
+            Element.Text(
+                "\n".join(f"`{algorithm}`: {mbps:.1f} MB/s" for algorithm, mbps in rows),
+                type=Types.Text.KMD
+            )
+        ),
+        Module.Context(
+            Element.Text(f"CPU 核心: {os.cpu_count()}", type=Types.Text.KMD)
+        ),
+        theme=Types.Theme.INFO
+    )
+    await reply(msg, CardMessage(card))
+    logger.info(f"管理员 {msg.author.username} 执行了哈希性能测试")
+
+@router.command(name='kdflimit', prefixes=['/'])
+async def kdf_limit_command(msg: Message, *args):
+    "查看或修改 KDF 上限（/kdflimit [pbkdf2 次数] [scrypt N]）"
+    if msg.author.id not in ADMIN_USER_ID_LIST:
+        await reply(msg, PERMISSION_DENIED_CARD.render(), type=MessageTypes.CARD)
+        return
+
+    if len(args) % 2 or any(name.lower() not in ('pbkdf2', 'scrypt') or not value.isdigit()
+                            for name, value in zip(args[::2], args[1::2])):
+        await send_error_message(msg, "格式: /kdflimit [pbkdf2 次数] [scrypt N]")
+        return
+
+    for name, value in zip(args[::2], args[1::2]):
+        if name.lower() == 'pbkdf2':
+            kdf_runner.max_iterations = int(value)
+        else:
+            kdf_runner.max_scrypt_n = int(value)
+        logger.info(f"管理员 {msg.author.username} 将 {name} 上限设为 {value}")
+
+    card = Card(
+        Module.Header("KDF 上限"),
+        Module.Section(
+            Element.Text(
+                f"PBKDF2 迭代次数: {kdf_runner.max_iterations}\n"
+                f"scrypt N: {kdf_runner.max_scrypt_n}\n"
+                f"超时: {kdf_runner.timeout}秒",
+                type=Types.Text.KMD
+            )
+        ),
+        theme=Types.Theme.SUCCESS
+    )
+    await reply(msg, CardMessage(card))
+
 
 """
 测试网络延迟和bot响应时间
 """
 command_timestamps: Dict[str, float] = {}
 
-async def measure_ping():
-    #测试网络延迟
-    latencies = []
-    url = "https://www.baidu.com"
-
-    async with aiohttp.ClientSession() as session:
-        for i in range(10):
-            try:
-                start_time = time.time()
+#延迟探测：复用连接
+latency_probe = LatencyProbe(
+    targets=get_json.ping_targets,
+    timeout=get_json.ping_timeout
+)
+
+#后台延迟监控：定时采样，/ping 直接读取统计
+latency_monitor = LatencyMonitor(
+    latency_probe,
+    interval=get_json.ping_sample_interval,
+    refresh_interval=get_json.ping_refresh_interval
+)
+
+@bot.on_startup
+async def start_latency_monitor(bot: Bot):
+    latency_monitor.start()
+
+def latency_status(p50: float) -> str:
+    #按中位延迟评价网络状态
+    if p50 < 50:
+        return "🟢 极佳"
+    elif p50 < 100:
+        return "🟡 良好"
+    elif p50 < 200:
+        return "🟠 一般"
+    return "🔴 较差"
+
+def window_text(stats: dict) -> str:
+    #一个统计窗口的摘要
+    if not stats['sent']:
+        return "暂无数据"
+    if not stats['received']:
+        return f"全部失败（{stats['sent']} 次）"
+    return (
+        f"最小 {stats['min']:.1f} / 中位 {stats['p50']:.1f} / P95 {stats['p95']:.1f} / 最大 {stats['max']:.1f} ms，"
+        f"抖动 {stats['jitter']:.1f} ms，丢包 {stats['loss']:.0%}（{stats['sent']} 次）"
+    )
 
-                async with session.get(url, timeout = 10) as response:
-                    #发送请求
-                    await response.read()
+def ms_text(value) -> str:
+    return f"{value:.1f} ms" if value is not None else "-"
 
-                end_time = time.time()
-                lactency = round((end_time - start_time) * 1000, 2)
-                latencies.append(lactency)
+def gateway_text() -> str:
+    #KOOK 网关心跳和 API 延迟摘要
+    heartbeat = gateway_metrics.heartbeat_stats()
+    api = gateway_metrics.api_totals()
 
-                await asyncio.sleep(0.5)
+    if heartbeat['count']:
+        heartbeat_line = (
+            f"最近 {ms_text(heartbeat['last'])}，中位 {ms_text(heartbeat['p50'])} / P95 {ms_text(heartbeat['p95'])}"
+            f"（{heartbeat['count']} 次，未响应 {heartbeat['missed']} 次）"
+        )
+    else:
+        heartbeat_line = "暂无数据"
 
-            except asyncio.TimeoutError:
-                latencies.append(9999)
-            except Exception as e:
-                latencies.append(9999)
+    if api['count']:
+        api_line = (
+            f"中位 {ms_text(api['p50'])} / P95 {ms_text(api['p95'])} / 最大 {ms_text(api['max'])}"
+            f"（{api['count']} 次，失败 {api['errors']}，限速 {api['rate_limited']}）"
+        )
+    else:
+        api_line = "暂无数据"
 
-    #计算平均值
-    valid_latencies = [lat for lat in latencies if lat < 9999]
+    return (
+        f"💓 **KOOK 心跳**: {heartbeat_line}\n"
+        f"🔌 **KOOK API**: {api_line}"
+    )
 
-    if valid_latencies:
-        avg_latency = round(statistics.mean(valid_latencies), 2)
-        return avg_latency, len(valid_latencies), len(latencies)
+def latency_text(item: dict) -> str:
+    #单个目标的当前延迟和滚动窗口统计
+    if item['current'] is not None:
+        current = f"{item['current']:.1f} ms（{item['age']:.0f}秒前）"
+    elif item['age'] is not None:
+        current = f"失败（{item['age']:.0f}秒前）"
     else:
-        return 9999, 0, len(latencies)
+        current = "暂无数据"
+
+    recent = item['1m']
+    status = latency_status(recent['p50']) if recent['received'] else "⚫ 连接失败"
 
-@bot.command(name='ping', prefixes=['/'])
+    return (
+        f"📡 **目标**: {item['host']}\n"
+        f"⏱️ **当前**: {current}\n"
+        f"📊 **1分钟**: {window_text(item['1m'])}\n"
+        f"📊 **15分钟**: {window_text(item['15m'])}\n"
+        f"📈 **网络状态**: {status}"
+    )
+
+@router.command(name='ping', prefixes=['/'])
 async def ping_command(msg: Message, *args):
-    #ping命令
+    #ping命令：Pong 卡片和延迟统计合并为一条消息发送
     user_id = msg.author.id
     current_time = time.time()
 
     #记录命令接收时间
     command_timestamps[user_id] = current_time
 
-    # 回复
-    response_start_time = time.time()
-    await msg.reply("""收到\n等我回国处理""")
-    response_end_time = time.time()
+    #消息从发送到机器人收到的时间（依赖双方时钟）
+    message_delay = max(0.0, current_time * 1000 - msg.msg_timestamp) if msg.msg_timestamp else None
+
+    try:
+        #直接使用后台采样的统计，样本过时则在后台补测（所有用户共享，且有频率限制）
+        await latency_monitor.ensure_samples()
+
+        results = latency_monitor.snapshot()
+        success = any(result['1m']['received'] for result in results)
+
+        modules = [Module.Header("🏓 Pong 测试结果")]
+        for index, result in enumerate(results):
+            if index:
+                modules.append(Module.Divider())
+            modules.append(Module.Section(Element.Text(latency_text(result), type=Types.Text.KMD)))
+
+        modules.append(Module.Divider())
+        modules.append(Module.Section(Element.Text(gateway_text(), type=Types.Text.KMD)))
+
+        if success:
+            modules.append(Module.Context(
+                Element.Text("💡 *延迟越低，网络连接质量越好*", type=Types.Text.KMD)
+            ))
+        else:
+            modules.append(Module.Context(
+                Element.Text("💡 *无法连接到目标服务器，请检查网络连接*", type=Types.Text.KMD)
+            ))
+
+        result_card = CardMessage(Card(*modules, theme=Types.Theme.SUCCESS if success else Types.Theme.WARNING))
 
-    #计算相应时间
-    response_time = (response_end_time - response_start_time) * 1000
-    total_time = (response_end_time - current_time) * 1000
+        for result in results:
+            if result['1m']['received']:
+                logger.info(f"用户 {msg.author.username} 延迟 {result['host']} 1分钟 p50 {result['1m']['p50']:.1f}ms p95 {result['1m']['p95']:.1f}ms")
 
-    logger.info(f"[TIME] 纯响应时间: {response_time:.2f}ms")
+    except Exception as e:
+        logger.warning(f"处理 /ping 命令时出错: {e}")
+        result_card = ERROR_CARD.render(error_text="测量延迟时出现错误")
+
+    #计算处理时间
+    total_time = (time.time() - current_time) * 1000
     logger.info(f"[TIME] 总处理时间: {total_time:.2f}ms")
 
     card = Card(
@@ -1543,8 +1994,8 @@ async def ping_command(msg: Message, *args):
             Element.Text(
                 f"🏓 **Pong!**\n"
                 f"👤 用户: {msg.author.username}\n"
-                f"⏰ 响应时间: {response_time:.2f} ms\n"
-                f"⏰ 总响应时间: {total_time:.2f} ms\n"
+                f"⏰ 消息延迟: {ms_text(message_delay)}\n"
+                f"⏰ 处理时间: {total_time:.2f} ms\n"
                 f"🤖 机器人状态: 正常运行",
                 type=Types.Text.KMD
             )
@@ -1555,87 +2006,92 @@ async def ping_command(msg: Message, *args):
     if user_id in command_timestamps:
         del command_timestamps[user_id]
 
-    await msg.reply(CardMessage(card))
-
-    try:
-        card = Card(
-            Module.Section(
-                Element.Text(
-                    "🔄 正在测量网络延迟...\n"
-                    "📡 目标: www.baidu.com\n"
-                    "📦 数据包: 64字节\n"
-                    "🔢 测试次数: 10次\n"
-                    "⏳ 请稍候...",
-                    type=Types.Text.KMD
-                )
-            ),
-            theme=Types.Theme.SUCCESS
-        )
-
-        await msg.reply(CardMessage(card))
-
-        avg_latency, success_count, total_count = await measure_ping()
+    await reply(msg, combine(CardMessage(card), result_card), type=MessageTypes.CARD, priority=SendQueue.COSMETIC)
 
-        if avg_latency < 50:
-            status = "🟢 极佳"
-        elif avg_latency < 100:
-            status = "🟡 良好"
-        elif avg_latency < 200:
-            status = "🟠 一般"
-        elif avg_latency < 9999:
-            status = "🔴 较差"
-        else:
-            status = "⚫ 连接失败"
+@router.command(name='apistats', prefixes=['/'])
+async def api_stats_command(msg: Message, *args):
+    "查看 KOOK 网关心跳和各 API 接口的延迟统计（/apistats [数量]）"
+    if msg.author.id not in ADMIN_USER_ID_LIST:
+        await reply(msg, PERMISSION_DENIED_CARD.render(), type=MessageTypes.CARD)
+        return
 
-        if avg_latency < 9999:
-            card = Card(
-                Module.Section(
-                    Element.Text(
-                        f"🏓 **Pong 测试结果**\n"
-                        f"📡 **目标**: www.baidu.com\n"
-                        f"📦 **数据包**: 64字节\n"
-                        f"🔢 **测试次数**: {success_count}/{total_count} 次成功\n"
-                        f"📊 **平均延迟**: {avg_latency}ms\n"
-                        f"📈 **网络状态**: {status}",
-                        type=Types.Text.KMD
-                    )
-                ),
-                Module.Context(
-                    Element.Text("💡 *延迟越低，网络连接质量越好*", type=Types.Text.KMD)
-                ),
-                theme=Types.Theme.SUCCESS
-            )
+    limit = int(args[0]) if args and args[0].isdigit() else 10
+    rows = gateway_metrics.route_stats(limit)
 
-            await msg.reply(CardMessage(card))
+    if rows:
+        table = "\n".join(
+            f"`{row['route']}`: {row['count']} 次，中位 {ms_text(row['p50'])} / P95 {ms_text(row['p95'])} / 最大 {ms_text(row['max'])}，"
+            f"失败 {row['errors']}，限速 {row['rate_limited']}"
+            for row in rows
+        )
+    else:
+        table = "暂无 API 请求记录"
 
-            logger.info(f"用户 {msg.author.username} 平均延迟 {avg_latency}ms")
+    card = Card(
+        Module.Header("KOOK 连接统计"),
+        Module.Section(Element.Text(gateway_text(), type=Types.Text.KMD)),
+        Module.Divider(),
+        Module.Section(Element.Text(table, type=Types.Text.KMD)),
+        Module.Context(
+            Element.Text("💡 *延迟为 HTTP 往返时间，不包含限速等待*", type=Types.Text.KMD)
+        ),
+        theme=Types.Theme.INFO
+    )
+    await reply(msg, CardMessage(card))
+
+def command_table(rows: list) -> str:
+    #命令统计表
+    if not rows:
+        return "暂无命令记录"
+    return "\n".join(
+        f"`{row['name']}`: {row['calls']} 次，中位 {ms_text(row['p50'])} / P95 {ms_text(row['p95'])} / 最大 {ms_text(row['max'])}，"
+        f"API {ms_text(row['api_p50'])} / {ms_text(row['api_p95'])}，异常 {row['errors']}"
+        for row in rows
+    )
 
-        else:
-            card = Card(
-                Module.Section(
-                    Element.Text(
-                        f"❌ **Ping 测试失败**\n"
-                        f"📡 **目标**: www.baidu.com\n"
-                        f"🔢 **测试次数**: {success_count}/{total_count} 次成功",
-                        type=Types.Text.KMD
-                    )
-                ),
-                Module.Context(
-                    Element.Text("💡 *无法连接到目标服务器，请检查网络连接*", type=Types.Text.KMD)
-                ),
-                theme=Types.Theme.WARNING
-            )
+@router.command(name='stats', prefixes=['/'])
+async def stats_command(msg: Message, *args):
+    "查看各命令的调用次数和耗时（/stats [数量]）"
+    if msg.author.id not in ADMIN_USER_ID_LIST:
+        await reply(msg, PERMISSION_DENIED_CARD.render(), type=MessageTypes.CARD)
+        return
 
-            await msg.reply(CardMessage(card))
+    limit = int(args[0]) if args and args[0].isdigit() else 5
+    totals = command_metrics.totals()
+    queue = channel_executor.stats()
+    outbound = send_queue.stats()
+    results = result_cache.stats()
+    hmac_states = hmac_cache.stats()
 
-    except Exception as e:
-        logger.warning(f"处理 /ping 命令时出错: {e}")
-        await send_error_message(msg, "测量延迟时出现错误")
+    card = Card(
+        Module.Header("命令统计"),
+        Module.Section(Element.Text(
+            f"⏱️ **运行时间**: {totals['uptime'] / 3600:.1f} 小时\n"
+            f"📨 **消息**: {totals['messages']} 条，命令 {totals['calls']} 次（{totals['per_minute']:.1f} 次/分钟），异常 {totals['errors']} 次\n"
+            f"📥 **频道队列**: 平均等待 {queue['avg_wait_ms']:.1f} ms，最大 {queue['max_wait_ms']:.1f} ms\n"
+            f"📤 **发送队列**: 排队 {outbound['queued']}（最大 {outbound['max_depth']}），已发送 {outbound['sent']}，平均等待 {outbound['avg_wait_ms']:.1f} ms，"
+            f"丢弃 {outbound['dropped']}，限速重试 {outbound['retried']}，失败 {outbound['failed']}\n"
+            f"🗃️ **哈希结果缓存**: 命中率 {results['hit_rate']:.1%}（{results['hits']}/{results['hits'] + results['misses']}），"
+            f"{results['entries']} 条，{results['bytes'] / 1024:.1f} / {results['max_bytes'] / 1024:.0f} KB\n"
+            f"🔑 **HMAC 状态缓存**: 命中率 {hmac_states['hit_rate']:.1%}（{hmac_states['hits']}/{hmac_states['hits'] + hmac_states['misses']}），"
+            f"{hmac_states['entries']} / {hmac_states['max_entries']} 个密钥状态",
+            type=Types.Text.KMD
+        )),
+        Module.Divider(),
+        Module.Section(Element.Text(f"🔥 **调用最多**\n{command_table(command_metrics.busiest(limit))}", type=Types.Text.KMD)),
+        Module.Divider(),
+        Module.Section(Element.Text(f"🐢 **P95 最慢**\n{command_table(command_metrics.slowest(limit))}", type=Types.Text.KMD)),
+        Module.Context(
+            Element.Text("💡 *耗时不包含频道队列等待；API 为等待 KOOK 接口的时间（含限速）*", type=Types.Text.KMD)
+        ),
+        theme=Types.Theme.INFO
+    )
+    await reply(msg, CardMessage(card))
 
 """
 查看当前时间
 """
-@bot.command(name='time', prefixes=['/'])
+@router.command(name='time', prefixes=['/'])
 async def time_command(msg: Message, *args):
     #time命令
     try:
@@ -1653,7 +2109,7 @@ async def time_command(msg: Message, *args):
             theme=Types.Theme.INFO
         )
 
-        await msg.reply(CardMessage(card))
+        await reply(msg, CardMessage(card), priority=SendQueue.COSMETIC)
 
     except Exception as e:
         logger.warning(f"处理 /time 命令时出错: {e}")
@@ -1662,20 +2118,16 @@ async def time_command(msg: Message, *args):
 """
 彩蛋
 """
-@bot.on_message()
+@router.keyword("(met)1026571641(met)")
 async def on_mention(msg: Message):
     """
     处理 @ 提及事件
     当用户 @ 机器人时自动回复'收到'
     """
-    content = msg.content.strip()
     try:
-        # 检查消息是否提及了当前机器人
-
-        if content == "(met)1026571641(met)":
-            # 创建简单的文本回复
-            await msg.reply("✅ 收到！")
-            logger.info(f"📩 收到来自 {msg.author.username} 的 @ 提及并已回复")
+        # 创建简单的文本回复
+        await reply(msg, "✅ 收到！", priority=SendQueue.COSMETIC)
+        logger.info(f"📩 收到来自 {msg.author.username} 的 @ 提及并已回复")
 
     except Exception as e:
         logger.warning(f"处理 @ 提及事件时出错: {e}")
@@ -1692,22 +2144,12 @@ if get_json.use_admin_user == 1:
 else:
     ADMIN_USER_ID_LIST = [None]
 
-@bot.command(name='stop', prefixes=['/'])
+@router.command(name='stop', prefixes=['/'])
 async def stop_bot(msg: Message):
     user_id = msg.author.id
 
     if user_id not in ADMIN_USER_ID_LIST:
-        card = Card(
-            Module.Section(
-                Element.Text(
-                    f"⚠ 权限不足，请联系管理员",
-                    type=Types.Text.KMD
-                )
-            ),
-            theme=Types.Theme.WARNING
-        )
-
-        await msg.reply(CardMessage(card))
+        await reply(msg, PERMISSION_DENIED_CARD.render(), type=MessageTypes.CARD)
         return
 
     card = Card(
@@ -1720,7 +2162,8 @@ async def stop_bot(msg: Message):
         theme=Types.Theme.SUCCESS
     )
 
-    await msg.reply(CardMessage(card))
+    await reply(msg, CardMessage(card))
+    await flush_guess_stats()
     await bot.client.offline()
     logger.info("机器人已被kook端关闭")
     os._exit(1)
@@ -1728,22 +2171,12 @@ async def stop_bot(msg: Message):
 
 current_file_path = os.path.abspath(sys.argv[0])
 
-@bot.command(name='restart', prefixes=['/'])
+@router.command(name='restart', prefixes=['/'])
 async def restart_bot(msg: Message):
     user_id = msg.author.id
 
     if user_id not in ADMIN_USER_ID_LIST:
-        card = Card(
-            Module.Section(
-                Element.Text(
-                    f"⚠ 权限不足，请联系管理员",
-                    type=Types.Text.KMD
-                )
-            ),
-            theme=Types.Theme.WARNING
-        )
-
-        await msg.reply(CardMessage(card))
+        await reply(msg, PERMISSION_DENIED_CARD.render(), type=MessageTypes.CARD)
         return
 
     card = Card(
@@ -1756,7 +2189,8 @@ async def restart_bot(msg: Message):
         theme=Types.Theme.SUCCESS
     )
 
-    await msg.reply(CardMessage(card))
+    await reply(msg, CardMessage(card))
+    await flush_guess_stats()
     await bot.client.offline()
     time.sleep(0.1)
     os.system(f"python {current_file_path}")
@@ -1770,25 +2204,44 @@ async def welcome_new_member(bot, event: Event):
     user_id = event.body['user_id']
 
     #发送欢迎消息
-    channel = await bot.fetch_public_channel('7125355179539829')
-    await channel.send(f'欢迎新成员 (met){user_id}(met) 加入服务器！')
+    channel = await fetch_channel_cached(WELCOME_CHANNEL_ID)
+    await send_to(channel, f'欢迎新成员 (met){user_id}(met) 加入服务器！', priority=SendQueue.COSMETIC)
+
+"""
+启动时预热缓存
+"""
+@bot.on_startup
+async def warm_up_cache(bot: Bot):
+    #预先加载欢迎频道和管理员用户
+    tasks = [fetch_channel_cached(WELCOME_CHANNEL_ID)]
+    tasks += [fetch_user_cached(uid) for uid in ADMIN_USER_ID_LIST if uid]
+
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    failed = [r for r in results if isinstance(r, Exception)]
+    if failed:
+        logger.warning(f"缓存预热失败 {len(failed)} 项: {failed[0]}")
+
+    for cache in (user_cache, channel_cache):
+        stats = cache.stats()
+        logger.info(f"[CACHE] {stats['name']}: 数量 {stats['size']} | 命中 {stats['hits']} | 未命中 {stats['misses']}")
 
 """
 帮助命令
 """
-@bot.command(name='hashhelp', prefixes=['/'])
-async def hashhelp(msg: Message):
-    card = Card(
+HASH_HELP_CARD = CardTemplate(
+    Card(
         Module.Header("🔐 哈希计算帮助"),
         Module.Section(
             Element.Text(
                 f"命令格式:\n"
-                f"""/hash value1 [value2] [ALG alg_name] [OUT format] \n[HMAC key] [SEP sep] [COD encoding]\n\n"""
+                f"""/hash value1 [value2] [ALG alg_name] [OUT format] \n[HMAC key] [SEP sep] [COD encoding]\n[KDF kdf SALT salt ITER n LEN n] [BULK csv|tsv]\n\n"""
 
                 f"参数说明:\n"
                 f"- value: 要加密的数据（必需，可多个）\n"
-                f"- ALG: 哈希算法（可选，默认 md5）\n"
+                f"- ALG: 哈希算法（可选，默认 md5，多个算法用逗号分隔，ALL 为全部算法）\n"
                 f"支持: md5, sha1, sha224, sha256, sha384, sha512, sha3_224, sha3_256, sha3_384, sha3_512\n"
+                f"blake2b, blake2s（可指定位数，如 blake2b_256、blake2s_128）\n"
+                f"校验和: crc32, adler32（不支持 HMAC）\n"
                 f"- OUT: 输出格式（可选，默认 HEX + 大写）\n"
                 f"HEX - 十六进制\n"
                 f"BASE64 - Base64 编码\n"
@@ -1799,26 +2252,33 @@ async def hashhelp(msg: Message):
                 f"- SEP: 分隔符（可选，多个结果时使用）\n"
                 f"若提供空值则不使用分隔符\n"
                 f"- COD: 编码方式（可选，默认 utf-8）\n"
-                f"支持: utf-8, hex, base64 等\n\n"
+                f"支持: utf-8, hex, base64 等\n"
+                f"- KDF: 密钥派生（pbkdf2 / scrypt），需要 SALT 盐，ITER 迭代次数（scrypt 为 N），LEN 输出长度\n"
+                f"- 文件: 回复一条文件消息并发送 /hash（可带 ALG/OUT/HMAC），计算文件的哈希值\n"
+                f"- BULK: 批量模式（csv / tsv），回复一个每行一个值的文本文件，结果以文件发送\n\n"
 
                 f"使用示例:\n"
                 f"/hash hello\n"
                 f"/hash hello ALG sha256\n"
+                f"/hash hello ALG md5,sha1,sha256\n"
+                f"/hash hello ALG crc32,blake2b_160\n"
                 f"/hash hello world ALG sha256 OUT base64\n"
                 f"/hash secret HMAC mykey\n"
-                f"/hash hello ALG sha256 OUT lower HMAC mypassword SEP | COD utf-8\n",
+                f"/hash hello ALG sha256 OUT lower HMAC mypassword SEP | COD utf-8\n"
+                f"/hash password KDF pbkdf2 SALT mysalt ITER 100000 ALG sha256\n",
                 type=Types.Text.KMD
             )
         ),
         theme=Types.Theme.INFO
     )
+)
 
-    await msg.reply(CardMessage(card))
+@router.command(name='hashhelp', prefixes=['/'])
+async def hashhelp(msg: Message):
+    await reply(msg, HASH_HELP_CARD.render(), type=MessageTypes.CARD, priority=SendQueue.COSMETIC)
 
-@bot.command(name="分组", prefixes=['/'])
-async def help_command(msg: Message):
-    #分组帮助命令
-    card = Card(
+GROUP_HELP_CARD = CardTemplate(
+    Card(
         Module.Header("🤖 分组统计机器人帮助"),
         Module.Section(
             Element.Text(
@@ -1843,13 +2303,15 @@ async def help_command(msg: Message):
         ),
         theme=Types.Theme.INFO
     )
+)
 
-    await msg.reply(CardMessage(card))
+@router.command(name="分组", prefixes=['/'])
+async def help_command(msg: Message):
+    #分组帮助命令
+    await reply(msg, GROUP_HELP_CARD.render(), type=MessageTypes.CARD, priority=SendQueue.COSMETIC)
 
-@bot.command(name='猜数字', prefixes=['/'])
-async def guesshelp_command(msg: Message):
-    #猜数字帮助命令
-    card = Card(
+GUESS_HELP_CARD = CardTemplate(
+    Card(
         Module.Header("🤖 猜数字游戏帮助"),
         Module.Section(
             Element.Text(
@@ -1871,12 +2333,15 @@ async def guesshelp_command(msg: Message):
         ),
         theme=Types.Theme.INFO
     )
+)
 
-    await msg.reply(CardMessage(card))
+@router.command(name='猜数字', prefixes=['/'])
+async def guesshelp_command(msg: Message):
+    #猜数字帮助命令
+    await reply(msg, GUESS_HELP_CARD.render(), type=MessageTypes.CARD, priority=SendQueue.COSMETIC)
 
-@bot.command(name='骗子酒馆', prefixes=['/'])
-async def pzhelp_command(msg: Message):
-    card = Card(
+TAVERN_HELP_CARD = CardTemplate(
+    Card(
         Module.Header(f"骗子酒馆游戏帮助："),
         Module.Section(
             Element.Text(
@@ -1908,15 +2373,14 @@ async def pzhelp_command(msg: Message):
         ),
         theme=Types.Theme.INFO
     )
+)
 
-    await msg.reply(CardMessage(card))
-
-@bot.command(name='help', prefixes=['!', '！'])
-async def allhelp_command(msg: Message):
-    user_id = msg.author.id
+@router.command(name='骗子酒馆', prefixes=['/'])
+async def pzhelp_command(msg: Message):
+    await reply(msg, TAVERN_HELP_CARD.render(), type=MessageTypes.CARD, priority=SendQueue.COSMETIC)
 
-    #全局帮助命令
-    card = Card(
+ALL_HELP_CARD = CardTemplate(
+    Card(
         Module.Header("🌈 帮助菜单"),
         Module.Section(
             Element.Text(
@@ -1933,83 +2397,62 @@ async def allhelp_command(msg: Message):
         ),
         theme=Types.Theme.INFO
     )
+)
 
-    await msg.reply(CardMessage(card))
+ADMIN_HELP_CARD = CardTemplate(
+    Card(
+        Module.Section(
+            Element.Text(
+                "• `/stop` - 关闭bot(仅限管理员)\n"
+                "• `/restart` - 重启bot(仅限管理员)\n"
+                "• `/kdflimit [pbkdf2 次数] [scrypt N]` - 查看或修改 KDF 上限(仅限管理员)\n"
+                "• `/hashbench` - 测试各哈希算法的速度(仅限管理员)\n"
+                "• `/apistats [数量]` - 查看 KOOK 心跳和 API 延迟统计(仅限管理员)\n"
+                "• `/stats [数量]` - 查看命令调用次数和耗时(仅限管理员)",
+                type=Types.Text.KMD
+            )
+        ),
+        theme=Types.Theme.INFO
+    )
+)
 
-    if user_id in ADMIN_USER_ID_LIST:
+@router.command(name='help', prefixes=['!', '！'])
+async def allhelp_command(msg: Message):
+    user_id = msg.author.id
 
-        card = Card(
-            Module.Section(
-                Element.Text(
-                    "• `/stop` - 关闭bot(仅限管理员)\n"
-                    "• `/restart` - 重启bot(仅限管理员)",
-                    type=Types.Text.KMD
-                )
-            ),
-            theme=Types.Theme.INFO
-        )
+    #全局帮助命令
+    await reply(msg, ALL_HELP_CARD.render(), type=MessageTypes.CARD, priority=SendQueue.COSMETIC)
 
-        await msg.ctx.channel.send(CardMessage(card), temp_target_id = user_id)
+    if user_id in ADMIN_USER_ID_LIST:
+        await send_to(msg.ctx.channel, ADMIN_HELP_CARD.render(), type=MessageTypes.CARD, temp_target_id = user_id, priority=SendQueue.COSMETIC)
 
 
 """
 消息监听与错误消息处理
 """
-#消息监听
+#消息监听：所有消息只在这里分类一次，再交给对应的处理函数
 @bot.on_message()
 async def handle_all_messages(msg: Message):
-
-    #只处理文本消息
-    if not msg.content or not isinstance(msg.content, str):
+    if await router.dispatch(msg):
         return
 
-    content = msg.content.strip()
-
-    if content == "/help":
+    if isinstance(msg.content, str) and msg.content.strip() == "/help":
         logger.info(f"📝 用户 {msg.author.username} 执行了其他 bot 的 help 命令")
-    elif content == "！help":
-        logger.info(f"📝 用户 {msg.author.username} 执行了 help 命令")
-
-    #检查是否以/或.或!开头
-    if content.startswith(('/', '!', '.', '@')):
-        #正则表达除去前缀
-        command_match = re.match(r'^[/!](\w+)', content)
-        if command_match:
-            command = command_match.group(1).lower()
-        if content != "/help":
-            logger.info(f"📝 用户 {msg.author.username} 执行了 {command} 命令")
 
 #处理错误消息
 async def send_error_message(msg: Message, error_text: str):
-    card = Card(
-        Module.Section(
-            Element.Text(
-                f"⚠️ **系统错误**\n"
-                f"{error_text}，请稍后重试。",
-                type=Types.Text.KMD
-            )
-        ),
-        theme=Types.Theme.WARNING
-    )
-
-    await  msg.reply(CardMessage(card))
+    await reply(msg, ERROR_CARD.render(error_text=error_text), type=MessageTypes.CARD)
 
 #避免跨线程访问冲突
 def start_loop(loop):
     asyncio.set_event_loop(loop)
     loop.run_forever()
 
-new_loop = asyncio.new_event_loop()
-t = Thread(target=start_loop, args=(new_loop,))
-t.start()
-
 #在新线程中运行异步任务
 async def task():
     await asyncio.sleep(1)
     logger.success("在新线程中运行异步任务完成")
 
-asyncio.run_coroutine_threadsafe(task(), new_loop)
-
 """
 主函数
 """
@@ -2037,6 +2480,14 @@ async def main():
     except Exception as e:
         logger.warning(f"❌ 启动机器人时出错: {e}")
         traceback.print_exc()
+    finally:
+        #退出前写入剩余的战绩；历史战绩一直没加载成功时把本次运行的战绩累加到存储中
+        if guess_manager.loaded:
+            guess_manager.store.save(guess_manager.take_dirty())
+        else:
+            stats = guess_manager.take_dirty(before_load=True)
+            logger.warning(f"猜数字历史战绩未加载，累加写入 {len(stats)} 名玩家本次的战绩")
+            guess_manager.store.add(stats)
 
 """
 协程进行
@@ -2048,6 +2499,12 @@ loop.close()
 """
 
 if __name__ == '__main__':
+    #只在直接运行时启动（KDF 进程池的子进程会导入本模块）
+    new_loop = asyncio.new_event_loop()
+    t = Thread(target=start_loop, args=(new_loop,))
+    t.start()
+    asyncio.run_coroutine_threadsafe(task(), new_loop)
+
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
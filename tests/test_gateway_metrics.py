@@ -0,0 +1,149 @@
+"func.gateway_metrics 的离线测试，KOOK 接口和网关由 tools/http_standin.py 提供"
+
+import asyncio
+
+import aiohttp
+import pytest
+import khl.requester
+from khl import Bot
+from khl.requester import HTTPRequester
+from aiohttp.test_utils import TestServer
+
+from http_standin import create_app
+from func.gateway_metrics import GatewayMetrics, api_time
+
+
+def run_with_bot(test, monkeypatch):
+    "启动替身服务器，把机器人的 HTTP 接口指向它，执行 test(server, bot)"
+
+    async def main():
+        server = TestServer(create_app())
+        await server.start_server()
+        monkeypatch.setattr(khl.requester, 'API', str(server.make_url('/api/v3')))
+        bot = Bot(token='standin')
+        requester = bot.client.gate.requester
+        try:
+            return await test(server, bot)
+        finally:
+            if requester._cs is not None:
+                await requester._cs.close()
+                requester._cs = None
+            await server.close()
+
+    return asyncio.run(main())
+
+
+def test_route_histograms_errors_and_rate_limits(monkeypatch):
+    metrics = GatewayMetrics()
+
+    async def test(server, bot):
+        metrics.install(bot)
+        requester = bot.client.gate.requester
+
+        spent = [0.0]
+        api_time.set(spent)
+        for _ in range(2):
+            await requester.request('GET', 'fake/slow?delay=30')
+
+        with pytest.raises(HTTPRequester.APIRequestFailed) as error:
+            await requester.request('POST', 'fake/error')
+        assert error.value.err_code == 40000
+
+        with pytest.raises(HTTPRequester.APIRequestFailed) as error:
+            await requester.request('POST', 'fake/ratelimit')
+        assert error.value.err_code == 429
+        return spent[0]
+
+    spent = run_with_bot(test, monkeypatch)
+
+    slow = metrics.routes['fake/slow']
+    assert slow.count == 2 and slow.min >= 30
+    #每个请求只计入一次
+    assert spent >= 0.06
+    assert metrics.api_totals()['count'] == 4
+
+    assert metrics.errors == {'fake/error': 1, 'fake/ratelimit': 1}
+    assert metrics.rate_limited == {'fake/ratelimit': 1}
+
+    #X-Rate-Limit-Reset: 1，查询时忽略参数
+    assert 0.5 < metrics.retry_after('fake/ratelimit?x=1') <= 1
+    assert metrics.retry_after('fake/slow') is None
+
+    rows = metrics.route_stats()
+    assert rows[0]['route'] == 'fake/slow' and rows[0]['count'] == 2
+    assert {row['route']: row['rate_limited'] for row in rows}['fake/ratelimit'] == 1
+
+
+def test_heartbeat_rtt(monkeypatch):
+    metrics = GatewayMetrics()
+
+    async def test(server, bot):
+        receiver = bot.client.gate.receiver
+
+        #khl 的心跳每 26 秒发送一次，这里换成立即发送一次
+        async def beat_once(ws_conn):
+            await ws_conn.send_json({'s': 2, 'sn': 0})
+
+        receiver.heartbeat = beat_once
+        metrics.install(bot)
+
+        async with aiohttp.ClientSession() as session:
+            async with session.ws_connect(server.make_url('/gateway?compress=1&pong_delay=50')) as ws:
+                await receiver._handle_raw(await ws.receive())          # hello
+
+                await receiver.heartbeat(ws)
+                await receiver._handle_raw(await ws.receive())          # pong
+                first = metrics.heartbeat_stats()
+
+                #上一次心跳没有收到 pong 就发送下一次，记为未响应
+                await receiver.heartbeat(ws)
+                await receiver.heartbeat(ws)
+                await receiver._handle_raw(await ws.receive())
+                await receiver._handle_raw(await ws.receive())
+        return first, metrics.heartbeat_stats()
+
+    first, second = run_with_bot(test, monkeypatch)
+
+    assert first['count'] == 1 and first['missed'] == 0
+    assert 50 <= first['last'] < 1000
+    assert second['count'] == 2 and second['missed'] == 1
+
+
+def test_install_once_and_uninstall(monkeypatch):
+    metrics = GatewayMetrics()
+    other = GatewayMetrics()
+
+    async def test(server, bot):
+        requester = bot.client.gate.requester
+        receiver = bot.client.gate.receiver
+
+        metrics.install(bot)
+        wrapped = requester.request
+        #重复挂接（同一个或另一个实例）不会再包装一层
+        metrics.install(bot)
+        other.install(bot)
+        assert requester.request is wrapped
+        assert not other.installed
+
+        with pytest.raises(HTTPRequester.APIRequestFailed):
+            await requester.request('GET', 'fake/error')
+        assert metrics.errors['fake/error'] == 1
+        assert metrics.routes['fake/error'].count == 1
+
+        #卸载后恢复为类中的方法，不再记录
+        metrics.uninstall()
+        assert 'request' not in vars(requester)
+        assert 'heartbeat' not in vars(receiver)
+        assert 'decode_raw' not in vars(receiver._cert)
+
+        with pytest.raises(HTTPRequester.APIRequestFailed):
+            await requester.request('GET', 'fake/error')
+        assert metrics.errors['fake/error'] == 1
+        assert metrics.routes['fake/error'].count == 1
+
+        #卸载后可以再次挂接
+        metrics.install(bot)
+        await requester.request('GET', 'fake/slow')
+        assert metrics.routes['fake/slow'].count == 1
+
+    run_with_bot(test, monkeypatch)
@@ -0,0 +1,102 @@
+"func.hash_pool 的测试（KDF 进程池）"
+
+import sys
+import time
+import types
+import asyncio
+
+import pytest
+
+from func.hash_calculator import calculator, derive_request
+from func.hash_pool import HashJobRunner, KdfJobRunner
+
+
+def test_split_lines_keeps_order():
+    runner = HashJobRunner(max_workers=3, parallel_lines=10)
+    lines = [str(i) for i in range(25)]
+
+    parts = runner.split_lines(lines)
+    assert len(parts) == 3
+    assert sum(parts, []) == lines
+    assert runner.split_lines(lines[:9]) == [lines[:9]]
+
+    runner.parallel_lines = 0
+    assert runner.split_lines(lines) == [lines]
+    runner.executor.shutdown()
+
+
+def test_map_held_waits_for_workers_on_error():
+    runner = HashJobRunner(max_workers=2)
+    finished = []
+
+    def work(delay, fail):
+        time.sleep(delay)
+        if fail:
+            raise ValueError('bad line')
+        finished.append(delay)
+        return delay
+
+    async def test():
+        assert await runner.map_held(work, [(0.02, False), (0.01, False)]) == [0.02, 0.01]
+        #出错时仍等待其他工作线程结束，调用方的名额才能释放
+        with pytest.raises(ValueError):
+            await runner.map_held(work, [(0, True), (0.2, False)])
+        assert finished[-1] == 0.2
+
+    asyncio.run(test())
+    runner.executor.shutdown()
+
+
+def kdf_request(iterations: int, value: str = 'pw'):
+    return calculator.parse_command(f'/hash {value} KDF pbkdf2 SALT s ITER {iterations}')
+
+
+def test_kdf_workers_do_not_run_main(tmp_path, monkeypatch):
+    #模拟机器人脚本：被导入时留下标记
+    marker = tmp_path / 'imported'
+    script = tmp_path / 'fake_main.py'
+    script.write_text(f'open({str(marker)!r}, "w").close()\n')
+
+    main = types.ModuleType('__main__')
+    main.__file__ = str(script)
+    monkeypatch.setitem(sys.modules, '__main__', main)
+
+    request = kdf_request(1000)
+
+    async def test():
+        runner = KdfJobRunner(max_workers=1, timeout=60)
+        try:
+            return await runner.run(request, 'u1')
+        finally:
+            runner.executor.shutdown()
+
+    assert asyncio.run(test()) == derive_request(request)
+    assert not marker.exists()
+    assert sys.modules['__main__'] is main
+
+
+def test_reset_retries_queued_jobs():
+    slow = kdf_request(50_000_000)
+    fast = [kdf_request(1000, f'value{i}') for i in range(4)]
+
+    async def test():
+        runner = KdfJobRunner(max_workers=1, max_jobs=5, timeout=60, max_iterations=10 ** 9)
+        try:
+            #先启动工作进程，慢任务开始计算后才会超时
+            await runner.run(fast[0], 'warmup')
+
+            runner.timeout = 1
+            slow_job = asyncio.ensure_future(runner.run(slow, 'a'))
+            await asyncio.sleep(0.2)
+
+            #排在慢任务后面的任务（包括还没进入调用队列的）：进程池被重建时不能被取消，应在新进程池中重新计算
+            runner.timeout = 60
+            fast_jobs = [asyncio.ensure_future(runner.run(request, f'user{i}')) for i, request in enumerate(fast)]
+
+            with pytest.raises(asyncio.TimeoutError):
+                await slow_job
+            return await asyncio.gather(*fast_jobs)
+        finally:
+            runner.executor.shutdown()
+
+    assert asyncio.run(test()) == [derive_request(request) for request in fast]
@@ -0,0 +1,158 @@
+"func.hash_stream 的离线测试，文件由 tools/http_standin.py 提供"
+
+import io
+import csv
+import asyncio
+import hashlib
+import zlib
+from types import SimpleNamespace
+
+import pytest
+from aiohttp.test_utils import TestServer
+
+from http_standin import create_app, file_bytes, text_lines
+from func.hash_calculator import HashRequest
+from func.hash_pool import HashJobRunner
+from func.hash_stream import HashStreamer, FileTooLargeError, find_attachment
+
+#大于 OFFLOAD_CHUNK，覆盖线程池计算的路径
+FILE_SIZE = 200 * 1024 + 123
+LINE_COUNT = 2500
+
+
+def run_with_server(test, **kwargs):
+    "启动替身服务器，执行 test(server, streamer)"
+
+    async def main():
+        server = TestServer(create_app())
+        await server.start_server()
+        streamer = HashStreamer(**kwargs)
+        try:
+            return await test(server, streamer)
+        finally:
+            await streamer.close()
+            await server.close()
+
+    return asyncio.run(main())
+
+
+def expected_file_digests(size: int) -> tuple:
+    data = b''.join(file_bytes(size))
+    return (
+        hashlib.md5(data).hexdigest().upper(),
+        hashlib.sha256(data).hexdigest().upper(),
+        f'{zlib.crc32(data):08X}',
+    )
+
+
+@pytest.mark.parametrize('chunked', [False, True])
+def test_hash_url_matches_file_bytes(chunked):
+    request = HashRequest(values=(), algorithms=('md5', 'sha256', 'crc32'))
+
+    async def test(server, streamer):
+        path = f'/file/{FILE_SIZE}' + ('?chunked=1' if chunked else '')
+        return await streamer.hash_url(str(server.make_url(path)), request)
+
+    result = run_with_server(test)
+    assert result['size'] == FILE_SIZE
+    assert result['digests'] == expected_file_digests(FILE_SIZE)
+
+
+@pytest.mark.parametrize('chunked', [False, True])
+def test_hash_url_rejects_large_file(chunked):
+    request = HashRequest(values=())
+
+    async def test(server, streamer):
+        path = f'/file/{FILE_SIZE}' + ('?chunked=1' if chunked else '')
+        with pytest.raises(FileTooLargeError):
+            await streamer.hash_url(str(server.make_url(path)), request)
+
+    run_with_server(test, max_bytes=FILE_SIZE - 1)
+
+
+def test_hash_url_accepts_file_at_limit():
+    request = HashRequest(values=(), algorithms=('md5',))
+
+    async def test(server, streamer):
+        return await streamer.hash_url(str(server.make_url(f'/file/{FILE_SIZE}?chunked=1')), request)
+
+    result = run_with_server(test, max_bytes=FILE_SIZE)
+    assert result['digests'] == expected_file_digests(FILE_SIZE)[:1]
+
+
+def test_hash_lines_matches_text_lines():
+    request = HashRequest(values=(), algorithms=('md5', 'sha1'), bulk='csv')
+    output = io.StringIO(newline='')
+
+    async def test(server, streamer):
+        #小块下载，让行跨越数据块边界
+        return await streamer.hash_lines(str(server.make_url(f'/lines/{LINE_COUNT}')), request, output)
+
+    result = run_with_server(test, chunk_size=1000)
+    assert result['lines'] == LINE_COUNT
+    assert result['size'] == len(b''.join(text_lines(LINE_COUNT)))
+
+    rows = list(csv.reader(io.StringIO(output.getvalue())))
+    values = b''.join(text_lines(LINE_COUNT)).decode('utf-8').split()
+    assert rows[0] == ['value', 'MD5', 'SHA1']
+    assert rows[1:] == [
+        [value, hashlib.md5(value.encode()).hexdigest().upper(), hashlib.sha1(value.encode()).hexdigest().upper()]
+        for value in values
+    ]
+
+
+def test_hash_lines_parallel_matches_serial():
+    request = HashRequest(values=(), algorithms=('md5', 'sha256'), bulk='tsv')
+    runner = HashJobRunner(max_workers=3, parallel_lines=100)
+    outputs = []
+
+    async def test(server, streamer):
+        for runner_option in (None, runner):
+            streamer.runner = runner_option
+            output = io.StringIO(newline='')
+            result = await streamer.hash_lines(str(server.make_url(f'/lines/{LINE_COUNT}')), request, output)
+            outputs.append((result['lines'], output.getvalue()))
+
+    try:
+        run_with_server(test, chunk_size=4000)
+    finally:
+        runner.executor.shutdown()
+
+    assert outputs[0][0] == outputs[1][0] == LINE_COUNT
+    assert outputs[0][1] == outputs[1][1]
+
+
+def test_hash_lines_rejects_too_many_lines():
+    request = HashRequest(values=(), bulk='csv')
+
+    async def test(server, streamer):
+        with pytest.raises(FileTooLargeError):
+            await streamer.hash_lines(str(server.make_url(f'/lines/{LINE_COUNT}')), request, io.StringIO())
+
+    run_with_server(test, max_lines=LINE_COUNT - 1)
+
+
+def message(extra: dict):
+    return SimpleNamespace(extra=extra)
+
+
+def test_find_attachment_uses_kook_assets():
+    url = 'https://img.kookapp.cn/attachments/2024-01/01/abc.txt'
+    assert find_attachment(message({'attachments': {'url': url, 'name': 'abc.txt'}})) == (url, 'abc.txt')
+    assert find_attachment(message({'quote': {'type': 4, 'content': url}})) == (url, 'abc.txt')
+    assert find_attachment(message({'quote': {'type': 2, 'content': 'https://img.kaiheila.cn/assets/a.png'}})) \
+        == ('https://img.kaiheila.cn/assets/a.png', 'a.png')
+
+
+@pytest.mark.parametrize('url', [
+    'http://127.0.0.1:8080/file/100',
+    'http://169.254.169.254/latest/meta-data',
+    'https://example.com/a.txt',
+    'https://kookapp.cn.example.com/a.txt',
+    'https://evilkookapp.cn/a.txt',
+    'ftp://img.kookapp.cn/a.txt',
+    'http://[::1/a.txt',
+])
+def test_find_attachment_rejects_other_hosts(url):
+    assert find_attachment(message({'quote': {'type': 4, 'content': url}})) is None
+    assert find_attachment(message({'attachments': {'url': url, 'name': 'a.txt'}})) is None
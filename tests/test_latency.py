@@ -0,0 +1,165 @@
+"func.latency_probe / func.latency_monitor 的离线测试，/ping 由 tools/http_standin.py 提供"
+
+import math
+import time
+import asyncio
+
+import pytest
+from aiohttp.test_utils import TestServer
+
+from http_standin import create_app
+from func.latency_probe import LatencyProbe, percentile, summarize
+from func.latency_monitor import LatencyMonitor, WINDOWS
+
+
+def run_with_server(test):
+    "启动替身服务器，执行 test(server)"
+
+    async def main():
+        server = TestServer(create_app())
+        await server.start_server()
+        try:
+            return await test(server)
+        finally:
+            await server.close()
+
+    return asyncio.run(main())
+
+
+def test_percentile_interpolates():
+    values = [10.0, 20.0, 30.0, 40.0]
+    assert percentile(values, 0) == 10.0
+    assert percentile(values, 0.5) == 25.0
+    assert percentile(values, 0.95) == pytest.approx(38.5)
+    assert percentile(values, 1) == 40.0
+    assert percentile([7.0], 0.95) == 7.0
+
+
+def test_summarize_counts_loss_and_jitter():
+    result = summarize('https://example.com/ping', [20.0, None, 10.0, 40.0, 30.0])
+
+    assert result['host'] == 'example.com'
+    assert (result['sent'], result['received']) == (5, 4)
+    assert result['loss'] == pytest.approx(0.2)
+    assert (result['min'], result['max']) == (10.0, 40.0)
+    assert result['p50'] == 25.0
+    #按发送顺序：|10-20| + |40-10| + |30-40|
+    assert result['jitter'] == pytest.approx(50 / 3)
+
+
+def test_summarize_all_lost():
+    result = summarize('https://example.com', [None, None])
+    assert result['loss'] == 1.0
+    assert result['received'] == 0
+    assert 'p50' not in result
+
+    assert summarize('https://example.com', [])['loss'] == 1.0
+
+
+def test_probe_against_standin():
+    async def test(server):
+        probe = LatencyProbe([], timeout=2)
+        try:
+            latency = await probe.probe(str(server.make_url('/ping?delay=50')))
+            lost = await probe.probe(str(server.make_url('/ping?loss=1')))
+            missing = await probe.probe(str(server.make_url('/nothing')))
+        finally:
+            await probe.close()
+        return latency, lost, missing
+
+    latency, lost, missing = run_with_server(test)
+    assert latency >= 50
+    assert lost is None
+    #404 仍然说明连接正常，只有 5xx 和连接失败计为丢包
+    assert missing is not None
+
+
+def test_monitor_counts_loss():
+    async def test(server):
+        targets = [str(server.make_url('/ping?delay=5')), str(server.make_url('/ping?loss=1'))]
+        probe = LatencyProbe(targets, timeout=2)
+        monitor = LatencyMonitor(probe, interval=10, refresh_interval=0.001)
+        try:
+            for _ in range(3):
+                await monitor.refresh()
+            return monitor.snapshot()
+        finally:
+            await probe.close()
+
+    ok, lossy = run_with_server(test)
+    assert ok['1m']['sent'] == 3 and ok['1m']['received'] == 3
+    assert ok['1m']['min'] >= 5 and ok['current'] >= 5
+    assert lossy['1m']['sent'] == 3 and lossy['1m']['loss'] == 1.0
+    assert lossy['current'] is None and lossy['age'] is not None
+
+
+def test_monitor_windows_roll_over():
+    probe = LatencyProbe(['https://example.com'])
+    monitor = LatencyMonitor(probe, interval=10, refresh_interval=5)
+    buffer = monitor.samples['https://example.com']
+    assert buffer.maxlen == math.ceil(max(WINDOWS.values()) / 5) + 1
+
+    now = time.monotonic()
+    buffer.extend([(now - 1000, 500.0), (now - 600, 100.0), (now - 120, None), (now - 30, 20.0), (now - 1, 10.0)])
+
+    item = monitor.snapshot()[0]
+    #超过 15 分钟的样本不再计入，1 分钟窗口只包含最近两次
+    assert (item['1m']['sent'], item['1m']['max']) == (2, 20.0)
+    assert (item['15m']['sent'], item['15m']['received'], item['15m']['max']) == (4, 3, 100.0)
+    assert item['15m']['loss'] == pytest.approx(0.25)
+    assert item['current'] == 10.0
+
+    #容量满后丢弃最旧的样本
+    buffer.extend((now, 1.0) for _ in range(buffer.maxlen))
+    assert len(buffer) == buffer.maxlen and buffer[0] == (now, 1.0)
+
+
+def test_refresh_is_shared_and_throttled():
+    async def test(server):
+        url = str(server.make_url('/ping?delay=100'))
+        probe = LatencyProbe([url], timeout=2)
+        monitor = LatencyMonitor(probe, interval=10, refresh_interval=60)
+        try:
+            #同时发起的按需采样共用一次测量，之后在 refresh_interval 内不再测量
+            await asyncio.gather(*(monitor.refresh() for _ in range(5)))
+            await monitor.refresh()
+            return len(monitor.samples[url])
+        finally:
+            await probe.close()
+
+    assert run_with_server(test) == 1
+
+
+def test_ensure_samples_waits_only_without_samples():
+    async def test(server):
+        url = str(server.make_url('/ping?delay=200'))
+        probe = LatencyProbe([url], timeout=2)
+        monitor = LatencyMonitor(probe, interval=0.1, refresh_interval=0.1)
+        buffer = monitor.samples[url]
+        try:
+            #还没有样本：等待一次测量
+            await monitor.ensure_samples()
+            first = len(buffer)
+
+            #样本新鲜：不测量
+            await monitor.ensure_samples()
+            assert len(buffer) == first and monitor._background is None
+
+            #样本过时：立即返回，在后台补测
+            await asyncio.sleep(0.3)
+            assert monitor.is_stale()
+            start = time.perf_counter()
+            await monitor.ensure_samples()
+            waited = time.perf_counter() - start
+            stale_count = len(buffer)
+
+            await monitor._background
+            return first, waited, stale_count, len(buffer)
+        finally:
+            await probe.close()
+
+    first, waited, stale_count, final = run_with_server(test)
+    assert first == 1
+    assert waited < 0.1
+    assert stale_count == 1
+    assert final == 2
@@ -0,0 +1,155 @@
+"""
+本地 HTTP 替身服务器，用于离线测试需要访问网络的功能
+
+路由:
+    GET /file/{size}          返回 size 字节的数据（分块发送），?chunked=1 时不带 Content-Length
+    GET /lines/{count}        返回 count 行文本（user000000 ...），用于批量哈希
+    GET /ping                 延迟测试，?delay=毫秒&jitter=毫秒&loss=0~1（丢包时直接断开连接）
+
+    KOOK 替身（将 khl.requester.API / khl.receiver.API 指向 http://127.0.0.1:端口/api/v3）:
+    GET /api/v3/gateway/index 返回本服务器的网关地址
+    WS  /gateway              发送 hello，收到心跳（s=2）后回复 pong（s=3），?pong_delay=毫秒（经 gateway/index 传入）
+    *   /api/v3/fake/slow     ?delay=毫秒 后返回成功
+    *   /api/v3/fake/ratelimit    返回 HTTP 429
+    *   /api/v3/fake/error        返回错误码 40000
+    *   /api/v3/{route}       其他接口一律返回 {'code': 0, 'data': {}}
+
+运行: python tools/http_standin.py [端口]
+"""
+
+import sys
+import json
+import zlib
+import random
+import asyncio
+from aiohttp import web
+from urllib.parse import urlencode
+
+#文件内容的重复单元，便于计算期望的哈希值
+PATTERN = bytes(range(256))
+CHUNK = 64 * 1024
+
+
+def file_bytes(size: int):
+    "生成与 /file/{size} 相同的数据（按块）"
+
+    block = PATTERN * (CHUNK // len(PATTERN))
+    sent = 0
+    while sent < size:
+        piece = block[:min(CHUNK, size - sent)]
+        sent += len(piece)
+        yield piece
+
+
+async def handle_file(request: web.Request) -> web.StreamResponse:
+    size = int(request.match_info['size'])
+
+    response = web.StreamResponse()
+    response.content_type = 'application/octet-stream'
+    if request.query.get('chunked') != '1':
+        response.content_length = size
+    await response.prepare(request)
+
+    for piece in file_bytes(size):
+        await response.write(piece)
+
+    await response.write_eof()
+    return response
+
+
+def text_lines(count: int):
+    "生成与 /lines/{count} 相同的文本（按块）"
+
+    for start in range(0, count, 1000):
+        yield ''.join(f'user{i:06d}\n' for i in range(start, min(start + 1000, count))).encode('utf-8')
+
+
+async def handle_lines(request: web.Request) -> web.StreamResponse:
+    count = int(request.match_info['count'])
+
+    response = web.StreamResponse()
+    response.content_type = 'text/plain'
+    await response.prepare(request)
+
+    for piece in text_lines(count):
+        await response.write(piece)
+
+    await response.write_eof()
+    return response
+
+
+async def handle_ping(request: web.Request) -> web.Response:
+    delay = float(request.query.get('delay', 0))
+    jitter = float(request.query.get('jitter', 0))
+    loss = float(request.query.get('loss', 0))
+
+    await asyncio.sleep(max(0.0, delay + random.uniform(-jitter, jitter)) / 1000)
+
+    if random.random() < loss:
+        #模拟丢包：不返回响应直接断开
+        request.transport.close()
+
+    return web.Response(text='pong')
+
+
+async def handle_gateway_index(request: web.Request) -> web.Response:
+    query = urlencode({key: request.query[key] for key in ('compress', 'pong_delay') if key in request.query})
+    url = f'ws://{request.host}/gateway?{query}'
+    return web.json_response({'code': 0, 'message': '', 'data': {'url': url}})
+
+
+async def handle_gateway(request: web.Request) -> web.WebSocketResponse:
+    pong_delay = float(request.query.get('pong_delay', 0))
+    compress = request.query.get('compress', '1') == '1'
+
+    ws = web.WebSocketResponse()
+    await ws.prepare(request)
+
+    async def send(data: dict):
+        #与 KOOK 相同，compress=1 时发送 zlib 压缩的二进制帧
+        if compress:
+            await ws.send_bytes(zlib.compress(json.dumps(data).encode('utf-8')))
+        else:
+            await ws.send_str(json.dumps(data))
+
+    await send({'s': 1, 'd': {'code': 0, 'session_id': 'standin'}})
+
+    async for message in ws:
+        if message.type != web.WSMsgType.TEXT:
+            continue
+        if message.json().get('s') == 2:
+            await asyncio.sleep(pong_delay / 1000)
+            await send({'s': 3})
+
+    return ws
+
+
+async def handle_api(request: web.Request) -> web.Response:
+    route = request.match_info['route']
+
+    if route == 'fake/slow':
+        await asyncio.sleep(float(request.query.get('delay', 0)) / 1000)
+    elif route == 'fake/ratelimit':
+        return web.json_response({'code': 429, 'message': 'too many requests'}, status=429,
+                                 headers={'X-Rate-Limit-Limit': '1', 'X-Rate-Limit-Remaining': '0',
+                                          'X-Rate-Limit-Reset': '1', 'X-Rate-Limit-Bucket': route})
+    elif route == 'fake/error':
+        return web.json_response({'code': 40000, 'message': 'standin error'})
+
+    return web.json_response({'code': 0, 'message': '', 'data': {}})
+
+
+def create_app() -> web.Application:
+    app = web.Application()
+    app.router.add_get('/file/{size}', handle_file)
+    app.router.add_get('/lines/{count}', handle_lines)
+    app.router.add_get('/ping', handle_ping)
+    app.router.add_get('/api/v3/gateway/index', handle_gateway_index)
+    app.router.add_get('/gateway', handle_gateway)
+    app.router.add_route('*', '/api/v3/{route:.+}', handle_api)
+    return app
+
+
+if __name__ == '__main__':
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    web.run_app(create_app(), host='127.0.0.1', port=port)